@@ -53,3 +53,53 @@ NOTIFICACIONES_DEFAULT = {
         "icono": "info"
     }
 }
+
+# Configuración de caché de usuarios autenticados
+CACHE_USUARIOS_TTL_SEGUNDOS = int(os.getenv("CACHE_USUARIOS_TTL_SEGUNDOS", "60"))
+CACHE_USUARIOS_MAX_ENTRADAS = int(os.getenv("CACHE_USUARIOS_MAX_ENTRADAS", "2048"))
+
+# Configuración de caché del checklist PAE
+CACHE_CHECKLIST_TTL_SEGUNDOS = int(os.getenv("CACHE_CHECKLIST_TTL_SEGUNDOS", "300"))
+
+# Caché de KPIs del dashboard de administración
+KPIS_CACHE_TTL_SEGUNDOS = int(os.getenv("KPIS_CACHE_TTL_SEGUNDOS", "30"))
+
+# Caché del calendario de visitas asignadas (por mes)
+CALENDARIO_CACHE_TTL_SEGUNDOS = int(os.getenv("CALENDARIO_CACHE_TTL_SEGUNDOS", "300"))
+CALENDARIO_CACHE_MAX_MESES = int(os.getenv("CALENDARIO_CACHE_MAX_MESES", "24"))
+
+# Envío en lote de visitas desde la cola offline de la app móvil
+LOTE_VISITAS_MAX_ITEMS = int(os.getenv("LOTE_VISITAS_MAX_ITEMS", "100"))
+
+# Caché del catálogo geográfico (municipios, instituciones y sedes)
+CATALOGO_CACHE_TTL_SEGUNDOS = int(os.getenv("CATALOGO_CACHE_TTL_SEGUNDOS", "600"))
+
+# Catálogo y checklist: segundos que el cliente puede reutilizar su copia sin
+# revalidarla con If-None-Match (0 = revalidar siempre)
+HTTP_CACHE_MAX_AGE_SEGUNDOS = int(os.getenv("HTTP_CACHE_MAX_AGE_SEGUNDOS", "0"))
+
+# Índice espacial de sedes (cercanas y por área del mapa)
+INDICE_SEDES_TTL_SEGUNDOS = int(os.getenv("INDICE_SEDES_TTL_SEGUNDOS", "600"))
+
+# Rutas de visitadores: pares de coordenadas con distancia cacheada
+RUTAS_CACHE_DISTANCIAS_MAX = int(os.getenv("RUTAS_CACHE_DISTANCIAS_MAX", "200000"))
+
+# Sincronización incremental: las entradas más recientes que este margen se
+# entregan en la siguiente consulta (cubre transacciones que confirman tarde)
+SINCRONIZACION_MARGEN_SEGUNDOS = int(os.getenv("SINCRONIZACION_MARGEN_SEGUNDOS", "5"))
+# Días que se conservan en el registro de cambios; un cursor más viejo exige carga completa
+SINCRONIZACION_RETENCION_DIAS = int(os.getenv("SINCRONIZACION_RETENCION_DIAS", "30"))
+
+# Programación masiva: visitas que un visitador puede atender por día
+CAPACIDAD_DIARIA_VISITADOR = int(os.getenv("CAPACIDAD_DIARIA_VISITADOR", "3"))
+
+# Cola de exportaciones del panel de administración
+EXPORTACIONES_MAX_WORKERS = int(os.getenv("EXPORTACIONES_MAX_WORKERS", "2"))
+EXPORTACIONES_DIAS_VIGENCIA = int(os.getenv("EXPORTACIONES_DIAS_VIGENCIA", "7"))
+EXPORTACIONES_DIRECTORIO = os.getenv("EXPORTACIONES_DIRECTORIO", "media/exports")
+# Un trabajo "en_proceso" más antiguo que esto se considera abandonado (reinicio o caída)
+EXPORTACIONES_TIMEOUT_MINUTOS = int(os.getenv("EXPORTACIONES_TIMEOUT_MINUTOS", "30"))
+
+# Render de reportes PDF en paralelo
+PDF_MAX_PROCESOS = int(os.getenv("PDF_MAX_PROCESOS", "2"))
+PDF_FILAS_POR_FRAGMENTO = int(os.getenv("PDF_FILAS_POR_FRAGMENTO", "1000"))
@@ -1,4 +1,4 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.orm import sessionmaker, declarative_base
 import os
 from dotenv import load_dotenv
@@ -13,13 +13,74 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if DATABASE_URL is None:
     DATABASE_URL = "sqlite:///./visitas_cauca.db"
 
-# Crear el motor de la base de datos
-# Para SQLite, habilitar las foreign keys
-connect_args = {}
-if "sqlite" in DATABASE_URL:
-    connect_args = {"check_same_thread": False}
+# Configuración del pool de conexiones (PostgreSQL u otros motores con QueuePool).
+# Conexiones máximas por worker de uvicorn = DB_POOL_SIZE + DB_MAX_OVERFLOW
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() == "true"
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))  # 0 = sin límite
+
+# Perfil de ajuste para SQLite, aplicado en cada conexión nueva
+SQLITE_WAL = os.getenv("SQLITE_WAL", "true").lower() == "true"
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "65536"))
+
+
+def _es_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def crear_motor(url: str = DATABASE_URL):
+    """
+    Crea el motor de base de datos con el pool y el perfil de ajuste
+    correspondientes al motor indicado en la URL.
+    """
+    if _es_sqlite(url):
+        # Para SQLite, permitir el uso de la conexión desde los hilos de FastAPI
+        connect_args = {
+            "check_same_thread": False,
+            "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000,
+        }
+        motor = create_engine(url, connect_args=connect_args, pool_pre_ping=DB_POOL_PRE_PING)
+
+        @event.listens_for(motor, "connect")
+        def _aplicar_pragmas_sqlite(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+                if SQLITE_WAL and ":memory:" not in url:
+                    cursor.execute("PRAGMA journal_mode=WAL")
+                cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+                cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+                # Valor negativo = tamaño en KiB en lugar de páginas
+                cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_SIZE_KB}")
+                cursor.execute("PRAGMA temp_store=MEMORY")
+            finally:
+                cursor.close()
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+        return motor
+
+    connect_args = {}
+    if DB_STATEMENT_TIMEOUT_MS > 0 and url.startswith("postgresql"):
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    return create_engine(
+        url,
+        connect_args=connect_args,
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        pool_recycle=DB_POOL_RECYCLE,
+        pool_pre_ping=DB_POOL_PRE_PING,
+    )
+
+
+# Crear el motor de la base de datos
+engine = crear_motor(DATABASE_URL)
 
 # Crear la sesión de conexión
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -31,4 +92,24 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def obtener_estadisticas_pool() -> dict:
+    """
+    Devuelve el estado actual del pool de conexiones de este proceso.
+    Útil para dimensionar el número de workers de uvicorn.
+    """
+    pool = engine.pool
+    estadisticas = {
+        "motor": engine.dialect.name,
+        "clase_pool": type(pool).__name__,
+        "estado": pool.status(),
+    }
+    for nombre in ("size", "checkedin", "checkedout", "overflow"):
+        metodo = getattr(pool, nombre, None)
+        if callable(metodo):
+            estadisticas[nombre] = metodo()
+    if not _es_sqlite(DATABASE_URL):
+        estadisticas["max_conexiones_por_worker"] = DB_POOL_SIZE + DB_MAX_OVERFLOW
+    return estadisticas
@@ -2,7 +2,7 @@ from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from app.database import get_db
-from app import models
+from app.services.cache_usuarios import cache_usuarios
 
 import os
 
@@ -21,14 +21,10 @@ def get_current_user(token: str = Depends(oauth2_scheme), db=Depends(get_db)):
     except JWTError:
         raise HTTPException(status_code=401, detail="Token inválido")
 
-    # Cargar usuario con su rol usando joinedload
-    from sqlalchemy.orm import joinedload
-    usuario = db.query(models.Usuario).options(
-        joinedload(models.Usuario.rol)
-    ).filter(models.Usuario.correo == user_email).first()
+    # Usuario con su rol, resuelto desde la caché por (sub, exp) del token
+    usuario = cache_usuarios.obtener(db, user_email, payload.get("exp"))
     
     if usuario is None:
         raise HTTPException(status_code=401, detail="Usuario no encontrado")
     
-    print(f"🔍 Usuario autenticado: {usuario.correo}, Rol: {usuario.rol.nombre if usuario.rol else 'Sin rol'}")
     return usuario
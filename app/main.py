@@ -7,8 +7,12 @@ from slowapi.errors import RateLimitExceeded
 from dotenv import load_dotenv
 import os
 from app import models
-from app.database import engine
-from app.routes import visitas, sedes, dashboard, auth, visitas_completas, usuarios, reportes, instituciones, municipios, visitas_programadas, items_pae, visitas_asignadas, notificaciones, supervisor, admin_basic
+from app.database import engine, SessionLocal
+from app.services.exportaciones_service import cola_exportaciones
+from app.services.resumenes_diarios import ResumenesDiariosService
+from app.services.indice_sedes import indice_sedes
+from app.services.cambios_sincronizacion import CambiosSincronizacionService
+from app.routes import visitas, sedes, dashboard, auth, visitas_completas, usuarios, reportes, instituciones, municipios, visitas_programadas, items_pae, visitas_asignadas, notificaciones, supervisor, admin_basic, sincronizacion
 
 # Cargar variables de entorno
 load_dotenv()
@@ -42,6 +46,11 @@ app.add_middleware(
 # 3. Crear las tablas de la base de datos
 models.Base.metadata.create_all(bind=engine)
 
+# create_all no agrega índices nuevos a tablas que ya existían
+for tabla in models.Base.metadata.sorted_tables:
+    for indice in tabla.indexes:
+        indice.create(bind=engine, checkfirst=True)
+
 # 4. Incluir los Routers
 app.include_router(visitas.router, prefix="/api", tags=["Visitas"])
 app.include_router(sedes.router, prefix="/api", tags=["Sedes"])
@@ -57,9 +66,61 @@ app.include_router(items_pae.router, prefix="/api", tags=["Items PAE"])
 app.include_router(visitas_asignadas.router, prefix="/api", tags=["Visitas Asignadas"])
 app.include_router(supervisor.router, prefix="/api", tags=["Supervisor"])
 app.include_router(admin_basic.router, prefix="/api/admin", tags=["Administración"])
+app.include_router(sincronizacion.router, prefix="/api", tags=["Sincronización"])
 
 app.include_router(notificaciones.router)
 
+# Reanudar exportaciones que quedaron pendientes antes de un reinicio
+@app.on_event("startup")
+def reanudar_exportaciones_pendientes():
+    cola_exportaciones.recuperar_pendientes()
+
+# Construir los resúmenes diarios de analítica si la base ya tenía visitas
+@app.on_event("startup")
+def inicializar_resumenes_diarios():
+    db = SessionLocal()
+    try:
+        resumenes = ResumenesDiariosService(db)
+        if resumenes.esta_vacio():
+            filas = resumenes.reconstruir()
+            db.commit()
+            print(f"📊 Resúmenes diarios construidos: {filas}")
+    except Exception as e:
+        # Otro worker pudo construirlos al mismo tiempo; se pueden rehacer con
+        # app/scripts/reconstruir_resumenes_diarios.py
+        db.rollback()
+        print(f"⚠️ No se pudieron construir los resúmenes diarios: {e}")
+    finally:
+        db.close()
+
+# Cargar el índice espacial de sedes antes de la primera consulta
+@app.on_event("startup")
+def construir_indice_sedes():
+    db = SessionLocal()
+    try:
+        arbol = indice_sedes.obtener(db, recargar=True)
+        print(f"🗺️ Índice espacial de sedes construido: {len(arbol.sedes)} sedes con coordenadas")
+    except Exception as e:
+        # Se construirá en la primera consulta
+        print(f"⚠️ No se pudo construir el índice de sedes: {e}")
+    finally:
+        db.close()
+
+# Depurar el registro de cambios de sincronización según la retención configurada
+@app.on_event("startup")
+def depurar_cambios_sincronizacion():
+    db = SessionLocal()
+    try:
+        eliminadas = CambiosSincronizacionService(db).depurar()
+        db.commit()
+        if eliminadas:
+            print(f"🧹 Registro de cambios depurado: {eliminadas} entradas")
+    except Exception as e:
+        db.rollback()
+        print(f"⚠️ No se pudo depurar el registro de cambios: {e}")
+    finally:
+        db.close()
+
 # 5. Ruta de Bienvenida
 @app.get("/", tags=["Root"])
 def read_root():
@@ -1,7 +1,7 @@
 # app/models_clean.py
 # Versión limpia con solo las tablas que existen en la BD actual
 
-from sqlalchemy import Column, Integer, Float, String, Text, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, Float, String, Text, ForeignKey, DateTime, Date, Boolean, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .database import Base
@@ -176,6 +176,11 @@ class SedeEducativa(Base):
 # Resto de modelos existentes...
 class VisitaCompletaPAE(Base):
     __tablename__ = "visitas_completas_pae"
+    __table_args__ = (
+        # Índices para la paginación por cursor (fecha_visita, id) de los listados
+        Index("ix_visitas_completas_pae_profesional_fecha", "profesional_id", "fecha_visita", "id"),
+        Index("ix_visitas_completas_pae_fecha_id", "fecha_visita", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     profesional_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
@@ -235,6 +240,36 @@ class VisitaRespuestaCompleta(Base):
     categoria = relationship("ChecklistCategoria")
     item = relationship("ChecklistItem")
 
+class ClaveIdempotenciaVisita(Base):
+    """
+    Claves de idempotencia generadas por la app móvil para cada visita enviada
+    desde la cola offline, de modo que los reintentos no dupliquen visitas.
+    """
+    __tablename__ = "claves_idempotencia_visitas"
+    __table_args__ = (
+        UniqueConstraint("usuario_id", "clave", name="uq_clave_idempotencia_usuario"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    clave = Column(String(100), nullable=False)
+    visita_id = Column(Integer, ForeignKey("visitas_completas_pae.id"), nullable=False)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow)
+    
+    # Relaciones
+    visita = relationship("VisitaCompletaPAE")
+
+class ContadorVisitasUsuario(Base):
+    """
+    Último número de visita asignado a cada profesional. Permite asignar
+    `numero_visita_usuario` en tiempo constante y sin colisiones entre workers.
+    """
+    __tablename__ = "contadores_visitas_usuario"
+    
+    usuario_id = Column(Integer, ForeignKey("usuarios.id"), primary_key=True)
+    ultimo_numero = Column(Integer, nullable=False, default=0)
+    fecha_actualizacion = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
 class ChecklistCategoria(Base):
     __tablename__ = "checklist_categorias"
     
@@ -327,3 +362,86 @@ class Reporte(Base):
     
     # Relaciones
     usuario = relationship("Usuario")
+
+class ExportJob(Base):
+    """
+    Trabajo de exportación del panel de administración. Se crea al solicitar
+    la exportación y lo procesa la cola en segundo plano (ver
+    app/services/exportaciones_service.py).
+    """
+    __tablename__ = "export_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    actor_id = Column(Integer, ForeignKey("usuarios.id"), nullable=False)
+    tipo_exportacion = Column(String, nullable=False)  # ID de plantilla: visitas_completas, cronograma_visitas, ...
+    formato = Column(String, default="excel")  # "excel", "pdf"
+    filtros_json = Column(Text, nullable=True)
+    estado = Column(String, default="pendiente", index=True)  # pendiente, en_proceso, completado, error
+    progreso = Column(Integer, default=0)  # 0 a 100
+    archivo_nombre = Column(String, nullable=True, index=True)
+    registros = Column(Integer, nullable=True)
+    mensaje = Column(String, nullable=True)
+    error_mensaje = Column(Text, nullable=True)
+    timestamp_creado = Column(DateTime, default=datetime.utcnow)
+    timestamp_inicio = Column(DateTime, nullable=True)
+    timestamp_fin = Column(DateTime, nullable=True)
+    expires_at = Column(DateTime, nullable=True)
+    
+    # Relaciones
+    usuario = relationship("Usuario", foreign_keys=[actor_id])
+
+# --- RESÚMENES DIARIOS PARA ANALÍTICA ---
+# Se mantienen de forma incremental desde app/services/resumenes_diarios.py;
+# app/scripts/reconstruir_resumenes_diarios.py los recalcula desde las tablas de visitas.
+
+class ResumenDiarioVisitasAsignadas(Base):
+    """Número de visitas asignadas por día, municipio, sede, visitador y estado."""
+    __tablename__ = "resumen_diario_visitas_asignadas"
+    __table_args__ = (
+        UniqueConstraint("fecha", "municipio_id", "sede_id", "visitador_id", "estado",
+                         name="uq_resumen_diario_asignadas"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    fecha = Column(Date, nullable=False, index=True)  # Día de fecha_programada
+    municipio_id = Column(Integer, nullable=False, index=True)
+    sede_id = Column(Integer, nullable=False)
+    visitador_id = Column(Integer, nullable=False, index=True)
+    estado = Column(String, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+
+class ResumenDiarioVisitasCompletas(Base):
+    """Número de visitas completas PAE por día, municipio, sede, profesional y estado."""
+    __tablename__ = "resumen_diario_visitas_completas"
+    __table_args__ = (
+        UniqueConstraint("fecha", "municipio_id", "sede_id", "profesional_id", "estado",
+                         name="uq_resumen_diario_completas"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    fecha = Column(Date, nullable=False, index=True)  # Día de fecha_visita
+    municipio_id = Column(Integer, nullable=False, index=True)
+    sede_id = Column(Integer, nullable=False)
+    profesional_id = Column(Integer, nullable=False, index=True)
+    estado = Column(String, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+
+# --- REGISTRO DE CAMBIOS PARA SINCRONIZACIÓN INCREMENTAL ---
+# Lo alimenta app/services/cambios_sincronizacion.py; el id es el cursor de la app móvil.
+
+class CambioSincronizacion(Base):
+    """
+    Alta, cambio o baja de un registro sincronizable (visita asignada, visita
+    completa, notificación, sede o ítem del checklist). `usuario_id` es el
+    dueño del registro; los catálogos compartidos lo dejan nulo.
+    """
+    __tablename__ = "cambios_sincronizacion"
+    __table_args__ = (
+        Index("ix_cambios_sincronizacion_usuario_id", "usuario_id", "id"),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    entidad = Column(String(40), nullable=False)
+    registro_id = Column(Integer, nullable=False)
+    usuario_id = Column(Integer, nullable=True)
+    fecha = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
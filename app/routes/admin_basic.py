@@ -1,13 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException
-from datetime import datetime
+from fastapi import APIRouter, Depends, HTTPException, Request
+from datetime import datetime, date
 from sqlalchemy.orm import Session
-from sqlalchemy import func, text, Date
+from sqlalchemy import text
 import os
-from typing import List, Dict, Any
+from typing import Optional
 
-from app.database import get_db
+from app.database import get_db, obtener_estadisticas_pool
 from app import models
 from app.dependencies import get_current_user
+from app.services.cache_usuarios import cache_usuarios
+from app.services.cache_checklist import cache_checklist
+from app.services.exportaciones_service import cola_exportaciones
+from app.services.render_pdf import renderizar_tabla_pdf
+from app.services.exportador_excel import ExportadorExcel, ColumnaExcel
+from app.services.kpis_service import motor_kpis
+from app.services.resumenes_diarios import ResumenesDiariosService
+from app.services.calendario_visitas import cache_calendario
+from app.services.programacion_visitas import ProgramacionVisitasService
+from app.services.catalogo_geografico import catalogo_geografico
+from app.services.cambios_sincronizacion import CambiosSincronizacionService
+from app.utils.cache_http import respuesta_json_cacheable
+from app.config import EXPORTACIONES_DIRECTORIO
 
 router = APIRouter(tags=["Administración Básica"])
 
@@ -36,27 +49,16 @@ def obtener_estadisticas_dashboard(
             models.Rol.nombre.ilike("%visitador%")
         ).count()
         
-        # Visitas programadas hoy
-        from datetime import datetime, date
+        # Visitas programadas hoy, en la semana y completadas (desde los resúmenes diarios)
+        from datetime import date, timedelta
         hoy = date.today()
-        visitas_hoy = db.query(models.VisitaAsignada).filter(
-            func.date(models.VisitaAsignada.fecha_programada) == hoy
-        ).count()
-        
-        # Visitas esta semana
-        from datetime import timedelta
         inicio_semana = hoy - timedelta(days=hoy.weekday())
         fin_semana = inicio_semana + timedelta(days=6)
-        visitas_semana = db.query(models.VisitaAsignada).filter(
-            func.date(models.VisitaAsignada.fecha_programada) >= inicio_semana,
-            func.date(models.VisitaAsignada.fecha_programada) <= fin_semana
-        ).count()
-        
-        # Visitas completadas
-        total_visitas = db.query(models.VisitaAsignada).count()
-        completadas = db.query(models.VisitaAsignada).filter(
-            models.VisitaAsignada.estado == "completada"
-        ).count()
+        totales = ResumenesDiariosService(db).totales_dashboard(hoy, inicio_semana, fin_semana)
+        visitas_hoy = totales.hoy
+        visitas_semana = totales.semana
+        total_visitas = totales.total
+        completadas = totales.completadas
         
         porcentaje_completadas = (completadas / total_visitas * 100) if total_visitas > 0 else 0
         
@@ -199,6 +201,7 @@ def crear_categoria_checklist(
         
         db.add(nueva_categoria)
         db.commit()
+        cache_checklist.invalidar()
         db.refresh(nueva_categoria)
         
         return {
@@ -239,6 +242,7 @@ def actualizar_categoria_checklist(
         categoria.nombre = categoria_data.get("nombre", categoria.nombre)
         
         db.commit()
+        cache_checklist.invalidar()
         
         return {
             "success": True,
@@ -269,7 +273,10 @@ def eliminar_categoria_checklist(
         if not categoria:
             raise HTTPException(status_code=404, detail="Categoría no encontrada")
         
-        # Eliminar todos los items de la categoría
+        # Eliminar todos los items de la categoría (la baja se registra para la sincronización)
+        CambiosSincronizacionService(db).registrar_filtro(
+            models.ChecklistItem, models.ChecklistItem.categoria_id == categoria_id
+        )
         db.query(models.ChecklistItem).filter(
             models.ChecklistItem.categoria_id == categoria_id
         ).delete()
@@ -277,6 +284,7 @@ def eliminar_categoria_checklist(
         # Eliminar la categoría
         db.delete(categoria)
         db.commit()
+        cache_checklist.invalidar()
         
         return {
             "success": True,
@@ -308,6 +316,7 @@ def crear_item_checklist(
         
         db.add(nuevo_item)
         db.commit()
+        cache_checklist.invalidar()
         db.refresh(nuevo_item)
         
         return {
@@ -352,6 +361,7 @@ def actualizar_item_checklist(
         item.orden = item_data.get("orden", item.orden)
         
         db.commit()
+        cache_checklist.invalidar()
         
         return {
             "success": True,
@@ -384,6 +394,7 @@ def eliminar_item_checklist(
         
         db.delete(item)
         db.commit()
+        cache_checklist.invalidar()
         
         return {
             "success": True,
@@ -505,8 +516,18 @@ def obtener_configuracion(
         }
     }
 
+@router.get("/configuracion/pool-conexiones")
+def obtener_pool_conexiones(
+    admin_user: models.Usuario = Depends(verificar_admin)
+):
+    """
+    Obtiene el estado del pool de conexiones a la base de datos del worker actual.
+    """
+    return obtener_estadisticas_pool()
+
 @router.get("/municipios")
 def listar_municipios_admin(
+    request: Request,
     db: Session = Depends(get_db),
     admin_user: models.Usuario = Depends(verificar_admin_o_supervisor)
 ):
@@ -514,96 +535,86 @@ def listar_municipios_admin(
     Lista todos los municipios para admin.
     """
     try:
-        municipios = db.query(models.Municipio).all()
-        return [
-            {
-                "id": m.id,
-                "nombre": m.nombre
-            }
-            for m in municipios
-        ]
+        datos_json = catalogo_geografico.obtener(db).json(("municipios",), lambda datos: datos.municipios)
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         print(f"❌ Error al listar municipios: {e}")
         return []
 
+def _sedes_admin(datos, municipio_id, institucion_id):
+    if institucion_id:
+        sedes = datos.sedes_por_institucion.get(institucion_id, [])
+        if municipio_id:
+            sedes = [sede for sede in sedes if sede["municipio_id"] == municipio_id]
+    elif municipio_id:
+        sedes = datos.sedes_por_municipio.get(municipio_id, [])
+    else:
+        sedes = datos.sedes
+    
+    return [
+        {
+            "id": sede["id"],
+            "nombre": sede["nombre"],
+            "municipio_id": sede["municipio_id"],
+            "institucion_id": sede["institucion_id"],
+            "direccion": f"DANE: {sede['dane'] or None}",
+            "estado": "activa",
+            "dane": sede["dane"] or None,
+            "due": sede["due"] or None,
+            "lat": sede["lat"],
+            "lon": sede["lon"],
+            "principal": sede["principal"]
+        }
+        for sede in sedes
+    ]
+
 @router.get("/sedes")
 def listar_sedes_admin(
+    request: Request,
     municipio_id: int = None,
     institucion_id: int = None,
     db: Session = Depends(get_db),
     admin_user: models.Usuario = Depends(verificar_admin_o_supervisor)
 ):
     """
-    Lista sedes educativas para admin desde la vista consolidada.
+    Lista sedes educativas para admin desde el catálogo geográfico en memoria.
     Si se especifica municipio_id o institucion_id, filtra por esos parámetros.
     """
     try:
-        # Usar la tabla real sedes_educativas
-        query = db.query(models.SedeEducativa)
-        
-        if municipio_id:
-            query = query.filter(models.SedeEducativa.municipio_id == municipio_id)
-        if institucion_id:
-            query = query.filter(models.SedeEducativa.institucion_id == institucion_id)
-            
-        sedes_db = query.order_by(models.SedeEducativa.nombre_sede).all()
-        
-        return [
-            {
-                "id": sede.id,
-                "nombre": sede.nombre_sede,
-                "municipio_id": sede.municipio_id,
-                "institucion_id": sede.institucion_id,
-                "direccion": f"DANE: {sede.dane}",
-                "estado": "activa",
-                "dane": sede.dane,
-                "due": sede.due,
-                "lat": sede.lat,
-                "lon": sede.lon,
-                "principal": sede.principal
-            }
-            for sede in sedes_db
-        ]
+        datos_json = catalogo_geografico.obtener(db).json(
+            ("admin_sedes", municipio_id, institucion_id),
+            lambda datos: _sedes_admin(datos, municipio_id, institucion_id)
+        )
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         print(f"❌ Error al listar sedes: {e}")
         return []
 
 @router.get("/instituciones")
 def listar_instituciones_admin(
+    request: Request,
     municipio_id: int = None,
     db: Session = Depends(get_db),
     admin_user: models.Usuario = Depends(verificar_admin_o_supervisor)
 ):
     """
-    Lista instituciones educativas para admin desde la vista consolidada. 
+    Lista instituciones educativas para admin desde el catálogo geográfico en memoria.
     Si se especifica municipio_id, filtra por ese municipio.
     """
     try:
-        sql = """
-            SELECT 
-                ROW_NUMBER() OVER (ORDER BY nombre, municipio) as id,
-                nombre,
-                municipio_id
-            FROM instituciones_consolidadas
-        """
-        params = {}
-        
-        if municipio_id:
-            sql += " WHERE municipio_id = :municipio_id"
-            params["municipio_id"] = municipio_id
-        
-        sql += " ORDER BY nombre, municipio"
-        
-        result = db.execute(text(sql), params).fetchall()
+        def construir(datos):
+            instituciones = datos.instituciones_por_municipio.get(municipio_id, []) if municipio_id else datos.instituciones
+            return [
+                {
+                    "id": institucion["id"],
+                    "nombre": institucion["nombre"],
+                    "municipio_id": institucion["municipio_id"]
+                }
+                for institucion in instituciones
+            ]
         
-        return [
-            {
-                "id": row.id,
-                "nombre": row.nombre,
-                "municipio_id": row.municipio_id
-            }
-            for row in result
-        ]
+        datos_json = catalogo_geografico.obtener(db).json(("admin_instituciones", municipio_id), construir)
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         print(f"❌ Error al listar instituciones: {e}")
         return []
@@ -803,6 +814,7 @@ def actualizar_rol_admin(
             rol.nombre = rol_data['nombre']
         
         db.commit()
+        cache_usuarios.invalidar_rol(rol_id)
         
         return {
             "success": True,
@@ -840,6 +852,7 @@ def eliminar_rol_admin(
         # Eliminar rol
         db.delete(rol)
         db.commit()
+        cache_usuarios.invalidar_rol(rol_id)
         
         return {
             "success": True,
@@ -962,68 +975,52 @@ def asignar_permisos_rol(
 def obtener_calendario_visitas(
     mes: int = None,
     anio: int = None,
+    vista: str = "mes",
+    fecha: Optional[date] = None,
+    visitador_id: Optional[int] = None,
     db: Session = Depends(get_db),
     admin_user: models.Usuario = Depends(verificar_admin_o_supervisor)
 ):
     """
     Obtiene el calendario de visitas para un mes específico.
+    Con `vista` = "semana" o "trimestre" devuelve la semana (lunes a domingo)
+    o el trimestre que contiene `fecha` (por defecto hoy); `visitador_id`
+    deja solo las visitas de ese visitador.
     """
+    if vista not in ("mes", "semana", "trimestre"):
+        raise HTTPException(status_code=400, detail="vista debe ser 'mes', 'semana' o 'trimestre'")
+    
     try:
-        from datetime import datetime, timedelta
+        from datetime import timedelta
         import calendar
         
-        # Si no se especifica, usar mes actual
-        if not mes or not anio:
-            now = datetime.now()
-            mes = mes or now.month
-            anio = anio or now.year
-        
-        # Primer y último día del mes
-        primer_dia = datetime(anio, mes, 1)
-        ultimo_dia = datetime(anio, mes, calendar.monthrange(anio, mes)[1])
-        
-        # Consultar visitas asignadas del mes usando SQL directo
-        result = db.execute(text("""
-            SELECT va.id, va.sede_id, va.visitador_id, va.fecha_programada, va.estado,
-                   se.nombre_sede as sede_nombre, u.nombre as visitador_nombre
-            FROM visitas_asignadas va
-            LEFT JOIN sedes_educativas se ON va.sede_id = se.id
-            LEFT JOIN usuarios u ON va.visitador_id = u.id
-            WHERE va.fecha_programada >= :fecha_inicio AND va.fecha_programada <= :fecha_fin
-        """), {"fecha_inicio": primer_dia, "fecha_fin": ultimo_dia}).fetchall()
-        
-        # Organizar por días
-        calendario = {}
-        for dia in range(1, calendar.monthrange(anio, mes)[1] + 1):
-            fecha_str = f"{anio}-{mes:02d}-{dia:02d}"
-            calendario[fecha_str] = {
-                "fecha": fecha_str,
-                "visitas": [],
-                "total": 0,
-                "visitadores": []
-            }
+        referencia = fecha or date.today()
+        if vista == "semana":
+            fecha_desde = referencia - timedelta(days=referencia.weekday())
+            fecha_hasta = fecha_desde + timedelta(days=6)
+        elif vista == "trimestre":
+            mes_inicio = (referencia.month - 1) // 3 * 3 + 1
+            fecha_desde = date(referencia.year, mes_inicio, 1)
+            fecha_hasta = date(referencia.year, mes_inicio + 2, calendar.monthrange(referencia.year, mes_inicio + 2)[1])
+        else:
+            # Si no se especifica, usar mes actual (o el de `fecha`)
+            mes = mes or referencia.month
+            anio = anio or referencia.year
+            fecha_desde = date(anio, mes, 1)
+            fecha_hasta = date(anio, mes, calendar.monthrange(anio, mes)[1])
         
-        # Llenar con visitas existentes
-        for visita in result:
-            fecha_str = visita.fecha_programada.strftime("%Y-%m-%d")
-            if fecha_str in calendario:
-                calendario[fecha_str]["visitas"].append({
-                    "id": visita.id,
-                    "sede_nombre": visita.sede_nombre or "Sin sede",
-                    "visitador": visita.visitador_nombre or "Sin asignar",
-                    "estado": visita.estado or "programada",
-                    "hora": visita.fecha_programada.strftime("%H:%M") if visita.fecha_programada else None
-                })
-                calendario[fecha_str]["total"] += 1
-                if visita.visitador_nombre:
-                    if visita.visitador_nombre not in calendario[fecha_str]["visitadores"]:
-                        calendario[fecha_str]["visitadores"].append(visita.visitador_nombre)
+        # Días agrupados desde la caché por mes; solo se consultan los días invalidados
+        calendario = cache_calendario.obtener_rango(db, fecha_desde, fecha_hasta, visitador_id=visitador_id)
+        total_visitas = sum(dia["total"] for dia in calendario)
         
         return {
-            "mes": mes,
-            "anio": anio,
-            "calendario": list(calendario.values()),
-            "total_visitas_mes": len(result)
+            "mes": fecha_desde.month,
+            "anio": fecha_desde.year,
+            "vista": vista,
+            "fecha_desde": fecha_desde.strftime("%Y-%m-%d"),
+            "fecha_hasta": fecha_hasta.strftime("%Y-%m-%d"),
+            "calendario": calendario,
+            "total_visitas_mes": total_visitas
         }
     except Exception as e:
         print(f"❌ Error al obtener calendario: {e}")
@@ -1037,9 +1034,12 @@ def programar_visitas_masivo(
 ):
     """
     Programa múltiples visitas de forma masiva usando el modelo actual.
+    Las sedes se reparten según la carga y el cupo diario de cada visitador,
+    agrupando las de un mismo municipio; con `vista_previa` devuelve el
+    reparto sin guardarlo.
     """
     try:
-        from datetime import datetime, timedelta
+        from datetime import datetime
         
         # Extraer datos
         sedes_ids = programacion_data.get('sedes_ids', [])
@@ -1074,69 +1074,65 @@ def programar_visitas_masivo(
         if not visitadores:
             raise HTTPException(status_code=400, detail="No hay visitadores disponibles")
         
-        # Crear visitas programadas para cada sede
-        visitador_index = 0
-        for i, sede in enumerate(sedes):
-            try:
-                # Asignar visitador de forma rotativa
-                visitador = visitadores[visitador_index % len(visitadores)]
-                visitador_index += 1
-                
-                # Calcular fecha específica dentro del rango
-                dias_total = (fecha_fin - fecha_inicio).days + 1
-                dia_asignado = (i * dias_total) // len(sedes)
-                fecha_visita = fecha_inicio + timedelta(days=dia_asignado)
-                
-                # Verificar conflictos en la fecha específica (buscar en visitas_asignadas)
-                conflicto = db.execute(text("""
-                    SELECT id FROM visitas_asignadas 
-                    WHERE sede_id = :sede_id 
-                    AND visitador_id = :visitador_id
-                    AND DATE(fecha_programada) = DATE(:fecha_programada)
-                """), {
-                    "sede_id": sede.id, 
-                    "visitador_id": visitador.id,
-                    "fecha_programada": fecha_visita
-                }).fetchone()
-                
-                if not conflicto:
-                    # Crear visita asignada (no visita programada)
-                    from app.models import VisitaAsignada
-                    nueva_visita_asignada = VisitaAsignada(
-                        sede_id=sede.id,
-                        visitador_id=visitador.id,
-                        supervisor_id=admin_user.id,
-                        fecha_programada=fecha_visita,
-                        tipo_visita=tipo_visita,
-                        prioridad="normal",
-                        estado="pendiente",
-                        contrato="ADMIN_MASIVO",
-                        operador=f"Admin-{admin_user.id}",
-                        municipio_id=sede.municipio_id,
-                        institucion_id=sede.institucion_id,
-                        observaciones=f"Visita {tipo_visita} programada masivamente",
-                        fecha_creacion=datetime.utcnow()
-                    )
-                    
-                    db.add(nueva_visita_asignada)
-                    
-                    visitas_creadas.append({
-                        "sede_nombre": sede.nombre_sede,
-                        "visitador_nombre": visitador.nombre,
-                        "fecha": fecha_visita.strftime("%Y-%m-%d"),
-                        "tipo": tipo_visita
-                    })
-                else:
-                    errores.append(f"El visitador {visitador.nombre} ya tiene una visita asignada en {sede.nombre_sede} para {fecha_visita.strftime('%Y-%m-%d')}")
+        # Reparto según la carga actual y el cupo diario de cada visitador
+        programacion = ProgramacionVisitasService(db)
+        asignaciones, rechazos = programacion.planificar(sedes, visitadores, fecha_inicio.date(), fecha_fin.date())
+        
+        nuevas_visitas = []
+        por_visitador = {}
+        ahora = datetime.utcnow()
+        for asignacion in asignaciones:
+            sede, visitador = asignacion.sede, asignacion.visitador
+            fecha_visita = datetime.combine(asignacion.dia, fecha_inicio.time())
             
-            except Exception as e:
-                import traceback
-                error_detail = traceback.format_exc()
-                print(f"❌ Error al crear visita asignada para sede {sede.nombre_sede}: {str(e)}")
-                print(f"❌ Traceback completo:\n{error_detail}")
-                errores.append(f"Error con sede {sede.nombre_sede}: {str(e)}")
+            # Crear visita asignada (no visita programada)
+            nuevas_visitas.append({
+                "sede_id": sede.id,
+                "visitador_id": visitador.id,
+                "supervisor_id": admin_user.id,
+                "fecha_programada": fecha_visita,
+                "tipo_visita": tipo_visita,
+                "prioridad": "normal",
+                "estado": "pendiente",
+                "contrato": "ADMIN_MASIVO",
+                "operador": f"Admin-{admin_user.id}",
+                "municipio_id": sede.municipio_id,
+                "institucion_id": sede.institucion_id,
+                "observaciones": f"Visita {tipo_visita} programada masivamente",
+                "fecha_creacion": ahora
+            })
+            visitas_creadas.append({
+                "sede_nombre": sede.nombre_sede,
+                "visitador_nombre": visitador.nombre,
+                "fecha": fecha_visita.strftime("%Y-%m-%d"),
+                "tipo": tipo_visita
+            })
+            por_visitador[visitador.nombre] = por_visitador.get(visitador.nombre, 0) + 1
+        
+        for sede, motivo in rechazos:
+            if motivo == "conflicto":
+                errores.append(f"La sede {sede.nombre_sede} ya tiene visita asignada con los visitadores que tienen cupo en el rango")
+            else:
+                errores.append(f"Sin cupo disponible para la sede {sede.nombre_sede} entre {fecha_inicio.strftime('%Y-%m-%d')} y {fecha_fin.strftime('%Y-%m-%d')}")
+        
+        if programacion_data.get('vista_previa'):
+            # Mismo reparto que se guardaría, sin insertar nada
+            return {
+                "success": True,
+                "vista_previa": True,
+                "message": "Vista previa de la programación masiva",
+                "visitas_creadas": len(visitas_creadas),
+                "errores": len(errores),
+                "por_visitador": por_visitador,
+                "detalles": {
+                    "visitas": visitas_creadas,
+                    "errores": errores
+                }
+            }
         
         try:
+            # Todas las visitas nuevas en una sola inserción
+            programacion.insertar_asignaciones(nuevas_visitas)
             db.commit()
             print(f"✅ Se crearon {len(visitas_creadas)} visitas asignadas exitosamente")
         except Exception as e:
@@ -1152,6 +1148,7 @@ def programar_visitas_masivo(
             "message": f"Programación masiva completada",
             "visitas_creadas": len(visitas_creadas),
             "errores": len(errores),
+            "por_visitador": por_visitador,
             "detalles": {
                 "visitas": visitas_creadas[:10],  # Primeras 10 para no sobrecargar
                 "errores": errores[:5]  # Primeros 5 errores
@@ -1173,6 +1170,7 @@ def obtener_disponibilidad_visitadores(
 ):
     """
     Obtiene la disponibilidad de visitadores en un rango de fechas.
+    Usa la misma carga y cupo diario que la programación masiva.
     """
     try:
         from datetime import datetime
@@ -1185,32 +1183,9 @@ def obtener_disponibilidad_visitadores(
             models.Usuario.rol_id == 1  # Rol visitador
         ).all()
         
-        disponibilidad = []
-        for visitador in visitadores:
-            # Por ahora simulamos la disponibilidad ya que el modelo actual no tiene asignación por visitador
-            # En el futuro se implementará con visitas asignadas reales
-            
-            # Simulación: visitadores con ID par están más ocupados
-            if visitador.id % 2 == 0:
-                visitas_simuladas = 8
-                disponibilidad_porcentaje = 60.0
-                estado = "ocupado"
-            else:
-                visitas_simuladas = 3
-                disponibilidad_porcentaje = 85.0
-                estado = "disponible"
-            
-            dias_periodo = (fecha_fin_dt - fecha_inicio_dt).days + 1
-            capacidad_maxima = dias_periodo * 3
-            
-            disponibilidad.append({
-                "visitador_id": visitador.id,
-                "nombre": visitador.nombre,
-                "visitas_programadas": visitas_simuladas,
-                "capacidad_maxima": capacidad_maxima,
-                "disponibilidad_porcentaje": disponibilidad_porcentaje,
-                "estado": estado
-            })
+        disponibilidad = ProgramacionVisitasService(db).disponibilidad(
+            visitadores, fecha_inicio_dt.date(), fecha_fin_dt.date()
+        )
         
         return sorted(disponibilidad, key=lambda x: x['disponibilidad_porcentaje'], reverse=True)
     except Exception as e:
@@ -1232,6 +1207,13 @@ def cancelar_visitas_masivo(
         if not visitas_ids:
             raise HTTPException(status_code=400, detail="Debe especificar visitas a cancelar")
         
+        resumenes = ResumenesDiariosService(db)
+        dias = resumenes.dias_afectados(models.VisitaAsignada, models.VisitaAsignada.id.in_(visitas_ids))
+        
+        CambiosSincronizacionService(db).registrar_filtro(
+            models.VisitaAsignada, models.VisitaAsignada.id.in_(visitas_ids)
+        )
+        
         # Actualizar visitas usando SQL directo
         visitas_canceladas = db.execute(text("""
             UPDATE visitas_asignadas 
@@ -1239,6 +1221,9 @@ def cancelar_visitas_masivo(
             WHERE id = ANY(:visitas_ids)
         """), {"visitas_ids": visitas_ids}).rowcount
         
+        # El UPDATE directo no pasa por el ORM: recalcular los días afectados
+        resumenes.recalcular_dias(models.VisitaAsignada, dias)
+        cache_calendario.marcar_dias(db, dias)
         db.commit()
         
         return {
@@ -1301,30 +1286,25 @@ def listar_exportaciones_admin(
             }
         ]
         
-        # Historial de exportaciones (simulado por ahora)
-        import datetime
-        historial = [
-            {
-                "id": 1,
-                "plantilla": "visitas_completas",
-                "nombre_archivo": "visitas_completas_2025_08.xlsx",
-                "fecha_creacion": datetime.datetime.now() - datetime.timedelta(days=2),
-                "usuario": admin_user.nombre,
-                "estado": "completado",
-                "tamaño": "2.3 MB",
-                "descargas": 5
-            },
-            {
-                "id": 2,
-                "plantilla": "estadisticas_pae",
-                "nombre_archivo": "estadisticas_pae_julio.pdf",
-                "fecha_creacion": datetime.datetime.now() - datetime.timedelta(days=7),
+        # Historial de exportaciones del usuario (cola de trabajos)
+        trabajos = db.query(models.ExportJob).filter(
+            models.ExportJob.actor_id == admin_user.id
+        ).order_by(models.ExportJob.timestamp_creado.desc()).limit(20).all()
+        
+        historial = []
+        for trabajo in trabajos:
+            ruta = os.path.join(EXPORTACIONES_DIRECTORIO, trabajo.archivo_nombre) if trabajo.archivo_nombre else None
+            tamano = os.path.getsize(ruta) if ruta and os.path.exists(ruta) else None
+            historial.append({
+                "id": trabajo.id,
+                "plantilla": trabajo.tipo_exportacion,
+                "nombre_archivo": trabajo.archivo_nombre,
+                "fecha_creacion": trabajo.timestamp_creado,
                 "usuario": admin_user.nombre,
-                "estado": "completado",
-                "tamaño": "1.8 MB",
-                "descargas": 12
-            }
-        ]
+                "estado": trabajo.estado,
+                "progreso": trabajo.progreso,
+                "tamaño": f"{tamano / (1024 * 1024):.1f} MB" if tamano is not None else None
+            })
         
         return {
             "plantillas": plantillas,
@@ -1341,19 +1321,11 @@ def generar_exportacion(
     admin_user: models.Usuario = Depends(verificar_admin)
 ):
     """
-    Genera una exportación basada en la plantilla y filtros especificados.
+    Encola una exportación basada en la plantilla y filtros especificados.
+    Devuelve el ID del trabajo de inmediato; el progreso se consulta en
+    /exportaciones/trabajos/{job_id} y el archivo se descarga cuando está completado.
     """
     try:
-        from datetime import datetime
-        import os
-        import pandas as pd
-        from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from reportlab.lib.pagesizes import letter, A4
-        from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        
         plantilla_id = exportacion_data.get('plantilla_id')
         filtros = exportacion_data.get('filtros', {})
         formato = exportacion_data.get('formato', 'excel')
@@ -1361,25 +1333,18 @@ def generar_exportacion(
         if not plantilla_id:
             raise HTTPException(status_code=400, detail="Debe especificar una plantilla")
         
-        # Crear directorio de exportaciones si no existe
-        export_dir = "media/exports"
-        os.makedirs(export_dir, exist_ok=True)
+        if plantilla_id not in cola_exportaciones.tipos_disponibles():
+            raise HTTPException(status_code=400, detail="Plantilla no encontrada")
         
-        # Generar nombre de archivo único
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        # Aprovechar la solicitud para liberar archivos vencidos
+        cola_exportaciones.limpiar_vencidas(db)
         
-        if plantilla_id == "visitas_completas":
-            return _generar_reporte_visitas_completas(db, filtros, formato, timestamp, export_dir, admin_user)
-        elif plantilla_id == "cronograma_visitas":
-            return _generar_cronograma_visitas(db, filtros, formato, timestamp, export_dir, admin_user)
-        elif plantilla_id == "estadisticas_pae":
-            return _generar_estadisticas_pae(db, filtros, formato, timestamp, export_dir, admin_user)
-        elif plantilla_id == "sedes_consolidado":
-            return _generar_consolidado_sedes(db, filtros, formato, timestamp, export_dir, admin_user)
-        elif plantilla_id == "usuarios_sistema":
-            return _generar_reporte_usuarios(db, filtros, formato, timestamp, export_dir, admin_user)
-        else:
-            raise HTTPException(status_code=400, detail="Plantilla no encontrada")
+        trabajo = cola_exportaciones.encolar(db, admin_user, plantilla_id, formato, filtros)
+        print(f"📤 Exportación {trabajo.id} ({plantilla_id}, {formato}) encolada")
+        
+        respuesta = cola_exportaciones.serializar(trabajo)
+        respuesta["message"] = "Exportación en cola. Consulte el estado del trabajo para descargar el archivo."
+        return respuesta
             
     except HTTPException:
         raise
@@ -1387,6 +1352,35 @@ def generar_exportacion(
         print(f"❌ Error al generar exportación: {e}")
         raise HTTPException(status_code=400, detail=f"Error al generar exportación: {str(e)}")
 
+@router.get("/exportaciones/trabajos")
+def listar_trabajos_exportacion(
+    estado: str = None,
+    db: Session = Depends(get_db),
+    admin_user: models.Usuario = Depends(verificar_admin)
+):
+    """
+    Lista los trabajos de exportación del usuario, del más reciente al más antiguo.
+    """
+    query = db.query(models.ExportJob).filter(models.ExportJob.actor_id == admin_user.id)
+    if estado:
+        query = query.filter(models.ExportJob.estado == estado)
+    trabajos = query.order_by(models.ExportJob.timestamp_creado.desc()).limit(50).all()
+    return {"trabajos": [cola_exportaciones.serializar(t) for t in trabajos]}
+
+@router.get("/exportaciones/trabajos/{job_id}")
+def obtener_trabajo_exportacion(
+    job_id: int,
+    db: Session = Depends(get_db),
+    admin_user: models.Usuario = Depends(verificar_admin)
+):
+    """
+    Obtiene el estado y progreso de un trabajo de exportación.
+    """
+    trabajo = db.get(models.ExportJob, job_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo de exportación no encontrado")
+    return cola_exportaciones.serializar(trabajo)
+
 @router.get("/exportaciones/ubicacion-archivos")
 def obtener_ubicacion_archivos(
     db: Session = Depends(get_db),
@@ -1472,7 +1466,19 @@ def descargar_exportacion(
         import os
         
         # Buscar archivo en el directorio de exportaciones
-        export_dir = "media/exports"
+        export_dir = EXPORTACIONES_DIRECTORIO
+        
+        # También se acepta el ID del trabajo de exportación
+        if export_id.isdigit():
+            trabajo = db.get(models.ExportJob, int(export_id))
+            if not trabajo:
+                raise HTTPException(status_code=404, detail="Trabajo de exportación no encontrado")
+            if trabajo.estado != "completado" or not trabajo.archivo_nombre:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"La exportación no está disponible (estado: {trabajo.estado}, progreso: {trabajo.progreso}%)"
+                )
+            export_id = trabajo.archivo_nombre
         
         # Por seguridad, validar que el archivo existe y pertenece al directorio correcto
         archivo_path = os.path.join(export_dir, export_id)
@@ -1557,57 +1563,40 @@ def _generar_reporte_visitas_completas(db, filtros, formato, timestamp, export_d
         result = db.execute(text(sql), params).fetchall()
         
         if formato == 'excel':
-            # Crear DataFrame de pandas
-            import pandas as pd
-            
-            data = []
-            for row in result:
-                data.append({
-                    'ID Visita': row.id,
-                    'Fecha Programada': row.fecha_programada.strftime('%Y-%m-%d %H:%M') if row.fecha_programada else '',
-                    'Estado': row.estado or '',
-                    'Sede': row.nombre_sede or '',
-                    'DANE': row.dane or '',
-                    'Visitador': row.visitador or '',
-                    'Fecha Real': row.fecha_visita.strftime('%Y-%m-%d %H:%M') if row.fecha_visita else '',
-                    'Asunto': row.asunto or '',
-                    'Observaciones Programación': row.observaciones or '',
-                    'Observaciones Visita': row.observaciones_visita or ''
-                })
-            
-            df = pd.DataFrame(data)
+            data = [
+                (
+                    row.id,
+                    row.fecha_programada.strftime('%Y-%m-%d %H:%M') if row.fecha_programada else '',
+                    row.estado or '',
+                    row.nombre_sede or '',
+                    row.dane or '',
+                    row.visitador or '',
+                    row.fecha_visita.strftime('%Y-%m-%d %H:%M') if row.fecha_visita else '',
+                    row.asunto or '',
+                    row.observaciones or '',
+                    row.observaciones_visita or ''
+                )
+                for row in result
+            ]
             
             # Generar archivo Excel
             filename = f"visitas_completas_{timestamp}.xlsx"
             filepath = os.path.join(export_dir, filename)
             
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Visitas Completas', index=False)
-                
-                # Formatear hoja
-                worksheet = writer.sheets['Visitas Completas']
-                
-                # Ajustar ancho de columnas
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    adjusted_width = min(max_length + 2, 50)
-                    worksheet.column_dimensions[column_letter].width = adjusted_width
-                
-                # Formatear encabezados
-                from openpyxl.styles import Font, PatternFill
-                header_font = Font(bold=True, color="FFFFFF")
-                header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-                
-                for cell in worksheet[1]:
-                    cell.font = header_font
-                    cell.fill = header_fill
+            exportador = ExportadorExcel(con_bordes=False)
+            exportador.agregar_hoja('Visitas Completas', [
+                ColumnaExcel('ID Visita'),
+                ColumnaExcel('Fecha Programada', 18),
+                ColumnaExcel('Estado'),
+                ColumnaExcel('Sede'),
+                ColumnaExcel('DANE', 15),
+                ColumnaExcel('Visitador'),
+                ColumnaExcel('Fecha Real', 18),
+                ColumnaExcel('Asunto'),
+                ColumnaExcel('Observaciones Programación'),
+                ColumnaExcel('Observaciones Visita'),
+            ], data)
+            exportador.guardar_en(filepath)
             
             return {
                 "success": True,
@@ -1618,55 +1607,32 @@ def _generar_reporte_visitas_completas(db, filtros, formato, timestamp, export_d
             }
         
         else:  # PDF
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet
-            from reportlab.lib import colors
-            from reportlab.lib.pagesizes import A4, landscape
-            
             filename = f"visitas_completas_{timestamp}.pdf"
             filepath = os.path.join(export_dir, filename)
             
-            doc = SimpleDocTemplate(filepath, pagesize=landscape(A4))
-            elements = []
-            styles = getSampleStyleSheet()
-            
-            # Título
-            title = Paragraph("Reporte de Visitas Completas", styles['Title'])
-            elements.append(title)
-            elements.append(Spacer(1, 20))
-            
-            # Información del reporte
-            from datetime import datetime
-            info = Paragraph(f"Generado por: {admin_user.nombre}<br/>Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M')}<br/>Total registros: {len(result)}", styles['Normal'])
-            elements.append(info)
-            elements.append(Spacer(1, 20))
-            
-            # Tabla de datos (primeros 100 registros para evitar archivos muy grandes)
-            if result:
-                table_data = [['ID', 'Fecha', 'Estado', 'Sede', 'Visitador']]
-                for row in result[:100]:  # Limitar a 100 registros
-                    table_data.append([
-                        str(row.id),
-                        row.fecha_programada.strftime('%Y-%m-%d') if row.fecha_programada else '',
-                        row.estado or '',
-                        (row.nombre_sede or '')[:30],  # Truncar texto largo
-                        (row.visitador or '')[:20]
-                    ])
-                
-                table = Table(table_data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                elements.append(table)
-            
-            doc.build(elements)
+            # Todas las filas; el render se reparte en fragmentos entre procesos
+            data = [
+                [
+                    str(row.id),
+                    row.fecha_programada.strftime('%Y-%m-%d') if row.fecha_programada else '',
+                    row.estado or '',
+                    (row.nombre_sede or '')[:30],  # Truncar texto largo
+                    (row.visitador or '')[:20]
+                ]
+                for row in result
+            ]
+            renderizar_tabla_pdf(
+                filepath,
+                "Reporte de Visitas Completas",
+                ['ID', 'Fecha', 'Estado', 'Sede', 'Visitador'],
+                data,
+                lineas_info=[
+                    f"Generado por: {admin_user.nombre}",
+                    f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+                    f"Total registros: {len(result)}",
+                ],
+                horizontal=True,
+            )
             
             return {
                 "success": True,
@@ -1708,95 +1674,59 @@ def _generar_cronograma_visitas(db, filtros, formato, timestamp, export_dir, adm
         visitas = result.fetchall()
         
         if formato == 'excel':
-            import pandas as pd
-            
-            # Convertir a DataFrame
-            df = pd.DataFrame([{
-                'ID': visita[0],
-                'Fecha Programada': visita[1],
-                'Sede Educativa': visita[2] or 'Sin nombre',
-                'DANE': visita[3] or 'N/A',
-                'Visitador': visita[4] or 'Sin asignar',
-                'Estado': visita[5] or 'programada',
-                'Contrato': visita[6] or 'N/A',
-                'Operador': visita[7] or 'N/A',
-                'Observaciones': visita[8] or '',
-                'Municipio': visita[9] or 'N/A'
-            } for visita in visitas])
-            
             filename = f"cronograma_{timestamp}.xlsx"
             filepath = os.path.join(export_dir, filename)
             
-            # Crear archivo Excel con formato
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Cronograma Visitas', index=False)
-                
-                # Formatear
-                worksheet = writer.sheets['Cronograma Visitas']
-                for column in worksheet.columns:
-                    max_length = 0
-                    column_letter = column[0].column_letter
-                    for cell in column:
-                        try:
-                            if len(str(cell.value)) > max_length:
-                                max_length = len(str(cell.value))
-                        except:
-                            pass
-                    worksheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
+            exportador = ExportadorExcel(con_bordes=False)
+            exportador.agregar_hoja('Cronograma Visitas', [
+                ColumnaExcel('ID'),
+                ColumnaExcel('Fecha Programada', 20),
+                ColumnaExcel('Sede Educativa'),
+                ColumnaExcel('DANE', 15),
+                ColumnaExcel('Visitador'),
+                ColumnaExcel('Estado'),
+                ColumnaExcel('Contrato'),
+                ColumnaExcel('Operador'),
+                ColumnaExcel('Observaciones'),
+                ColumnaExcel('Municipio'),
+            ], (
+                (
+                    visita[0],
+                    visita[1],
+                    visita[2] or 'Sin nombre',
+                    visita[3] or 'N/A',
+                    visita[4] or 'Sin asignar',
+                    visita[5] or 'programada',
+                    visita[6] or 'N/A',
+                    visita[7] or 'N/A',
+                    visita[8] or '',
+                    visita[9] or 'N/A'
+                )
+                for visita in visitas
+            ))
+            exportador.guardar_en(filepath)
                     
         elif formato == 'pdf':
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib import colors
-            
             filename = f"cronograma_{timestamp}.pdf"
             filepath = os.path.join(export_dir, filename)
             
-            # Crear documento PDF
-            doc = SimpleDocTemplate(filepath, pagesize=A4)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Título
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1  # Centrado
-            )
-            story.append(Paragraph("Cronograma de Visitas", title_style))
-            story.append(Spacer(1, 12))
-            
-            # Preparar datos para la tabla
-            data = [['ID', 'Fecha', 'Sede', 'Visitador', 'Estado', 'Municipio']]
-            for visita in visitas:
-                data.append([
+            data = [
+                [
                     str(visita[0]),
                     str(visita[1])[:10] if visita[1] else 'N/A',
                     (visita[2] or 'Sin nombre')[:20],
                     (visita[4] or 'Sin asignar')[:15],
                     visita[5] or 'programada',
                     (visita[9] or 'N/A')[:15]
-                ])
-            
-            # Crear tabla
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ]))
-            
-            story.append(table)
-            doc.build(story)
+                ]
+                for visita in visitas
+            ]
+            renderizar_tabla_pdf(
+                filepath,
+                "Cronograma de Visitas",
+                ['ID', 'Fecha', 'Sede', 'Visitador', 'Estado', 'Municipio'],
+                data,
+            )
         
         return {
             "success": True,
@@ -1851,55 +1781,39 @@ def _generar_estadisticas_pae(db, filtros, formato, timestamp, export_dir, admin
         municipios_stats = result_municipios.fetchall()
         
         if formato == 'excel':
-            import pandas as pd
-            
-            # Crear datos del resumen general
-            resumen_df = pd.DataFrame([{
-                'Métrica': 'Total Visitas',
-                'Valor': stats[0] or 0
-            }, {
-                'Métrica': 'Visitas Completadas',
-                'Valor': stats[1] or 0
-            }, {
-                'Métrica': 'Visitas Programadas',
-                'Valor': stats[2] or 0
-            }, {
-                'Métrica': 'Visitas Canceladas',
-                'Valor': stats[3] or 0
-            }, {
-                'Métrica': 'Tasa de Cumplimiento (%)',
-                'Valor': round((stats[1] or 0) * 100 / (stats[0] or 1), 2)
-            }])
-            
-            # Crear datos por municipio
-            municipios_df = pd.DataFrame([{
-                'Municipio': municipio[0] or 'Sin municipio',
-                'Total Visitas': municipio[1] or 0,
-                'Completadas': municipio[2] or 0,
-                'Tasa Cumplimiento (%)': round((municipio[2] or 0) * 100 / (municipio[1] or 1), 2)
-            } for municipio in municipios_stats])
+            # Resumen general
+            resumen = [
+                ('Total Visitas', stats[0] or 0),
+                ('Visitas Completadas', stats[1] or 0),
+                ('Visitas Programadas', stats[2] or 0),
+                ('Visitas Canceladas', stats[3] or 0),
+                ('Tasa de Cumplimiento (%)', round((stats[1] or 0) * 100 / (stats[0] or 1), 2)),
+            ]
             
             filename = f"estadisticas_pae_{timestamp}.xlsx"
             filepath = os.path.join(export_dir, filename)
             
-            # Crear archivo Excel con múltiples hojas
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                resumen_df.to_excel(writer, sheet_name='Resumen General', index=False)
-                municipios_df.to_excel(writer, sheet_name='Por Municipio', index=False)
-                
-                # Formatear ambas hojas
-                for sheet_name in ['Resumen General', 'Por Municipio']:
-                    worksheet = writer.sheets[sheet_name]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        worksheet.column_dimensions[column_letter].width = min(max_length + 2, 40)
+            # Archivo Excel con múltiples hojas
+            exportador = ExportadorExcel(con_bordes=False)
+            exportador.agregar_hoja('Resumen General', [
+                ColumnaExcel('Métrica'),
+                ColumnaExcel('Valor'),
+            ], resumen, ancho_maximo=40)
+            exportador.agregar_hoja('Por Municipio', [
+                ColumnaExcel('Municipio'),
+                ColumnaExcel('Total Visitas'),
+                ColumnaExcel('Completadas'),
+                ColumnaExcel('Tasa Cumplimiento (%)'),
+            ], (
+                (
+                    municipio[0] or 'Sin municipio',
+                    municipio[1] or 0,
+                    municipio[2] or 0,
+                    round((municipio[2] or 0) * 100 / (municipio[1] or 1), 2)
+                )
+                for municipio in municipios_stats
+            ), ancho_maximo=40)
+            exportador.guardar_en(filepath)
         
         return {
             "success": True,
@@ -1952,87 +1866,71 @@ def _generar_consolidado_sedes(db, filtros, formato, timestamp, export_dir, admi
         sedes = result.fetchall()
         
         if formato == 'excel':
-            import pandas as pd
-            
-            # Convertir a DataFrame
-            df = pd.DataFrame([{
-                'ID': sede[0],
-                'Nombre Sede': sede[1] or 'Sin nombre',
-                'DANE': sede[2] or 'N/A',
-                'DUE': sede[3] or 'N/A',
-                'Municipio': sede[4] or 'Sin municipio',
-                'Institución': sede[5] or 'Sin institución',
-                'Latitud': sede[6] or 0,
-                'Longitud': sede[7] or 0,
-                'Es Principal': 'Sí' if sede[8] else 'No',
-                'Visitas Programadas': sede[9] or 0,
-                'Visitas Completadas': sede[10] or 0,
-                'Visitas PAE': sede[11] or 0,
-                'Tasa Cumplimiento (%)': round((sede[10] or 0) * 100 / (sede[9] or 1), 2) if sede[9] else 0
-            } for sede in sedes])
+            filas = []
+            # Resumen por municipio: [total sedes, programadas, completadas, PAE]
+            por_municipio = {}
+            for sede in sedes:
+                municipio = sede[4] or 'Sin municipio'
+                programadas, completadas, pae = sede[9] or 0, sede[10] or 0, sede[11] or 0
+                filas.append((
+                    sede[0],
+                    sede[1] or 'Sin nombre',
+                    sede[2] or 'N/A',
+                    sede[3] or 'N/A',
+                    municipio,
+                    sede[5] or 'Sin institución',
+                    sede[6] or 0,
+                    sede[7] or 0,
+                    'Sí' if sede[8] else 'No',
+                    programadas,
+                    completadas,
+                    pae,
+                    round(completadas * 100 / programadas, 2) if programadas else 0
+                ))
+                acumulado = por_municipio.setdefault(municipio, [0, 0, 0, 0])
+                acumulado[0] += 1
+                acumulado[1] += programadas
+                acumulado[2] += completadas
+                acumulado[3] += pae
             
             filename = f"sedes_{timestamp}.xlsx"
             filepath = os.path.join(export_dir, filename)
             
-            # Crear archivo Excel con formato
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Consolidado Sedes', index=False)
-                
-                # Crear resumen por municipio
-                resumen_municipio = df.groupby('Municipio').agg({
-                    'ID': 'count',
-                    'Visitas Programadas': 'sum',
-                    'Visitas Completadas': 'sum',
-                    'Visitas PAE': 'sum'
-                }).reset_index()
-                resumen_municipio.columns = ['Municipio', 'Total Sedes', 'Visitas Programadas', 'Visitas Completadas', 'Visitas PAE']
-                resumen_municipio['Tasa Cumplimiento (%)'] = round(
-                    resumen_municipio['Visitas Completadas'] * 100 / resumen_municipio['Visitas Programadas'].replace(0, 1), 2
-                )
-                
-                resumen_municipio.to_excel(writer, sheet_name='Resumen por Municipio', index=False)
-                
-                # Formatear hojas
-                for sheet_name in ['Consolidado Sedes', 'Resumen por Municipio']:
-                    worksheet = writer.sheets[sheet_name]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        worksheet.column_dimensions[column_letter].width = min(max_length + 2, 50)
+            exportador = ExportadorExcel(con_bordes=False)
+            exportador.agregar_hoja('Consolidado Sedes', [
+                ColumnaExcel('ID'),
+                ColumnaExcel('Nombre Sede'),
+                ColumnaExcel('DANE', 15),
+                ColumnaExcel('DUE', 15),
+                ColumnaExcel('Municipio'),
+                ColumnaExcel('Institución'),
+                ColumnaExcel('Latitud', 12),
+                ColumnaExcel('Longitud', 12),
+                ColumnaExcel('Es Principal'),
+                ColumnaExcel('Visitas Programadas'),
+                ColumnaExcel('Visitas Completadas'),
+                ColumnaExcel('Visitas PAE'),
+                ColumnaExcel('Tasa Cumplimiento (%)'),
+            ], filas)
+            exportador.agregar_hoja('Resumen por Municipio', [
+                ColumnaExcel('Municipio'),
+                ColumnaExcel('Total Sedes'),
+                ColumnaExcel('Visitas Programadas'),
+                ColumnaExcel('Visitas Completadas'),
+                ColumnaExcel('Visitas PAE'),
+                ColumnaExcel('Tasa Cumplimiento (%)'),
+            ], (
+                (municipio, total, programadas, completadas, pae, round(completadas * 100 / (programadas or 1), 2))
+                for municipio, (total, programadas, completadas, pae) in sorted(por_municipio.items())
+            ))
+            exportador.guardar_en(filepath)
                         
         elif formato == 'pdf':
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib import colors
-            
             filename = f"sedes_{timestamp}.pdf"
             filepath = os.path.join(export_dir, filename)
             
-            # Crear documento PDF
-            doc = SimpleDocTemplate(filepath, pagesize=A4)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Título
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1  # Centrado
-            )
-            story.append(Paragraph("Consolidado de Sedes Educativas", title_style))
-            story.append(Spacer(1, 12))
-            
-            # Preparar datos para la tabla (versión simplificada para PDF)
-            data = [['ID', 'Sede', 'Municipio', 'Institución', 'Visitas', 'Estado']]
+            # Versión simplificada para PDF
+            data = []
             for sede in sedes:
                 estado = 'Completada' if (sede[10] or 0) > 0 else 'Pendiente'
                 data.append([
@@ -2043,23 +1941,14 @@ def _generar_consolidado_sedes(db, filtros, formato, timestamp, export_dir, admi
                     f"{sede[10] or 0}/{sede[9] or 0}",
                     estado
                 ])
-            
-            # Crear tabla
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-            ]))
-            
-            story.append(table)
-            doc.build(story)
+            renderizar_tabla_pdf(
+                filepath,
+                "Consolidado de Sedes Educativas",
+                ['ID', 'Sede', 'Municipio', 'Institución', 'Visitas', 'Estado'],
+                data,
+                tamano_encabezado=9,
+                tamano_datos=7,
+            )
         
         return {
             "success": True,
@@ -2106,88 +1995,74 @@ def _generar_reporte_usuarios(db, filtros, formato, timestamp, export_dir, admin
         usuarios = result.fetchall()
         
         if formato == 'excel':
-            import pandas as pd
-            
-            # Convertir a DataFrame
-            df = pd.DataFrame([{
-                'ID': usuario[0],
-                'Nombre': usuario[1] or 'Sin nombre',
-                'Correo': usuario[2] or 'Sin correo',
-                'Rol': usuario[3] or 'Sin rol',
-                'Visitas Programadas': usuario[4] or 0,
-                'Visitas Completadas': usuario[5] or 0,
-                'Visitas PAE Realizadas': usuario[6] or 0,
-                'Tasa Cumplimiento (%)': round((usuario[5] or 0) * 100 / (usuario[4] or 1), 2) if usuario[4] else 0,
-                'Activo': 'Sí'  # Por ahora todos activos ya que no tenemos campo activo
-            } for usuario in usuarios])
+            filas = []
+            # Resumen por rol: [total usuarios, programadas, completadas, PAE]
+            por_rol = {}
+            for usuario in usuarios:
+                rol = usuario[3] or 'Sin rol'
+                programadas, completadas, pae = usuario[4] or 0, usuario[5] or 0, usuario[6] or 0
+                filas.append((
+                    usuario[0],
+                    usuario[1] or 'Sin nombre',
+                    usuario[2] or 'Sin correo',
+                    rol,
+                    programadas,
+                    completadas,
+                    pae,
+                    round(completadas * 100 / programadas, 2) if programadas else 0,
+                    'Sí'  # Por ahora todos activos ya que no tenemos campo activo
+                ))
+                acumulado = por_rol.setdefault(rol, [0, 0, 0, 0])
+                acumulado[0] += 1
+                acumulado[1] += programadas
+                acumulado[2] += completadas
+                acumulado[3] += pae
             
             filename = f"usuarios_{timestamp}.xlsx"
             filepath = os.path.join(export_dir, filename)
             
-            # Crear archivo Excel con formato
-            with pd.ExcelWriter(filepath, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Usuarios del Sistema', index=False)
-                
-                # Crear resumen por rol
-                resumen_rol = df.groupby('Rol').agg({
-                    'ID': 'count',
-                    'Visitas Programadas': 'sum',
-                    'Visitas Completadas': 'sum',
-                    'Visitas PAE Realizadas': 'sum'
-                }).reset_index()
-                resumen_rol.columns = ['Rol', 'Total Usuarios', 'Visitas Programadas', 'Visitas Completadas', 'Visitas PAE']
-                resumen_rol['Tasa Cumplimiento Promedio (%)'] = round(
-                    resumen_rol['Visitas Completadas'] * 100 / resumen_rol['Visitas Programadas'].replace(0, 1), 2
-                )
-                
-                resumen_rol.to_excel(writer, sheet_name='Resumen por Rol', index=False)
-                
-                # Crear lista de visitadores más activos
-                visitadores = df[df['Rol'] == 'visitador'].sort_values('Visitas Completadas', ascending=False).head(10)
-                if not visitadores.empty:
-                    visitadores.to_excel(writer, sheet_name='Top 10 Visitadores', index=False)
-                
-                # Formatear hojas
-                for sheet_name in writer.sheets.keys():
-                    worksheet = writer.sheets[sheet_name]
-                    for column in worksheet.columns:
-                        max_length = 0
-                        column_letter = column[0].column_letter
-                        for cell in column:
-                            try:
-                                if len(str(cell.value)) > max_length:
-                                    max_length = len(str(cell.value))
-                            except:
-                                pass
-                        worksheet.column_dimensions[column_letter].width = min(max_length + 2, 40)
+            columnas_usuarios = [
+                ColumnaExcel('ID'),
+                ColumnaExcel('Nombre'),
+                ColumnaExcel('Correo'),
+                ColumnaExcel('Rol'),
+                ColumnaExcel('Visitas Programadas'),
+                ColumnaExcel('Visitas Completadas'),
+                ColumnaExcel('Visitas PAE Realizadas'),
+                ColumnaExcel('Tasa Cumplimiento (%)'),
+                ColumnaExcel('Activo'),
+            ]
+            
+            exportador = ExportadorExcel(con_bordes=False)
+            exportador.agregar_hoja('Usuarios del Sistema', columnas_usuarios, filas, ancho_maximo=40)
+            exportador.agregar_hoja('Resumen por Rol', [
+                ColumnaExcel('Rol'),
+                ColumnaExcel('Total Usuarios'),
+                ColumnaExcel('Visitas Programadas'),
+                ColumnaExcel('Visitas Completadas'),
+                ColumnaExcel('Visitas PAE'),
+                ColumnaExcel('Tasa Cumplimiento Promedio (%)'),
+            ], (
+                (rol, total, programadas, completadas, pae, round(completadas * 100 / (programadas or 1), 2))
+                for rol, (total, programadas, completadas, pae) in sorted(por_rol.items())
+            ), ancho_maximo=40)
+            
+            # Lista de visitadores más activos
+            visitadores = sorted(
+                (fila for fila in filas if fila[3] == 'visitador'),
+                key=lambda fila: fila[5],
+                reverse=True
+            )[:10]
+            if visitadores:
+                exportador.agregar_hoja('Top 10 Visitadores', columnas_usuarios, visitadores, ancho_maximo=40)
+            exportador.guardar_en(filepath)
                         
         elif formato == 'pdf':
-            from reportlab.lib.pagesizes import letter, A4
-            from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-            from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-            from reportlab.lib import colors
-            
             filename = f"usuarios_{timestamp}.pdf"
             filepath = os.path.join(export_dir, filename)
             
-            # Crear documento PDF
-            doc = SimpleDocTemplate(filepath, pagesize=A4)
-            styles = getSampleStyleSheet()
-            story = []
-            
-            # Título
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=16,
-                spaceAfter=30,
-                alignment=1  # Centrado
-            )
-            story.append(Paragraph("Usuarios del Sistema", title_style))
-            story.append(Spacer(1, 12))
-            
-            # Preparar datos para la tabla (versión simplificada para PDF)
-            data = [['ID', 'Nombre', 'Rol', 'Visitas', 'Estado']]
+            # Versión simplificada para PDF
+            data = []
             for usuario in usuarios:
                 estado = 'Activo' if (usuario[5] or 0) > 0 else 'Inactivo'
                 data.append([
@@ -2197,23 +2072,14 @@ def _generar_reporte_usuarios(db, filtros, formato, timestamp, export_dir, admin
                     f"{usuario[5] or 0}/{usuario[4] or 0}",
                     estado
                 ])
-            
-            # Crear tabla
-            table = Table(data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('FONTSIZE', (0, 1), (-1, -1), 7),
-            ]))
-            
-            story.append(table)
-            doc.build(story)
+            renderizar_tabla_pdf(
+                filepath,
+                "Usuarios del Sistema",
+                ['ID', 'Nombre', 'Rol', 'Visitas', 'Estado'],
+                data,
+                tamano_encabezado=9,
+                tamano_datos=7,
+            )
         
         return {
             "success": True,
@@ -2233,6 +2099,13 @@ def _generar_reporte_usuarios(db, filtros, formato, timestamp, export_dir, admin
             "formato": formato
         }
 
+# Generadores disponibles para la cola de exportaciones
+cola_exportaciones.registrar_generador("visitas_completas", _generar_reporte_visitas_completas)
+cola_exportaciones.registrar_generador("cronograma_visitas", _generar_cronograma_visitas)
+cola_exportaciones.registrar_generador("estadisticas_pae", _generar_estadisticas_pae)
+cola_exportaciones.registrar_generador("sedes_consolidado", _generar_consolidado_sedes)
+cola_exportaciones.registrar_generador("usuarios_sistema", _generar_reporte_usuarios)
+
 # ==================== AUTENTICACIÓN 2FA ====================
 
 @router.get("/2fa/status")
@@ -2509,146 +2382,10 @@ def obtener_kpis_avanzados(
 ):
     """
     Obtiene KPIs avanzados con cálculos dinámicos y comparativas.
+    Ambos períodos se calculan con una consulta por tabla y se memorizan unos segundos.
     """
     try:
-        from datetime import datetime, timedelta
-        import calendar
-        
-        # Calcular rangos de fechas según el período
-        now = datetime.now()
-        
-        if periodo == "dia":
-            fecha_inicio = now.replace(hour=0, minute=0, second=0, microsecond=0)
-            fecha_fin = now.replace(hour=23, minute=59, second=59)
-            fecha_comparacion = fecha_inicio - timedelta(days=1)
-        elif periodo == "semana":
-            dias_desde_lunes = now.weekday()
-            fecha_inicio = (now - timedelta(days=dias_desde_lunes)).replace(hour=0, minute=0, second=0)
-            fecha_fin = fecha_inicio + timedelta(days=6, hours=23, minutes=59, seconds=59)
-            fecha_comparacion = fecha_inicio - timedelta(weeks=1)
-        elif periodo == "trimestre":
-            trimestre = (now.month - 1) // 3
-            mes_inicio = trimestre * 3 + 1
-            fecha_inicio = now.replace(month=mes_inicio, day=1, hour=0, minute=0, second=0)
-            fecha_fin = (fecha_inicio + timedelta(days=93)).replace(day=1) - timedelta(days=1)
-            fecha_comparacion = fecha_inicio - timedelta(days=93)
-        elif periodo == "ano":
-            fecha_inicio = now.replace(month=1, day=1, hour=0, minute=0, second=0)
-            fecha_fin = now.replace(month=12, day=31, hour=23, minute=59, second=59)
-            fecha_comparacion = fecha_inicio.replace(year=fecha_inicio.year - 1)
-        else:  # mes por defecto
-            fecha_inicio = now.replace(day=1, hour=0, minute=0, second=0)
-            ultimo_dia = calendar.monthrange(now.year, now.month)[1]
-            fecha_fin = now.replace(day=ultimo_dia, hour=23, minute=59, second=59)
-            if now.month == 1:
-                fecha_comparacion = fecha_inicio.replace(year=fecha_inicio.year - 1, month=12)
-            else:
-                fecha_comparacion = fecha_inicio.replace(month=fecha_inicio.month - 1)
-        
-        # KPIs principales con comparativas
-        kpis = {}
-        
-        # 1. Visitas programadas vs completadas
-        visitas_programadas = db.execute(text("""
-            SELECT COUNT(*) FROM visitas_asignadas 
-            WHERE fecha_programada >= :inicio AND fecha_programada <= :fin
-        """), {"inicio": fecha_inicio, "fin": fecha_fin}).scalar()
-        
-        visitas_completadas = db.execute(text("""
-            SELECT COUNT(*) FROM visitas_completas_pae 
-            WHERE fecha_visita >= :inicio AND fecha_visita <= :fin
-        """), {"inicio": fecha_inicio, "fin": fecha_fin}).scalar()
-        
-        # Datos del período anterior para comparación
-        visitas_programadas_anterior = db.execute(text("""
-            SELECT COUNT(*) FROM visitas_asignadas 
-            WHERE fecha_programada >= :inicio AND fecha_programada < :fin
-        """), {"inicio": fecha_comparacion, "fin": fecha_inicio}).scalar()
-        
-        visitas_completadas_anterior = db.execute(text("""
-            SELECT COUNT(*) FROM visitas_completas_pae 
-            WHERE fecha_visita >= :inicio AND fecha_visita < :fin
-        """), {"inicio": fecha_comparacion, "fin": fecha_inicio}).scalar()
-        
-        # 2. Tasa de cumplimiento
-        tasa_cumplimiento = (visitas_completadas / visitas_programadas * 100) if visitas_programadas > 0 else 0
-        tasa_cumplimiento_anterior = (visitas_completadas_anterior / visitas_programadas_anterior * 100) if visitas_programadas_anterior > 0 else 0
-        
-        # 3. Sedes activas
-        sedes_activas = db.execute(text("""
-            SELECT COUNT(DISTINCT sede_id) FROM visitas_asignadas 
-            WHERE fecha_programada >= :inicio AND fecha_programada <= :fin
-        """), {"inicio": fecha_inicio, "fin": fecha_fin}).scalar()
-        
-        sedes_activas_anterior = db.execute(text("""
-            SELECT COUNT(DISTINCT sede_id) FROM visitas_asignadas 
-            WHERE fecha_programada >= :inicio AND fecha_programada < :fin
-        """), {"inicio": fecha_comparacion, "fin": fecha_inicio}).scalar()
-        
-        # 4. Visitadores activos
-        visitadores_activos = db.execute(text("""
-            SELECT COUNT(DISTINCT visitador_id) FROM visitas_asignadas 
-            WHERE fecha_programada >= :inicio AND fecha_programada <= :fin
-        """), {"inicio": fecha_inicio, "fin": fecha_fin}).scalar()
-        
-        visitadores_activos_anterior = db.execute(text("""
-            SELECT COUNT(DISTINCT visitador_id) FROM visitas_asignadas 
-            WHERE fecha_programada >= :inicio AND fecha_programada < :fin
-        """), {"inicio": fecha_comparacion, "fin": fecha_inicio}).scalar()
-        
-        # 5. Promedio de visitas por visitador
-        promedio_visitas = visitas_programadas / visitadores_activos if visitadores_activos > 0 else 0
-        promedio_visitas_anterior = visitas_programadas_anterior / visitadores_activos_anterior if visitadores_activos_anterior > 0 else 0
-        
-        # Calcular cambios porcentuales
-        def calcular_cambio(actual, anterior):
-            if anterior == 0:
-                return 100 if actual > 0 else 0
-            return ((actual - anterior) / anterior) * 100
-        
-        return {
-            "periodo": periodo,
-            "fecha_inicio": fecha_inicio.isoformat(),
-            "fecha_fin": fecha_fin.isoformat(),
-            "kpis": {
-                "visitas_programadas": {
-                    "valor": visitas_programadas,
-                    "anterior": visitas_programadas_anterior,
-                    "cambio": calcular_cambio(visitas_programadas, visitas_programadas_anterior),
-
-                },
-                "visitas_completadas": {
-                    "valor": visitas_completadas,
-                    "anterior": visitas_completadas_anterior,
-                    "cambio": calcular_cambio(visitas_completadas, visitas_completadas_anterior),
-
-                },
-                "tasa_cumplimiento": {
-                    "valor": round(tasa_cumplimiento, 1),
-                    "anterior": round(tasa_cumplimiento_anterior, 1),
-                    "cambio": tasa_cumplimiento - tasa_cumplimiento_anterior,
-
-                },
-                "sedes_activas": {
-                    "valor": sedes_activas,
-                    "anterior": sedes_activas_anterior,
-                    "cambio": calcular_cambio(sedes_activas, sedes_activas_anterior),
-
-                },
-                "visitadores_activos": {
-                    "valor": visitadores_activos,
-                    "anterior": visitadores_activos_anterior,
-                    "cambio": calcular_cambio(visitadores_activos, visitadores_activos_anterior),
-
-                },
-                "promedio_visitas_visitador": {
-                    "valor": round(promedio_visitas, 1),
-                    "anterior": round(promedio_visitas_anterior, 1),
-                    "cambio": promedio_visitas - promedio_visitas_anterior,
-
-                }
-            }
-        }
+        return motor_kpis.obtener(db, periodo)
     except Exception as e:
         print(f"❌ Error al obtener KPIs: {e}")
         raise HTTPException(status_code=400, detail=f"Error al obtener KPIs: {str(e)}")
@@ -2658,57 +2395,55 @@ def obtener_kpis_avanzados(
 @router.get("/analytics/graficos/rendimiento-visitadores")
 def obtener_rendimiento_visitadores(
     limit: int = 10,
+    offset: int = 0,
+    fecha_desde: Optional[date] = None,
+    fecha_hasta: Optional[date] = None,
     db: Session = Depends(get_db),
     admin_user: models.Usuario = Depends(verificar_admin)
 ):
     """
     Obtiene ranking de rendimiento de visitadores.
+    Por defecto cubre los últimos 30 días; `fecha_desde`/`fecha_hasta` definen
+    otra ventana y `limit`/`offset` paginan el ranking.
     """
+    if limit < 1 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit debe ser mayor que 0 y offset no puede ser negativo")
+    if fecha_desde and fecha_hasta and fecha_desde > fecha_hasta:
+        raise HTTPException(status_code=400, detail="fecha_desde no puede ser posterior a fecha_hasta")
+    
     try:
         from datetime import datetime, timedelta
         
-        # Últimos 30 días
-        fecha_inicio = datetime.now() - timedelta(days=30)
+        if fecha_desde or fecha_hasta:
+            fecha_inicio = fecha_desde or (fecha_hasta - timedelta(days=30))
+            periodo = f"{fecha_inicio.strftime('%Y-%m-%d')} a {(fecha_hasta or date.today()).strftime('%Y-%m-%d')}"
+        else:
+            # Últimos 30 días
+            fecha_inicio = (datetime.now() - timedelta(days=30)).date()
+            periodo = "Últimos 30 días"
         
-        result = db.execute(text("""
-            SELECT 
-                u.id,
-                u.nombre,
-                COUNT(vp.id) as visitas_programadas,
-                COUNT(vc.id) as visitas_completadas,
-                CASE 
-                    WHEN COUNT(vp.id) = 0 THEN 0 
-                    ELSE CAST(COUNT(vc.id) * 100.0 / COUNT(vp.id) AS DECIMAL(5,1))
-                END as tasa_cumplimiento
-            FROM usuarios u
-            LEFT JOIN visitas_asignadas vp ON u.id = vp.visitador_id 
-                AND vp.fecha_programada >= :fecha_inicio
-            LEFT JOIN visitas_completas_pae vc ON vp.sede_id = vc.sede_id 
-                AND vc.profesional_id = u.id 
-                AND vc.fecha_visita >= :fecha_inicio
-            WHERE u.rol_id = 1  -- Solo visitadores
-            GROUP BY u.id, u.nombre
-            HAVING COUNT(vp.id) > 0
-            ORDER BY tasa_cumplimiento DESC, visitas_completadas DESC
-            LIMIT :limit
-        """), {"fecha_inicio": fecha_inicio, "limit": limit}).fetchall()
+        # Programadas y completadas agregadas por separado (resúmenes diarios)
+        total, result = ResumenesDiariosService(db).ranking_visitadores(
+            fecha_inicio, fecha_hasta, limite=limit, offset=offset
+        )
         
         datos = []
-        for i, row in enumerate(result, 1):
+        for i, row in enumerate(result, offset + 1):
             datos.append({
                 "ranking": i,
-                "visitador_id": row.id,
-                "nombre": row.nombre,
-                "visitas_programadas": row.visitas_programadas,
-                "visitas_completadas": row.visitas_completadas,
-                "tasa_cumplimiento": row.tasa_cumplimiento or 0,
+                "visitador_id": row["id"],
+                "nombre": row["nombre"],
+                "visitas_programadas": int(row["visitas_programadas"]),
+                "visitas_completadas": int(row["visitas_completadas"]),
+                "tasa_cumplimiento": round(float(row["tasa_cumplimiento"] or 0), 1),
                 "badge": "🏆" if i == 1 else "🥈" if i == 2 else "🥉" if i == 3 else "📍"
             })
         
         return {
-            "periodo": "Últimos 30 días",
+            "periodo": periodo,
             "fecha_desde": fecha_inicio.strftime("%Y-%m-%d"),
             "total_visitadores": len(datos),
+            "total_registros": total,
             "ranking": datos
         }
     except Exception as e:
@@ -2717,34 +2452,30 @@ def obtener_rendimiento_visitadores(
 
 @router.get("/analytics/graficos/distribucion-geografica")
 def obtener_distribucion_geografica(
+    municipio_id: Optional[int] = None,
+    limit: int = 50,
+    offset: int = 0,
     db: Session = Depends(get_db),
     admin_user: models.Usuario = Depends(verificar_admin)
 ):
     """
     Obtiene distribución de visitas por municipio/institución.
+    Con `municipio_id` agrega el detalle del municipio: sus instituciones y
+    las sedes, paginadas con `limit`/`offset`.
     """
+    if limit < 1 or offset < 0:
+        raise HTTPException(status_code=400, detail="limit debe ser mayor que 0 y offset no puede ser negativo")
+    
     try:
         from datetime import datetime, timedelta
         
         # Últimos 30 días
         fecha_inicio = datetime.now() - timedelta(days=30)
         
-        # Por municipio
-        municipios = db.execute(text("""
-            SELECT 
-                m.nombre as municipio,
-                COUNT(vp.id) as visitas_programadas,
-                COUNT(vc.id) as visitas_completadas
-            FROM municipios m
-            LEFT JOIN sedes_educativas se ON m.id = se.municipio_id
-            LEFT JOIN visitas_asignadas vp ON se.id = vp.sede_id 
-                AND vp.fecha_programada >= :fecha_inicio
-            LEFT JOIN visitas_completas_pae vc ON se.id = vc.sede_id 
-                AND vc.fecha_visita >= :fecha_inicio
-            GROUP BY m.id, m.nombre
-            HAVING COUNT(vp.id) > 0
-            ORDER BY visitas_completadas DESC
-        """), {"fecha_inicio": fecha_inicio}).fetchall()
+        # Por municipio, desde los resúmenes diarios
+        resumenes = ResumenesDiariosService(db)
+        municipios = resumenes.por_municipio(fecha_inicio.date())
+        municipios.sort(key=lambda fila: fila["visitas_completadas"], reverse=True)
         
         # Por tipo de institución (simulado)
         tipos_institucion = [
@@ -2756,15 +2487,16 @@ def obtener_distribucion_geografica(
         
         municipios_data = []
         for row in municipios:
-            tasa = (row.visitas_completadas / row.visitas_programadas * 100) if row.visitas_programadas > 0 else 0
+            tasa = (row["visitas_completadas"] / row["visitas_programadas"] * 100) if row["visitas_programadas"] > 0 else 0
             municipios_data.append({
-                "municipio": row.municipio,
-                "visitas_programadas": row.visitas_programadas,
-                "visitas_completadas": row.visitas_completadas,
+                "municipio_id": row["municipio_id"],
+                "municipio": row["municipio"],
+                "visitas_programadas": row["visitas_programadas"],
+                "visitas_completadas": row["visitas_completadas"],
                 "tasa_cumplimiento": round(tasa, 1)
             })
         
-        return {
+        respuesta = {
             "periodo": "Últimos 30 días",
             "municipios": municipios_data,
             "tipos_institucion": tipos_institucion,
@@ -2773,6 +2505,29 @@ def obtener_distribucion_geografica(
                 "municipio_mas_activo": municipios_data[0]["municipio"] if municipios_data else None
             }
         }
+        
+        if municipio_id is not None:
+            # Detalle del municipio: instituciones completas y sedes paginadas
+            instituciones = resumenes.por_institucion(fecha_inicio.date(), municipio_id)
+            instituciones.sort(key=lambda fila: fila["visitas_completadas"], reverse=True)
+            total_sedes, sedes = resumenes.por_sede(fecha_inicio.date(), municipio_id, limite=limit, offset=offset)
+            
+            for fila in instituciones + sedes:
+                fila["visitas_programadas"] = int(fila["visitas_programadas"])
+                fila["visitas_completadas"] = int(fila["visitas_completadas"])
+                tasa = (fila["visitas_completadas"] / fila["visitas_programadas"] * 100) if fila["visitas_programadas"] > 0 else 0
+                fila["tasa_cumplimiento"] = round(tasa, 1)
+            
+            respuesta["detalle_municipio"] = {
+                "municipio_id": municipio_id,
+                "instituciones": instituciones,
+                "sedes": sedes,
+                "total_sedes": total_sedes,
+                "limit": limit,
+                "offset": offset
+            }
+        
+        return respuesta
     except Exception as e:
         print(f"❌ Error al obtener distribución: {e}")
         raise HTTPException(status_code=400, detail=f"Error al obtener distribución: {str(e)}")
@@ -3679,6 +3434,7 @@ def actualizar_usuario(
             usuario.contrasena_hash = pwd_context.hash(usuario_data['nueva_contrasena'])
         
         db.commit()
+        cache_usuarios.invalidar_usuario(usuario_id=usuario_id)
         db.refresh(usuario)
         
         return {
@@ -3729,6 +3485,7 @@ def eliminar_usuario(
         # Eliminar usuario
         db.delete(usuario)
         db.commit()
+        cache_usuarios.invalidar_usuario(usuario_id=usuario_id)
         
         return {
             "success": True,
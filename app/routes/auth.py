@@ -8,6 +8,7 @@ from jose import JWTError, jwt
 from datetime import datetime, timedelta
 from app import models, schemas
 from app.database import get_db
+from app.services.cache_usuarios import cache_usuarios
 import os # NUEVO: Para leer variables de entorno
 from fastapi import APIRouter
 from app.schemas import Login 
@@ -108,7 +109,7 @@ def _obtener_usuario_por_token(token: str, db: Session) -> models.Usuario:
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Token inválido o expirado")
 
-    usuario = db.query(models.Usuario).filter(models.Usuario.correo == correo).first()
+    usuario = cache_usuarios.obtener(db, correo, payload.get("exp"))
     if usuario is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Usuario del token no encontrado")
     
@@ -348,6 +349,7 @@ def cambiar_contrasena(
 
     usuario.contrasena = pwd_context.hash(datos.nueva)
     db.commit()
+    cache_usuarios.invalidar_usuario(usuario_id=usuario.id)
     return {"mensaje": "Contraseña actualizada correctamente"}
 
 # --- RUTAS DE RECUPERACIÓN DE CONTRASEÑA ---
@@ -503,6 +505,7 @@ def cambiar_contrasena_recuperacion(datos: dict, db: Session = Depends(get_db)):
         codigo_recuperacion.usado = True
         
         db.commit()
+        cache_usuarios.invalidar_usuario(usuario_id=usuario.id)
         
         # Enviar email de confirmación
         enviar_email_confirmacion(email, usuario.nombre)
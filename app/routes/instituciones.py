@@ -1,66 +1,33 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
 from typing import List
 from ..database import get_db
 from ..models import Institucion
 from ..schemas import InstitucionResponse
+from ..services.catalogo_geografico import catalogo_geografico
+from ..utils.cache_http import respuesta_json_cacheable
 
 router = APIRouter(prefix="", tags=["instituciones"])
 
 @router.get("/instituciones", response_model=List[InstitucionResponse])
-def get_instituciones(db: Session = Depends(get_db)):
-    """Obtener todas las instituciones desde instituciones_educativas"""
+def get_instituciones(request: Request, db: Session = Depends(get_db)):
+    """Obtener todas las instituciones (catálogo geográfico en memoria)"""
     try:
-        # Obtener instituciones únicas desde instituciones_educativas
-        sql = """
-            SELECT DISTINCT 
-                ie.institucion as nombre,
-                m.id as municipio_id,
-                ie.municipio
-            FROM instituciones_educativas ie
-            JOIN municipios m ON UPPER(m.nombre) = UPPER(ie.municipio)
-            ORDER BY ie.institucion, ie.municipio
-        """
-        result = db.execute(text(sql)).fetchall()
-        
-        instituciones = []
-        for idx, row in enumerate(result, 1):
-            instituciones.append({
-                "id": idx,  # ID secuencial
-                "nombre": row.nombre,
-                "dane": None,  # Campo opcional
-                "municipio_id": row.municipio_id
-            })
-        return instituciones
+        datos_json = catalogo_geografico.obtener(db).json(("instituciones",), lambda datos: datos.instituciones)
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener instituciones: {str(e)}")
 
 @router.get("/instituciones_por_municipio/{municipio_id}", response_model=List[InstitucionResponse])
-def get_instituciones_por_municipio(municipio_id: int, db: Session = Depends(get_db)):
-    """Obtener instituciones por municipio desde instituciones_educativas"""
+def get_instituciones_por_municipio(municipio_id: int, request: Request, db: Session = Depends(get_db)):
+    """Obtener instituciones por municipio (catálogo geográfico en memoria)"""
     try:
-        sql = """
-            SELECT DISTINCT 
-                ie.institucion as nombre,
-                m.id as municipio_id,
-                ie.municipio
-            FROM instituciones_educativas ie
-            JOIN municipios m ON UPPER(m.nombre) = UPPER(ie.municipio)
-            WHERE m.id = :municipio_id
-            ORDER BY ie.institucion
-        """
-        result = db.execute(text(sql), {"municipio_id": municipio_id}).fetchall()
-        
-        instituciones = []
-        for idx, row in enumerate(result, 1):
-            instituciones.append({
-                "id": idx,  # ID secuencial
-                "nombre": row.nombre,
-                "dane": None,  # Campo opcional
-                "municipio_id": row.municipio_id
-            })
-        return instituciones
+        datos_json = catalogo_geografico.obtener(db).json(
+            ("instituciones_por_municipio", municipio_id),
+            lambda datos: datos.instituciones_por_municipio.get(municipio_id, [])
+        )
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al obtener instituciones por municipio: {str(e)}")
 
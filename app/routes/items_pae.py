@@ -1,10 +1,13 @@
 # app/routes/items_pae.py
 
 from fastapi import APIRouter, HTTPException, Depends, status, Request
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from typing import List
 from .. import models, schemas
 from ..database import get_db
+from ..services.cache_usuarios import cache_usuarios
+from ..services.cache_checklist import cache_checklist
+from ..utils.cache_http import respuesta_json_cacheable
 from jose import JWTError, jwt
 import os
 
@@ -28,9 +31,7 @@ def verificar_token_simple(request: Request, db: Session = Depends(get_db)):
         if not correo:
             raise HTTPException(status_code=401, detail="Token inválido")
         
-        usuario = db.query(models.Usuario).options(
-            joinedload(models.Usuario.rol)
-        ).filter(models.Usuario.correo == correo).first()
+        usuario = cache_usuarios.obtener(db, correo, payload.get("exp"))
         
         if not usuario:
             raise HTTPException(status_code=401, detail="Usuario no encontrado")
@@ -41,21 +42,18 @@ def verificar_token_simple(request: Request, db: Session = Depends(get_db)):
 
 @router.get("/", response_model=List[schemas.ChecklistCategoriaBase])
 def listar_items_pae(
+    request: Request,
     db: Session = Depends(get_db),
     usuario_actual: models.Usuario = Depends(verificar_token_simple)
 ):
     """
     Lista todos los items del checklist PAE organizados por categorías.
+    Responde 304 si el cliente envía el ETag de la versión vigente.
     """
     try:
-        # Obtener todas las categorías con sus items
-        categorias = db.query(models.ChecklistCategoria).options(
-            joinedload(models.ChecklistCategoria.items)
-        ).order_by(models.ChecklistCategoria.id).all()
+        print(f"🔍 Usuario {usuario_actual.id} ({usuario_actual.nombre}) - Consultando checklist PAE")
         
-        print(f"🔍 Usuario {usuario_actual.id} ({usuario_actual.nombre}) - Encontradas {len(categorias)} categorías de checklist")
-        
-        return categorias
+        return respuesta_json_cacheable(request, cache_checklist.obtener_json(db))
         
     except Exception as e:
         print(f"❌ Error al listar items PAE: {str(e)}")
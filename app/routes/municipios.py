@@ -1,19 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
 from ..database import get_db
 from ..models import Municipio
 from ..schemas import MunicipioResponse
+from ..services.catalogo_geografico import catalogo_geografico
+from ..utils.cache_http import respuesta_json_cacheable
 
 router = APIRouter(prefix="", tags=["municipios"])
 
 @router.get("/municipios", response_model=List[MunicipioResponse])
-def get_municipios(db: Session = Depends(get_db)):
+def get_municipios(request: Request, db: Session = Depends(get_db)):
     """Obtener todos los municipios - Endpoint público sin autenticación"""
     try:
-        municipios = db.query(Municipio).order_by(Municipio.nombre).all()
-        print(f"📊 Municipios encontrados: {len(municipios)}")
-        return municipios
+        datos_json = catalogo_geografico.obtener(db).json(("municipios",), lambda datos: datos.municipios)
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         print(f"❌ Error al obtener municipios: {e}")
         raise HTTPException(status_code=500, detail=f"Error al obtener municipios: {str(e)}")
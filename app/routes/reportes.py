@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session
 from sqlalchemy import or_
 from typing import List, Optional
 from datetime import datetime, timedelta
@@ -8,12 +8,25 @@ from app import models
 from app.routes.auth import obtener_usuario_actual
 from pydantic import BaseModel
 from fastapi.responses import StreamingResponse
-from io import BytesIO
-import pandas as pd
-from openpyxl import load_workbook
+from io import StringIO
+import csv
+from app.database import SessionLocal
+from app.services.exportador_excel import ExportadorExcel, ColumnaExcel
 
 router = APIRouter(prefix="", tags=["Reportes"])
 
+# Columnas del reporte, en el mismo orden que se exportaban con pandas
+COLUMNAS_REPORTE = [
+    "id", "fecha_visita", "fecha_creacion", "contrato", "operador",
+    "caso_atencion_prioritaria", "estado", "observaciones",
+    "municipio", "institucion", "sede", "profesional",
+]
+
+# Filas leídas por lote desde el cursor del servidor
+TAMANO_LOTE_REPORTE = 1000
+# Filas acumuladas antes de enviar un bloque del CSV
+FILAS_POR_BLOQUE_CSV = 500
+
 class ReporteRequest(BaseModel):
     tipo_reporte: str  # "excel", "csv"
     fecha_inicio: Optional[str] = None
@@ -38,13 +51,14 @@ def generar_reporte(
         rol_usuario = usuario.rol.nombre
         print(f"🔍 Usuario {usuario.nombre} ({rol_usuario}) solicitando reporte")
         
+        if request.tipo_reporte not in ("excel", "csv"):
+            raise HTTPException(
+                status_code=400,
+                detail="Tipo de reporte no válido. Use 'excel' o 'csv'"
+            )
+        
         # Construir la consulta base
-        query = db.query(models.VisitaCompletaPAE).options(
-            joinedload(models.VisitaCompletaPAE.municipio),
-            joinedload(models.VisitaCompletaPAE.institucion),
-            joinedload(models.VisitaCompletaPAE.sede),
-            joinedload(models.VisitaCompletaPAE.profesional)
-        )
+        query = db.query(models.VisitaCompletaPAE)
         
         # Aplicar restricciones según el rol del usuario
         if rol_usuario == 'visitador':
@@ -126,79 +140,38 @@ def generar_reporte(
             )
             print(f"🔍 Búsqueda general aplicada: '{request.busqueda}'")
         
-        # Ejecutar la consulta
-        visitas = query.order_by(models.VisitaCompletaPAE.fecha_creacion.desc()).all()
+        # Proyección plana con los nombres relacionados, ordenada como antes
+        query = _proyectar_reporte(query).order_by(models.VisitaCompletaPAE.fecha_creacion.desc())
         
         print(f"📊 Generando reporte {request.tipo_reporte} para usuario {usuario.nombre}")
         print(f"   - Filtros aplicados: {request.dict()}")
-        print(f"   - Visitas encontradas: {len(visitas)}")
-        
-        # Preparar datos para el reporte
-        datos_reporte = []
-        for visita in visitas:
-            datos_reporte.append({
-                "id": visita.id,
-                "fecha_visita": visita.fecha_visita.isoformat() if visita.fecha_visita else None,
-                "fecha_creacion": visita.fecha_creacion.isoformat() if visita.fecha_creacion else None,
-                "contrato": visita.contrato,
-                "operador": visita.operador,
-                "caso_atencion_prioritaria": visita.caso_atencion_prioritaria,
-                "estado": visita.estado,
-                "observaciones": visita.observaciones,
-                "municipio": visita.municipio.nombre if visita.municipio else "N/A",
-                "institucion": visita.institucion.nombre if visita.institucion else "N/A",
-                "sede": visita.sede.nombre_sede if visita.sede else "N/A",
-                "profesional": visita.profesional.nombre if visita.profesional else "N/A",
-            })
+        
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
         
         # 🔥 GENERAR ARCHIVOS REALES
         if request.tipo_reporte == "excel":
-            # Generar Excel real
-            df = pd.DataFrame(datos_reporte)
-            
-            # Crear archivo Excel en memoria
-            output = BytesIO()
-            with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                df.to_excel(writer, sheet_name='Visitas', index=False)
-            
-            output.seek(0)
-            
-            # Preparar nombre del archivo
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            # Las filas se escriben al libro (write-only) a medida que se leen del cursor
             filename = f"reporte_visitas_{timestamp}.xlsx"
-            
-            print(f"✅ Excel generado: {filename} con {len(datos_reporte)} visitas")
-            
-            # Retornar archivo Excel
-            return StreamingResponse(
-                BytesIO(output.read()),
-                media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
+            exportador = ExportadorExcel(con_bordes=False)
+            total = exportador.agregar_hoja(
+                "Visitas",
+                [ColumnaExcel(columna) for columna in COLUMNAS_REPORTE],
+                _filas_reporte(query.yield_per(TAMANO_LOTE_REPORTE))
             )
             
-        elif request.tipo_reporte == "csv":
-            # Generar CSV real
-            df = pd.DataFrame(datos_reporte)
-            output = BytesIO()
-            df.to_csv(output, index=False, encoding='utf-8')
-            output.seek(0)
+            print(f"✅ Excel generado: {filename} con {total} visitas")
             
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"reporte_visitas_{timestamp}.csv"
+            return exportador.respuesta(filename)
             
-            print(f"✅ CSV generado: {filename} con {len(datos_reporte)} visitas")
-            
-            return StreamingResponse(
-                BytesIO(output.read()),
-                media_type="text/csv",
-                headers={"Content-Disposition": f"attachment; filename={filename}"}
-            )
-            
-        else:
-            raise HTTPException(
-                status_code=400,
-                detail="Tipo de reporte no válido. Use 'excel' o 'csv'"
-            )
+        # CSV: se genera y envía por bloques mientras se recorre el cursor
+        filename = f"reporte_visitas_{timestamp}.csv"
+        print(f"✅ Enviando CSV: {filename}")
+        
+        return StreamingResponse(
+            _generar_csv_reporte(query.statement),
+            media_type="text/csv",
+            headers={"Content-Disposition": f"attachment; filename={filename}"}
+        )
         
     except HTTPException:
         # Re-lanzar las excepciones HTTP que ya fueron creadas
@@ -208,4 +181,74 @@ def generar_reporte(
         raise HTTPException(
             status_code=500,
             detail=f"Error interno al generar el reporte: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+def _proyectar_reporte(query):
+    """Reduce la consulta de visitas a las columnas del reporte, con joins externos a los nombres."""
+    return query.with_entities(
+        models.VisitaCompletaPAE.id,
+        models.VisitaCompletaPAE.fecha_visita,
+        models.VisitaCompletaPAE.fecha_creacion,
+        models.VisitaCompletaPAE.contrato,
+        models.VisitaCompletaPAE.operador,
+        models.VisitaCompletaPAE.estado,
+        models.VisitaCompletaPAE.observaciones,
+        models.Municipio.nombre.label("municipio"),
+        models.Institucion.nombre.label("institucion"),
+        models.SedeEducativa.nombre_sede.label("sede"),
+        models.Usuario.nombre.label("profesional"),
+    ).outerjoin(
+        models.Municipio, models.Municipio.id == models.VisitaCompletaPAE.municipio_id
+    ).outerjoin(
+        models.Institucion, models.Institucion.id == models.VisitaCompletaPAE.institucion_id
+    ).outerjoin(
+        models.SedeEducativa, models.SedeEducativa.id == models.VisitaCompletaPAE.sede_id
+    ).outerjoin(
+        models.Usuario, models.Usuario.id == models.VisitaCompletaPAE.profesional_id
+    )
+
+def _filas_reporte(filas):
+    """Convierte las filas de `_proyectar_reporte` en listas en el orden de COLUMNAS_REPORTE."""
+    for fila in filas:
+        yield [
+            fila.id,
+            fila.fecha_visita.isoformat() if fila.fecha_visita else None,
+            fila.fecha_creacion.isoformat() if fila.fecha_creacion else None,
+            fila.contrato,
+            fila.operador,
+            # caso_atencion_prioritaria no se persiste; el modelo lo expone como "NO"
+            "NO",
+            fila.estado,
+            fila.observaciones,
+            fila.municipio or "N/A",
+            fila.institucion or "N/A",
+            fila.sede or "N/A",
+            fila.profesional or "N/A",
+        ]
+
+def _generar_csv_reporte(sentencia):
+    """
+    Genera el CSV por bloques. Usa su propia sesión porque el cuerpo se envía
+    después de que la ruta retorna; con yield_per la consulta usa un cursor del
+    lado del servidor (PostgreSQL) y la memoria se mantiene constante.
+    """
+    buffer = StringIO()
+    escritor = csv.writer(buffer, lineterminator="\n")
+    escritor.writerow(COLUMNAS_REPORTE)
+    
+    total = 0
+    db = SessionLocal()
+    try:
+        filas = db.execute(sentencia.execution_options(yield_per=TAMANO_LOTE_REPORTE))
+        for fila in _filas_reporte(filas):
+            escritor.writerow(fila)
+            total += 1
+            if total % FILAS_POR_BLOQUE_CSV == 0:
+                yield buffer.getvalue().encode("utf-8")
+                buffer.seek(0)
+                buffer.truncate(0)
+        
+        yield buffer.getvalue().encode("utf-8")
+        print(f"✅ CSV enviado con {total} visitas")
+    finally:
+        db.close()
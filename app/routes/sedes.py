@@ -1,36 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List
+from typing import List, Optional
 import traceback
 from ..database import get_db
 from ..models import SedeEducativa, Institucion, Municipio, Usuario
 from .. import models
-from ..schemas import SedeResponse, SedeEducativaCreate, SedeEducativaUpdate, SedeEducativaBasicaOut
+from ..schemas import SedeResponse, SedeEducativaCreate, SedeEducativaUpdate, SedeEducativaBasicaOut, SedeCercanaOut
+from ..services.indice_sedes import indice_sedes
+from ..services.catalogo_geografico import catalogo_geografico
+from ..utils.cache_http import respuesta_json_cacheable
 from ..routes.auth import obtener_usuario_actual, verificar_rol_permitido
 
 router = APIRouter(prefix="", tags=["sedes"])
 
 @router.get("/sedes", response_model=List[SedeEducativaBasicaOut])
-def get_sedes(db: Session = Depends(get_db)):
-    """Obtener todas las sedes desde la tabla sedes_educativas"""
+def get_sedes(request: Request, db: Session = Depends(get_db)):
+    """Obtener todas las sedes (catálogo geográfico en memoria)"""
     try:
-        sedes_db = db.query(models.SedeEducativa).order_by(models.SedeEducativa.nombre_sede).all()
-        
-        sedes = []
-        for sede in sedes_db:
-            sedes.append({
-                "id": sede.id,
-                "nombre": sede.nombre_sede,
-                "dane": sede.dane or "",  # Convertir None a string vacío
-                "due": sede.due or "",  # Convertir None a string vacío
-                "municipio_id": sede.municipio_id,
-                "institucion_id": sede.institucion_id,
-                "principal": sede.principal or False,
-                "lat": sede.lat,
-                "lon": sede.lon
-            })
-        return sedes
+        datos_json = catalogo_geografico.obtener(db).json(("sedes",), lambda datos: datos.sedes)
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         error_detail = f"Error al obtener sedes: {str(e)}\n{traceback.format_exc()}"
         raise HTTPException(status_code=500, detail=error_detail)
@@ -41,87 +30,96 @@ def test_sedes():
     return {"message": "Test endpoint funciona", "sedes": []}
 
 @router.get("/sedes_institucion/{institucion_id}", response_model=List[SedeEducativaBasicaOut])
-def get_sedes_institucion(institucion_id: int, db: Session = Depends(get_db)):
-    """Obtener sedes por institución desde la base de datos"""
+def get_sedes_institucion(institucion_id: int, request: Request, db: Session = Depends(get_db)):
+    """Obtener sedes por institución (catálogo geográfico en memoria)"""
     try:
-        # Consultar sedes directamente desde la tabla sedes_educativas
-        sedes = db.query(models.SedeEducativa).filter(
-            models.SedeEducativa.institucion_id == institucion_id
-        ).all()
-        
-        resultado = []
-        for sede in sedes:
-            resultado.append({
-                "id": sede.id,
-                "nombre": sede.nombre_sede,
-                "dane": sede.dane or "",  # Convertir None a string vacío
-                "due": sede.due or "",  # Convertir None a string vacío
-                "municipio_id": sede.municipio_id,
-                "institucion_id": sede.institucion_id,
-                "principal": sede.principal or False,
-                "lat": sede.lat,
-                "lon": sede.lon
-            })
-        
-        return resultado
+        datos_json = catalogo_geografico.obtener(db).json(
+            ("sedes_por_institucion", institucion_id),
+            lambda datos: datos.sedes_por_institucion.get(institucion_id, [])
+        )
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         error_detail = f"Error al obtener sedes por institución: {str(e)}\n{traceback.format_exc()}"
         raise HTTPException(status_code=500, detail=error_detail)
 
 @router.get("/sedes_por_institucion/{institucion_id}", response_model=List[SedeEducativaBasicaOut])
-def get_sedes_por_institucion(institucion_id: int, db: Session = Depends(get_db)):
-    """Obtener sedes por institución desde la base de datos"""
+def get_sedes_por_institucion(institucion_id: int, request: Request, db: Session = Depends(get_db)):
+    """Obtener sedes por institución (catálogo geográfico en memoria)"""
     try:
-        # Consultar sedes directamente desde la tabla sedes_educativas
-        sedes = db.query(models.SedeEducativa).filter(
-            models.SedeEducativa.institucion_id == institucion_id
-        ).all()
-        
-        resultado = []
-        for sede in sedes:
-            resultado.append({
-                "id": sede.id,
-                "nombre": sede.nombre_sede,
-                "dane": sede.dane or "",  # Convertir None a string vacío
-                "due": sede.due or "",  # Convertir None a string vacío
-                "municipio_id": sede.municipio_id,
-                "institucion_id": sede.institucion_id,
-                "principal": sede.principal or False,
-                "lat": sede.lat,
-                "lon": sede.lon
-            })
-        
-        return resultado
+        datos_json = catalogo_geografico.obtener(db).json(
+            ("sedes_por_institucion", institucion_id),
+            lambda datos: datos.sedes_por_institucion.get(institucion_id, [])
+        )
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         error_detail = f"Error al obtener sedes por institución: {str(e)}\n{traceback.format_exc()}"
         raise HTTPException(status_code=500, detail=error_detail)
 
 @router.get("/sedes_por_municipio/{municipio_id}", response_model=List[SedeEducativaBasicaOut])
-def get_sedes_por_municipio(municipio_id: int, db: Session = Depends(get_db)):
-    """Obtener sedes por municipio desde la vista consolidada"""
+def get_sedes_por_municipio(municipio_id: int, request: Request, db: Session = Depends(get_db)):
+    """Obtener sedes por municipio (catálogo geográfico en memoria)"""
     try:
-        sedes_db = db.query(models.SedeEducativa).filter(
-            models.SedeEducativa.municipio_id == municipio_id
-        ).order_by(models.SedeEducativa.nombre_sede).all()
-        
-        sedes = []
-        for sede in sedes_db:
-            sedes.append({
-                "id": sede.id,
-                "nombre": sede.nombre_sede,
-                "dane": sede.dane or "",  # Convertir None a string vacío
-                "due": sede.due or "",  # Convertir None a string vacío
-                "municipio_id": sede.municipio_id,
-                "institucion_id": sede.institucion_id,
-                "principal": sede.principal or False,
-                "lat": sede.lat,
-                "lon": sede.lon
-            })
-        return sedes
+        datos_json = catalogo_geografico.obtener(db).json(
+            ("sedes_por_municipio", municipio_id),
+            lambda datos: datos.sedes_por_municipio.get(municipio_id, [])
+        )
+        return respuesta_json_cacheable(request, datos_json)
     except Exception as e:
         error_detail = f"Error al obtener sedes por municipio: {str(e)}\n{traceback.format_exc()}"
         raise HTTPException(status_code=500, detail=error_detail)
 
+@router.get("/sedes/cercanas", response_model=List[SedeCercanaOut])
+def get_sedes_cercanas(
+    lat: float,
+    lon: float,
+    limite: int = 10,
+    radio_km: Optional[float] = None,
+    db: Session = Depends(get_db)
+):
+    """Obtener las sedes más cercanas a una posición GPS (índice espacial en memoria)"""
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise HTTPException(status_code=400, detail="Coordenadas fuera de rango")
+    if not 1 <= limite <= 100:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 100")
+    
+    try:
+        cercanas = indice_sedes.obtener(db).cercanas(lat, lon, limite, radio_km)
+        return [
+            {**sede._asdict(), "dane": sede.dane or "", "due": sede.due or "",
+             "principal": sede.principal or False, "distancia_km": round(distancia, 3)}
+            for distancia, sede in cercanas
+        ]
+    except Exception as e:
+        error_detail = f"Error al obtener sedes cercanas: {str(e)}\n{traceback.format_exc()}"
+        raise HTTPException(status_code=500, detail=error_detail)
+
+@router.get("/sedes/en-area", response_model=List[SedeEducativaBasicaOut])
+def get_sedes_en_area(
+    lat_min: float,
+    lat_max: float,
+    lon_min: float,
+    lon_max: float,
+    limite: int = 500,
+    db: Session = Depends(get_db)
+):
+    """Obtener las sedes dentro del área visible del mapa (índice espacial en memoria)"""
+    if lat_min > lat_max or lon_min > lon_max:
+        raise HTTPException(status_code=400, detail="El área debe cumplir lat_min <= lat_max y lon_min <= lon_max")
+    if not 1 <= limite <= 5000:
+        raise HTTPException(status_code=400, detail="limite debe estar entre 1 y 5000")
+    
+    try:
+        sedes = indice_sedes.obtener(db).en_area(lat_min, lat_max, lon_min, lon_max)
+        sedes.sort(key=lambda sede: sede.nombre)
+        return [
+            {**sede._asdict(), "dane": sede.dane or "", "due": sede.due or "",
+             "principal": sede.principal or False}
+            for sede in sedes[:limite]
+        ]
+    except Exception as e:
+        error_detail = f"Error al obtener sedes del área: {str(e)}\n{traceback.format_exc()}"
+        raise HTTPException(status_code=500, detail=error_detail)
+
 @router.get("/sedes/{sede_id}", response_model=SedeEducativaBasicaOut)
 def get_sede(sede_id: int, db: Session = Depends(get_db)):
     """Obtener una sede específica por ID desde la vista consolidada"""
@@ -203,6 +201,8 @@ def crear_sede(
         db.add(nueva_sede)
         db.commit()
         db.refresh(nueva_sede)
+        indice_sedes.invalidar()
+        catalogo_geografico.invalidar()
         
         print(f"✅ Nueva sede creada por {usuario.nombre} ({usuario.rol.nombre}): {nueva_sede.nombre_sede} (ID: {nueva_sede.id})")
         print(f"   - DANE: {nueva_sede.dane}")
@@ -300,6 +300,8 @@ def actualizar_sede(
         
         db.commit()
         db.refresh(sede)
+        indice_sedes.invalidar()
+        catalogo_geografico.invalidar()
         
         print(f"✅ Sede actualizada por {usuario.nombre} ({usuario.rol.nombre}): {sede.nombre_sede} (ID: {sede.id})")
         print(f"   - DANE: {sede.dane}")
@@ -348,6 +350,8 @@ def eliminar_sede(
         nombre_sede = sede.nombre_sede
         db.delete(sede)
         db.commit()
+        indice_sedes.invalidar()
+        catalogo_geografico.invalidar()
         
         print(f"✅ Sede eliminada por {usuario.nombre} ({usuario.rol.nombre}): {nombre_sede} (ID: {sede_id})")
         
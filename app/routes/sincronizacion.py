@@ -0,0 +1,42 @@
+# app/routes/sincronizacion.py
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ..database import get_db
+from ..dependencies import get_current_user
+from ..models import Usuario
+from ..services.cambios_sincronizacion import CambiosSincronizacionService, LIMITE_MAXIMO_CAMBIOS
+
+router = APIRouter(prefix="/sincronizacion", tags=["Sincronización"])
+
+@router.get("/cambios")
+def obtener_cambios(
+    cursor: Optional[int] = Query(None, ge=0, description="Cursor devuelto por la consulta anterior"),
+    limite: int = Query(500, ge=1, le=LIMITE_MAXIMO_CAMBIOS, description="Entradas del registro de cambios por página"),
+    current_user: Usuario = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """
+    Cambios desde `cursor` en las visitas asignadas y completas del usuario,
+    sus notificaciones, las sedes y los ítems del checklist. Por entidad se
+    devuelven los registros con sus datos actuales (`actualizados`) y los ids
+    que el cliente debe borrar (`eliminados`).
+
+    Sin cursor solo se devuelve el cursor vigente con
+    `requiere_carga_completa`: la app lo guarda, descarga todo con los
+    endpoints normales y luego pide los cambios desde ese cursor. Si
+    `hay_mas` es verdadero hay que volver a consultar con el nuevo cursor.
+    Un cursor anterior a la retención del registro también recibe
+    `requiere_carga_completa`.
+    """
+    try:
+        servicio = CambiosSincronizacionService(db)
+        servicio.depurar_si_corresponde()
+        if cursor is None:
+            return servicio.carga_completa()
+        return servicio.listar(current_user.id, cursor, limite)
+    except Exception as e:
+        print(f"❌ Error al obtener cambios de sincronización: {e}")
+        raise HTTPException(status_code=500, detail=f"Error al obtener cambios: {str(e)}")
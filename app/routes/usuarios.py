@@ -4,6 +4,7 @@ from typing import List
 from datetime import datetime
 from .. import models, schemas
 from ..database import get_db
+from ..services.cache_usuarios import cache_usuarios
 from jose import JWTError, jwt
 import os
 
@@ -27,9 +28,7 @@ def verificar_token_simple(request: Request, db: Session = Depends(get_db)):
         if not correo:
             raise HTTPException(status_code=401, detail="Token inválido")
         
-        usuario = db.query(models.Usuario).options(
-            joinedload(models.Usuario.rol)
-        ).filter(models.Usuario.correo == correo).first()
+        usuario = cache_usuarios.obtener(db, correo, payload.get("exp"))
         
         if not usuario:
             raise HTTPException(status_code=401, detail="Usuario no encontrado")
@@ -1,6 +1,6 @@
 # app/routes/visitas.py
 
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, Query, Path, status
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Request, Query, Path, status, Response
 from sqlalchemy.orm import Session, joinedload
 from app import models, schemas
 from app.database import get_db
@@ -13,47 +13,18 @@ import os
 
 # Asumo que estas dependencias vienen de tu archivo auth.py
 from app.dependencies import get_current_user 
+from app.utils.paginacion import listar_visitas_paginadas, respuesta_listado, LIMITE_MAXIMO_PAGINA
+from app.utils.cache_http import respuesta_json_cacheable
+from app.services.cache_checklist import cache_checklist
+from app.services.cache_usuarios import cache_usuarios
 
 router = APIRouter(
     tags=["Visitas y Sedes"] # Agrupa las rutas en la documentación de Swagger
 )
 
-# --- ENDPOINTS DE CONSULTA GEOGRÁFICA (NORMALIZADOS) ---
-# Nota: Los municipios se manejan en app/routes/municipios.py
-
-@router.get("/instituciones", response_model=List[schemas.InstitucionOut])
-def listar_instituciones(db: Session = Depends(get_db)):
-    """
-    Obtiene una lista de todas las instituciones educativas.
-    """
-    return db.query(models.Institucion).order_by(models.Institucion.nombre).all()
-
-@router.get("/instituciones_por_municipio/{municipio_id}", response_model=List[schemas.InstitucionOut])
-def listar_instituciones_por_municipio(municipio_id: int, db: Session = Depends(get_db)):
-    """
-    Obtiene las instituciones educativas de un municipio específico.
-    """
-    return db.query(models.Institucion).filter(
-        models.Institucion.municipio_id == municipio_id
-    ).order_by(models.Institucion.nombre).all()
-
-@router.get("/sedes_por_municipio/{municipio_id}", response_model=List[schemas.SedeEducativaSimpleOut])
-def listar_sedes_por_municipio(municipio_id: int, db: Session = Depends(get_db)):
-    """
-    Obtiene las sedes educativas de un municipio específico.
-    """
-    return db.query(models.SedeEducativa).filter(
-        models.SedeEducativa.municipio_id == municipio_id
-    ).order_by(models.SedeEducativa.nombre).all()
-
-@router.get("/sedes_por_institucion/{institucion_id}", response_model=List[schemas.SedeEducativaSimpleOut])
-def listar_sedes_por_institucion(institucion_id: int, db: Session = Depends(get_db)):
-    """
-    Obtiene las sedes educativas de una institución específica.
-    """
-    return db.query(models.SedeEducativa).filter(
-        models.SedeEducativa.institucion_id == institucion_id
-    ).order_by(models.SedeEducativa.nombre).all()
+# --- ENDPOINTS DE CONSULTA GEOGRÁFICA ---
+# Nota: Los municipios, instituciones y sedes se sirven desde el catálogo geográfico
+# en app/routes/municipios.py, app/routes/instituciones.py y app/routes/sedes.py
 
 # --- ENDPOINTS DE VISITAS (CRUD Y LÓGICA DE NEGOCIO) ---
 
@@ -134,6 +105,10 @@ def listar_visitas_para_admin(
 @router.get("/visitas/todas", response_model=List[schemas.VisitaCompletaPAEOut])
 def listar_todas_visitas(
     request: Request,
+    response: Response,
+    vista: str = Query("completa", description="'completa' o 'resumen' (sin checklist ni objetos anidados)"),
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO_PAGINA, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor recibido en el encabezado X-Siguiente-Cursor"),
     db: Session = Depends(get_db),
     usuario: models.Usuario = Depends(get_current_user)
 ):
@@ -148,13 +123,8 @@ def listar_todas_visitas(
                 detail="No tienes permiso para ver todas las visitas."
             )
         
-        # Obtener todas las visitas con relaciones cargadas
-        query = db.query(models.VisitaCompletaPAE).options(
-            joinedload(models.VisitaCompletaPAE.municipio),
-            joinedload(models.VisitaCompletaPAE.institucion),
-            joinedload(models.VisitaCompletaPAE.sede),
-            joinedload(models.VisitaCompletaPAE.profesional)
-        )
+        # Obtener todas las visitas (las relaciones se cargan según la vista)
+        query = db.query(models.VisitaCompletaPAE)
         
         # Si es supervisor, mostrar solo visitas de su área
         if usuario.rol.nombre == 'supervisor':
@@ -162,13 +132,13 @@ def listar_todas_visitas(
             # En el futuro se puede filtrar por área geográfica
             pass
         
-        visitas = query.order_by(models.VisitaCompletaPAE.fecha_creacion.desc()).all()
+        visitas = listar_visitas_paginadas(query, response, vista=vista, limite=limite, cursor=cursor)
         
         print(f"🔍 Usuario {usuario.id} ({usuario.nombre}) - Encontradas {len(visitas)} visitas totales")
-        for visita in visitas:
-            print(f"   - Visita ID: {visita.id}, Estado: {visita.estado}, Profesional: {visita.profesional.nombre}")
         
-        return visitas
+        return respuesta_listado(visitas, response)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error al listar todas las visitas: {str(e)}")
         raise HTTPException(
@@ -179,31 +149,32 @@ def listar_todas_visitas(
 @router.get("/visitas/mis-visitas", response_model=List[schemas.VisitaCompletaPAEOut])
 def listar_mis_visitas(
     request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     usuario: models.Usuario = Depends(get_current_user),
-    estado: Optional[str] = Query(None, description="Filtrar por estado: 'pendiente' o 'completada'")
+    estado: Optional[str] = Query(None, description="Filtrar por estado: 'pendiente' o 'completada'"),
+    vista: str = Query("completa", description="'completa' o 'resumen' (sin checklist ni objetos anidados)"),
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO_PAGINA, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor recibido en el encabezado X-Siguiente-Cursor")
 ):
     """
     Obtiene la lista de visitas completas PAE asignadas al usuario actualmente autenticado.
     """
     try:
-        query = db.query(models.VisitaCompletaPAE).options(
-            joinedload(models.VisitaCompletaPAE.municipio),
-            joinedload(models.VisitaCompletaPAE.institucion),
-            joinedload(models.VisitaCompletaPAE.sede),
-            joinedload(models.VisitaCompletaPAE.profesional)
-        ).filter(models.VisitaCompletaPAE.profesional_id == usuario.id)
+        query = db.query(models.VisitaCompletaPAE).filter(
+            models.VisitaCompletaPAE.profesional_id == usuario.id
+        )
         
         if estado:
             query = query.filter(models.VisitaCompletaPAE.estado == estado)
         
-        visitas = query.order_by(models.VisitaCompletaPAE.fecha_creacion.desc()).all()
+        visitas = listar_visitas_paginadas(query, response, vista=vista, limite=limite, cursor=cursor)
         
         print(f"🔍 Usuario {usuario.id} ({usuario.nombre}) - Encontradas {len(visitas)} visitas")
-        for visita in visitas:
-            print(f"   - Visita ID: {visita.id}, Estado: {visita.estado}")
         
-        return visitas
+        return respuesta_listado(visitas, response)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error al listar mis visitas: {str(e)}")
         raise HTTPException(
@@ -372,6 +343,7 @@ def cambiar_contrasena(
         # Actualizar en la base de datos
         usuario.contrasena = contrasena_nueva_hash
         db.commit()
+        cache_usuarios.invalidar_usuario(usuario_id=usuario.id)
         
         return {"message": "Contraseña actualizada exitosamente"}
         
@@ -407,17 +379,13 @@ def _validar_seguridad_contrasena(contrasena: str) -> str:
 # --- ENDPOINTS PARA EL CHECKLIST ---
 
 @router.get("/checklist", response_model=List[schemas.ChecklistCategoriaBase])
-def get_full_checklist(db: Session = Depends(get_db)):
+def get_full_checklist(request: Request, db: Session = Depends(get_db)):
     """
-    Obtiene el checklist completo con categorías e items desde la base de datos.
+    Obtiene el checklist completo con categorías e items (caché en memoria).
+    Responde 304 si el cliente envía el ETag de la versión vigente.
     """
     try:
-        # Obtener todas las categorías con sus items
-        categorias = db.query(models.ChecklistCategoria).options(
-            joinedload(models.ChecklistCategoria.items)
-        ).all()
-        
-        return categorias
+        return respuesta_json_cacheable(request, cache_checklist.obtener_json(db))
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -3,9 +3,11 @@
 from fastapi import APIRouter, HTTPException, Depends, status, Request, Query
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from .. import models, schemas
 from ..database import get_db
+from ..services.cache_usuarios import cache_usuarios
+from ..services.rutas_visitas import ParadaRuta, distancia_km, optimizar_ruta
 from jose import JWTError, jwt
 import os
 
@@ -29,9 +31,7 @@ def verificar_token_simple(request: Request, db: Session = Depends(get_db)):
         if not correo:
             raise HTTPException(status_code=401, detail="Token inválido")
         
-        usuario = db.query(models.Usuario).options(
-            joinedload(models.Usuario.rol)
-        ).filter(models.Usuario.correo == correo).first()
+        usuario = cache_usuarios.obtener(db, correo, payload.get("exp"))
         
         if not usuario:
             raise HTTPException(status_code=401, detail="Usuario no encontrado")
@@ -294,6 +294,127 @@ def obtener_visitas_asignadas_por_supervisor(
             detail=f"Error al obtener visitas asignadas por supervisor: {str(e)}"
         )
 
+@router.get("/ruta")
+def obtener_ruta_visitador(
+    fecha: Optional[date] = Query(None, description="Día de la ruta (por defecto hoy)"),
+    vista: str = Query("dia", description="dia o semana (lunes a domingo, una ruta por día)"),
+    visitador_id: Optional[int] = Query(None, description="Visitador (solo supervisores y administradores)"),
+    lat: Optional[float] = Query(None, description="Latitud de partida (posición actual)"),
+    lon: Optional[float] = Query(None, description="Longitud de partida (posición actual)"),
+    db: Session = Depends(get_db),
+    usuario_actual: models.Usuario = Depends(verificar_token_simple)
+):
+    """
+    Ordena las visitas pendientes del visitador para un día o una semana y
+    minimiza la distancia recorrida entre sedes (vecino más cercano + 2-opt).
+    """
+    if vista not in ("dia", "semana"):
+        raise HTTPException(status_code=400, detail="vista debe ser 'dia' o 'semana'")
+    if (lat is None) != (lon is None):
+        raise HTTPException(status_code=400, detail="Debe enviar lat y lon juntos")
+    
+    es_visitador = usuario_actual.rol and usuario_actual.rol.nombre.lower() == 'visitador'
+    if visitador_id is None:
+        visitador_id = usuario_actual.id
+    elif es_visitador and visitador_id != usuario_actual.id:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="No tienes permisos para ver la ruta de otro visitador."
+        )
+    
+    try:
+        fecha = fecha or date.today()
+        if vista == "semana":
+            fecha_desde = fecha - timedelta(days=fecha.weekday())
+            fecha_hasta = fecha_desde + timedelta(days=6)
+        else:
+            fecha_desde = fecha_hasta = fecha
+        
+        visitas = db.query(
+            models.VisitaAsignada.id,
+            models.VisitaAsignada.sede_id,
+            models.VisitaAsignada.fecha_programada,
+            models.VisitaAsignada.estado,
+            models.SedeEducativa.nombre_sede,
+            models.SedeEducativa.lat,
+            models.SedeEducativa.lon
+        ).outerjoin(
+            models.SedeEducativa, models.VisitaAsignada.sede_id == models.SedeEducativa.id
+        ).filter(
+            models.VisitaAsignada.visitador_id == visitador_id,
+            models.VisitaAsignada.fecha_programada >= datetime.combine(fecha_desde, datetime.min.time()),
+            models.VisitaAsignada.fecha_programada < datetime.combine(fecha_hasta + timedelta(days=1), datetime.min.time()),
+            models.VisitaAsignada.estado.in_(["pendiente", "en_proceso"])
+        ).order_by(models.VisitaAsignada.fecha_programada, models.VisitaAsignada.id).all()
+        
+        por_dia = {}
+        for visita in visitas:
+            por_dia.setdefault(visita.fecha_programada.date(), []).append(visita)
+        
+        origen = (lat, lon) if lat is not None else None
+        rutas = []
+        for dia, visitas_dia in sorted(por_dia.items()):
+            con_coordenadas = [v for v in visitas_dia if v.lat is not None and v.lon is not None]
+            sin_coordenadas = [v for v in visitas_dia if v.lat is None or v.lon is None]
+            
+            paradas = [ParadaRuta(v, v.lat, v.lon) for v in con_coordenadas]
+            ordenadas, distancia_total = optimizar_ruta(paradas, origen)
+            
+            # Distancia siguiendo el orden por hora programada, como referencia
+            puntos_programados = ([origen] if origen else []) + [(p.lat, p.lon) for p in paradas]
+            distancia_programada = sum(
+                distancia_km(puntos_programados[i - 1], puntos_programados[i])
+                for i in range(1, len(puntos_programados))
+            )
+            
+            paradas_out = []
+            anterior = origen
+            for orden, parada in enumerate(ordenadas, 1):
+                actual = (parada.lat, parada.lon)
+                paradas_out.append({
+                    "orden": orden,
+                    "visita_id": parada.clave.id,
+                    "sede_id": parada.clave.sede_id,
+                    "sede_nombre": parada.clave.nombre_sede,
+                    "lat": parada.lat,
+                    "lon": parada.lon,
+                    "fecha_programada": parada.clave.fecha_programada,
+                    "estado": parada.clave.estado,
+                    "distancia_desde_anterior_km": round(distancia_km(anterior, actual), 2) if anterior else 0.0
+                })
+                anterior = actual
+            
+            rutas.append({
+                "fecha": dia.strftime("%Y-%m-%d"),
+                "paradas": paradas_out,
+                "distancia_total_km": round(distancia_total, 2),
+                "distancia_orden_programado_km": round(distancia_programada, 2),
+                "sin_coordenadas": [
+                    {"visita_id": v.id, "sede_id": v.sede_id, "sede_nombre": v.nombre_sede}
+                    for v in sin_coordenadas
+                ]
+            })
+        
+        print(f"🗺️ Ruta de visitador {visitador_id}: {len(visitas)} visitas en {len(rutas)} días")
+        
+        return {
+            "visitador_id": visitador_id,
+            "vista": vista,
+            "fecha_desde": fecha_desde.strftime("%Y-%m-%d"),
+            "fecha_hasta": fecha_hasta.strftime("%Y-%m-%d"),
+            "total_visitas": len(visitas),
+            "rutas": rutas
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error al calcular ruta: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al calcular ruta: {str(e)}"
+        )
+
 @router.put("/{visita_id}/estado")
 def actualizar_estado_visita(
     visita_id: int,
@@ -1,7 +1,9 @@
 # app/routes/visitas_completas.py
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query
-from sqlalchemy.orm import Session, joinedload
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Response
+from sqlalchemy.orm import Session
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from datetime import datetime
 try:
@@ -11,15 +13,17 @@ except ImportError:
     PANDAS_AVAILABLE = False
     print("⚠️ pandas no está disponible. La generación de Excel estará deshabilitada.")
 
-from io import BytesIO
-from fastapi.responses import StreamingResponse
 import os
-from openpyxl import Workbook
-from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 
 from app import models, schemas
 from app.database import get_db
+from app.config import LOTE_VISITAS_MAX_ITEMS
 from app.dependencies import get_current_user
+from app.utils.paginacion import listar_visitas_paginadas, respuesta_listado, LIMITE_MAXIMO_PAGINA
+from app.services.cache_checklist import cache_checklist
+from app.services.sincronizacion_service import SincronizacionService, reconciliar_asignadas_del_visitador
+from app.services.numeracion_visitas import NumeracionVisitasService
+from app.services.exportador_excel import ExportadorExcel, ColumnaExcel
 
 router = APIRouter()
 
@@ -33,6 +37,234 @@ def normalizar_sede(sede):
             sede.due = ""
     return sede
 
+def _insertar_respuestas_checklist(db: Session, visita_id: int, respuestas) -> int:
+    """
+    Inserta todas las respuestas del checklist de una visita en una sola sentencia
+    (executemany), resolviendo la categoría real de cada ítem desde la caché del checklist.
+    """
+    if not respuestas:
+        return 0
+    
+    categorias = cache_checklist.categorias_de(db, (r.item_id for r in respuestas))
+    faltantes = sorted({r.item_id for r in respuestas} - categorias.keys())
+    if faltantes:
+        raise HTTPException(status_code=400, detail=f"Items del checklist no encontrados: {faltantes}")
+    
+    ahora = datetime.utcnow()
+    db.execute(
+        insert(models.VisitaRespuestaCompleta),
+        [
+            {
+                "visita_id": visita_id,
+                "categoria_id": categorias[r.item_id],
+                "item_id": r.item_id,
+                "respuesta": r.respuesta,
+                "observacion": r.observacion,
+                "fecha_respuesta": ahora,
+            }
+            for r in respuestas
+        ]
+    )
+    return len(respuestas)
+
+def _construir_visita_out(visita, municipio, institucion, sede, profesional, respuestas) -> schemas.VisitaCompletaPAEOut:
+    """
+    Construye la respuesta de una visita recién creada con los objetos ya cargados,
+    sin volver a consultarla. Debe llamarse antes del commit (que expira los objetos).
+    """
+    campos = (
+        "id", "fecha_visita", "contrato", "operador", "caso_atencion_prioritaria",
+        "municipio_id", "institucion_id", "sede_id", "profesional_id",
+        "fecha_creacion", "estado", "observaciones", "numero_visita_usuario"
+    )
+    datos = {campo: getattr(visita, campo) for campo in campos}
+    datos.update(
+        municipio=municipio,
+        institucion=institucion,
+        sede=sede,
+        profesional=profesional,
+        respuestas_checklist=[r.model_dump() for r in respuestas],
+    )
+    return schemas.VisitaCompletaPAEOut.model_validate(datos, from_attributes=True)
+
+COLUMNAS_EXCEL_VISITAS = [
+    ColumnaExcel('ID Visita', 12),
+    ColumnaExcel('Fecha', 18),
+    ColumnaExcel('Contrato', 15),
+    ColumnaExcel('Operador', 15),
+    ColumnaExcel('Caso Prioritario', 18),
+    ColumnaExcel('Municipio', 20),
+    ColumnaExcel('Institución', 25),
+    ColumnaExcel('Sede', 30),
+    ColumnaExcel('Profesional', 20),
+    ColumnaExcel('Item ID', 10),
+    ColumnaExcel('Pregunta', 50),
+    ColumnaExcel('Respuesta', 30),
+    ColumnaExcel('Observaciones', 40),
+    ColumnaExcel('Evidencia', 25),
+]
+
+# Filas leídas por lote desde el cursor al exportar varias visitas
+TAMANO_LOTE_EXCEL = 1000
+
+def _consulta_filas_excel(db: Session):
+    """
+    Consulta plana (visita + nombres relacionados + respuesta) para las exportaciones
+    a Excel. Las visitas sin respuestas aparecen una vez con los campos de respuesta en NULL.
+    """
+    return db.query(
+        models.VisitaCompletaPAE.id.label("visita_id"),
+        models.VisitaCompletaPAE.fecha_visita,
+        models.VisitaCompletaPAE.contrato,
+        models.VisitaCompletaPAE.operador,
+        models.Municipio.nombre.label("municipio_nombre"),
+        models.Institucion.nombre.label("institucion_nombre"),
+        models.SedeEducativa.nombre_sede.label("sede_nombre"),
+        models.Usuario.nombre.label("profesional_nombre"),
+        models.VisitaRespuestaCompleta.item_id,
+        models.VisitaRespuestaCompleta.respuesta,
+        models.VisitaRespuestaCompleta.observacion,
+    ).select_from(models.VisitaCompletaPAE).outerjoin(
+        models.Municipio, models.Municipio.id == models.VisitaCompletaPAE.municipio_id
+    ).outerjoin(
+        models.Institucion, models.Institucion.id == models.VisitaCompletaPAE.institucion_id
+    ).outerjoin(
+        models.SedeEducativa, models.SedeEducativa.id == models.VisitaCompletaPAE.sede_id
+    ).outerjoin(
+        models.Usuario, models.Usuario.id == models.VisitaCompletaPAE.profesional_id
+    ).outerjoin(
+        models.VisitaRespuestaCompleta,
+        models.VisitaRespuestaCompleta.visita_id == models.VisitaCompletaPAE.id
+    )
+
+def _filas_excel_visitas(db: Session, consulta):
+    """
+    Genera las filas del Excel a partir de `_consulta_filas_excel`, leyendo por lotes.
+    Las preguntas se toman de la caché del checklist en lugar de consultar cada ítem.
+    """
+    items = cache_checklist.obtener_items(db)
+    filas = consulta.order_by(
+        models.VisitaCompletaPAE.fecha_visita,
+        models.VisitaCompletaPAE.id,
+        models.VisitaRespuestaCompleta.id,
+    ).yield_per(TAMANO_LOTE_EXCEL)
+    
+    for fila in filas:
+        datos_visita = [
+            fila.visita_id,
+            fila.fecha_visita.strftime('%Y-%m-%d %H:%M') if fila.fecha_visita else 'N/A',
+            fila.contrato or 'N/A',
+            fila.operador or 'N/A',
+            # caso_atencion_prioritaria no se persiste; el modelo lo expone como "NO"
+            'NO',
+            fila.municipio_nombre or 'N/A',
+            fila.institucion_nombre or 'N/A',
+            fila.sede_nombre or 'N/A',
+            fila.profesional_nombre or 'N/A',
+        ]
+        
+        if fila.item_id is None:
+            yield datos_visita + ['N/A', 'No hay respuestas registradas', 'N/A', 'N/A', 'N/A']
+            continue
+        
+        item = items.get(fila.item_id)
+        if item is None:
+            print(f"⚠️ Item con ID {fila.item_id} no encontrado")
+            continue
+        
+        yield datos_visita + [
+            item.id,
+            item.pregunta_texto or 'N/A',
+            fila.respuesta or 'N/A',
+            fila.observacion or 'N/A',
+            'N/A'  # Evidencia
+        ]
+
+def _registrar_visita_completa(db: Session, datos, profesional, numero_visita_usuario: int, supervisor=None):
+    """
+    Crea la visita completa con sus respuestas y completa (o crea) la visita asignada
+    correspondiente. No hace commit. `supervisor` permite reutilizar el supervisor por
+    defecto entre varias visitas del mismo lote.
+    """
+    # Crear la visita completa
+    visita_completa = models.VisitaCompletaPAE(
+        fecha_visita=datos.fecha_visita,
+        contrato=datos.contrato,
+        operador=datos.operador,
+        municipio_id=datos.municipio_id,
+        institucion_id=datos.institucion_id,
+        sede_id=datos.sede_id,
+        profesional_id=datos.profesional_id,
+        observaciones=datos.observaciones,
+        estado="completada",  # Se marca como completada inmediatamente
+        numero_visita_usuario=numero_visita_usuario
+    )
+    # Asignar caso_atencion_prioritaria usando el setter (es una propiedad)
+    visita_completa.caso_atencion_prioritaria = datos.caso_atencion_prioritaria
+    
+    db.add(visita_completa)
+    db.flush()  # Para obtener el ID
+    
+    # Guardar las respuestas del checklist en una sola sentencia
+    _insertar_respuestas_checklist(db, visita_completa.id, datos.respuestas_checklist)
+    
+    # IMPORTANTE: Crear o actualizar la visita asignada correspondiente
+    print(f"🔍 Buscando visita asignada para sincronizar...")
+    print(f"   - Sede ID: {datos.sede_id}")
+    print(f"   - Profesional ID: {datos.profesional_id}")
+    print(f"   - Contrato: {datos.contrato}")
+    
+    # Buscar la visita asignada que coincida con estos datos
+    visita_asignada = db.query(models.VisitaAsignada).filter(
+        models.VisitaAsignada.sede_id == datos.sede_id,
+        models.VisitaAsignada.visitador_id == datos.profesional_id,
+        models.VisitaAsignada.contrato == datos.contrato,
+        models.VisitaAsignada.estado.in_(["pendiente", "en_proceso"])
+    ).first()
+    
+    if visita_asignada:
+        print(f"✅ Visita asignada encontrada: ID {visita_asignada.id}, Estado actual: {visita_asignada.estado}")
+        print(f"🔄 Actualizando estado de visita asignada ID {visita_asignada.id} de '{visita_asignada.estado}' a 'completada'")
+        visita_asignada.estado = "completada"
+        visita_asignada.fecha_completada = datetime.utcnow()
+        print(f"✅ Visita asignada ID {visita_asignada.id} actualizada a 'completada'")
+    else:
+        print(f"⚠️ No se encontró visita asignada correspondiente para sincronizar")
+        # Si no existe visita asignada, crear una nueva
+        print(f"🆕 No se encontró visita asignada correspondiente. Creando nueva visita asignada...")
+        
+        # Obtener el supervisor (asumimos que es el usuario con rol supervisor)
+        if supervisor is None:
+            supervisor = db.query(models.Usuario).join(models.Rol).filter(
+                models.Rol.nombre == "supervisor"
+            ).first()
+        
+        if not supervisor:
+            print("⚠️ No se encontró supervisor, usando profesional como supervisor")
+            supervisor = profesional
+        
+        nueva_visita_asignada = models.VisitaAsignada(
+            sede_id=datos.sede_id,
+            visitador_id=datos.profesional_id,
+            supervisor_id=supervisor.id,
+            fecha_programada=datos.fecha_visita,
+            tipo_visita="PAE",  # Valor por defecto
+            prioridad="normal",  # Valor por defecto
+            estado="completada",  # Se marca como completada inmediatamente
+            contrato=datos.contrato,
+            operador=datos.operador,
+            caso_atencion_prioritaria=datos.caso_atencion_prioritaria,
+            municipio_id=datos.municipio_id,
+            institucion_id=datos.institucion_id,
+            observaciones=datos.observaciones,
+            fecha_completada=datetime.utcnow()
+        )
+        
+        db.add(nueva_visita_asignada)
+        print(f"✅ Nueva visita asignada creada con ID {nueva_visita_asignada.id}")
+    
+    return visita_completa
+
 @router.post("/test-crear-cronograma")
 def test_crear_cronograma(
     datos: schemas.VisitaCompletaPAECreate,
@@ -82,16 +314,8 @@ def test_crear_cronograma(
         
         print(f"✅ Visita completa creada con ID: {visita_completa.id}")
         
-        # Crear respuestas del checklist
-        for respuesta_data in datos.respuestas_checklist:
-            respuesta = models.VisitaRespuestaCompleta(
-                visita_id=visita_completa.id,
-                categoria_id=1,  # Por defecto
-                item_id=respuesta_data.item_id,
-                respuesta=respuesta_data.respuesta,
-                observacion=respuesta_data.observacion
-            )
-            db.add(respuesta)
+        # Crear respuestas del checklist (inserción masiva)
+        _insertar_respuestas_checklist(db, visita_completa.id, datos.respuestas_checklist)
         
         print(f"✅ Respuestas del checklist creadas: {len(datos.respuestas_checklist)}")
         
@@ -154,6 +378,7 @@ def test_crear_cronograma(
 @router.post("/visitas-completas-pae", response_model=schemas.VisitaCompletaPAEOut)
 def crear_visita_completa_pae(
     datos: schemas.VisitaCompletaPAECreate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: models.Usuario = Depends(get_current_user)
 ):
@@ -174,142 +399,30 @@ def crear_visita_completa_pae(
         if not sede:
             raise HTTPException(status_code=400, detail="Sede no encontrada")
             
-        profesional = db.query(models.Usuario).filter(models.Usuario.id == datos.profesional_id).first()
+        # db.get reutiliza el usuario autenticado si ya está en la sesión
+        profesional = db.get(models.Usuario, datos.profesional_id)
         if not profesional:
             raise HTTPException(status_code=400, detail="Profesional no encontrado")
 
-        # Calcular el número de visita para este usuario
-        # Contar visitas existentes del usuario + 1
-        visitas_usuario_count = db.query(models.VisitaCompletaPAE).filter(
-            models.VisitaCompletaPAE.profesional_id == datos.profesional_id
-        ).count()
-        numero_visita_usuario = visitas_usuario_count + 1
+        # Reservar el número de visita del usuario desde su contador (bloquea la fila hasta el commit)
+        numero_visita_usuario = NumeracionVisitasService(db).siguiente_numero(datos.profesional_id)
 
-        # Crear la visita completa
-        visita_completa = models.VisitaCompletaPAE(
-            fecha_visita=datos.fecha_visita,
-            contrato=datos.contrato,
-            operador=datos.operador,
-            municipio_id=datos.municipio_id,
-            institucion_id=datos.institucion_id,
-            sede_id=datos.sede_id,
-            profesional_id=datos.profesional_id,
-            observaciones=datos.observaciones,
-            estado="completada",  # Se marca como completada inmediatamente
-            numero_visita_usuario=numero_visita_usuario
-        )
-        # Asignar caso_atencion_prioritaria usando el setter (es una propiedad)
-        visita_completa.caso_atencion_prioritaria = datos.caso_atencion_prioritaria
-        
-        db.add(visita_completa)
-        db.flush()  # Para obtener el ID
+        visita_completa = _registrar_visita_completa(db, datos, profesional, numero_visita_usuario)
         
-        # Guardar las respuestas del checklist
-        for respuesta_data in datos.respuestas_checklist:
-            respuesta = models.VisitaRespuestaCompleta(
-                visita_id=visita_completa.id,
-                categoria_id=1,  # Por defecto
-                item_id=respuesta_data.item_id,
-                respuesta=respuesta_data.respuesta,
-                observacion=respuesta_data.observacion
-            )
-            db.add(respuesta)
-        
-        # IMPORTANTE: Crear o actualizar la visita asignada correspondiente
-        print(f"🔍 Buscando visita asignada para sincronizar...")
-        print(f"   - Sede ID: {datos.sede_id}")
-        print(f"   - Profesional ID: {datos.profesional_id}")
-        print(f"   - Contrato: {datos.contrato}")
-        
-        # Buscar la visita asignada que coincida con estos datos
-        visita_asignada = db.query(models.VisitaAsignada).filter(
-            models.VisitaAsignada.sede_id == datos.sede_id,
-            models.VisitaAsignada.visitador_id == datos.profesional_id,
-            models.VisitaAsignada.contrato == datos.contrato,
-            models.VisitaAsignada.estado.in_(["pendiente", "en_proceso"])
-        ).first()
-        
-        if visita_asignada:
-            print(f"✅ Visita asignada encontrada: ID {visita_asignada.id}, Estado actual: {visita_asignada.estado}")
-            print(f"🔄 Actualizando estado de visita asignada ID {visita_asignada.id} de '{visita_asignada.estado}' a 'completada'")
-            visita_asignada.estado = "completada"
-            visita_asignada.fecha_completada = datetime.utcnow()
-            print(f"✅ Visita asignada ID {visita_asignada.id} actualizada a 'completada'")
-        else:
-            print(f"⚠️ No se encontró visita asignada correspondiente para sincronizar")
-            # Si no existe visita asignada, crear una nueva
-            print(f"🆕 No se encontró visita asignada correspondiente. Creando nueva visita asignada...")
-            
-            # Obtener el supervisor (asumimos que es el usuario con rol supervisor)
-            supervisor = db.query(models.Usuario).join(models.Rol).filter(
-                models.Rol.nombre == "supervisor"
-            ).first()
-            
-            if not supervisor:
-                print("⚠️ No se encontró supervisor, usando profesional como supervisor")
-                supervisor = profesional
-            
-            nueva_visita_asignada = models.VisitaAsignada(
-                sede_id=datos.sede_id,
-                visitador_id=datos.profesional_id,
-                supervisor_id=supervisor.id,
-                fecha_programada=datos.fecha_visita,
-                tipo_visita="PAE",  # Valor por defecto
-                prioridad="normal",  # Valor por defecto
-                estado="completada",  # Se marca como completada inmediatamente
-                contrato=datos.contrato,
-                operador=datos.operador,
-                caso_atencion_prioritaria=datos.caso_atencion_prioritaria,
-                municipio_id=datos.municipio_id,
-                institucion_id=datos.institucion_id,
-                observaciones=datos.observaciones,
-                fecha_completada=datetime.utcnow()
-            )
-            
-            db.add(nueva_visita_asignada)
-            print(f"✅ Nueva visita asignada creada con ID {nueva_visita_asignada.id}")
-            
-        # CORRECCIÓN: También buscar visitas asignadas que tengan visitas completas correspondientes
-        # pero que no se hayan actualizado automáticamente
-        visitas_asignadas_pendientes = db.query(models.VisitaAsignada).filter(
-            models.VisitaAsignada.visitador_id == datos.profesional_id,
-            models.VisitaAsignada.estado.in_(["pendiente", "en_proceso"])
-        ).all()
-        
-        for visita_pendiente in visitas_asignadas_pendientes:
-            # Buscar si existe una visita completa correspondiente
-            visita_completa_existente = db.query(models.VisitaCompletaPAE).filter(
-                models.VisitaCompletaPAE.sede_id == visita_pendiente.sede_id,
-                models.VisitaCompletaPAE.profesional_id == visita_pendiente.visitador_id,
-                models.VisitaCompletaPAE.contrato == visita_pendiente.contrato
-            ).first()
-            
-            if visita_completa_existente:
-                print(f"🔄 CORRECCIÓN: Actualizando visita asignada ID {visita_pendiente.id} que ya tiene visita completa")
-                visita_pendiente.estado = "completada"
-                visita_pendiente.fecha_completada = datetime.utcnow()
+        # CORRECCIÓN: Otras visitas asignadas del profesional que ya tengan visita completa
+        # se reconcilian con un único UPDATE después del commit, fuera del camino de la petición
+        background_tasks.add_task(reconciliar_asignadas_del_visitador, datos.profesional_id)
         
         # NOTA: VisitaProgramada no tiene campos visitador_id, estado, ni contrato
         # Esta lógica se eliminó porque el modelo VisitaProgramada no tiene estos campos
         
-        db.commit()
-        
-        # Retornar la visita completa con relaciones cargadas
-        from sqlalchemy.orm import joinedload
-        visita_retornar = db.query(models.VisitaCompletaPAE).options(
-            joinedload(models.VisitaCompletaPAE.municipio),
-            joinedload(models.VisitaCompletaPAE.institucion),
-            joinedload(models.VisitaCompletaPAE.sede),
-            joinedload(models.VisitaCompletaPAE.profesional),
-            joinedload(models.VisitaCompletaPAE.respuestas_checklist)
-        ).filter(
-            models.VisitaCompletaPAE.id == visita_completa.id
-        ).first()
+        # Construir la respuesta con los datos ya cargados (antes de que el commit los expire)
+        visita_retornar = _construir_visita_out(
+            visita_completa, municipio, institucion, sede, profesional, datos.respuestas_checklist
+        )
         
-        if not visita_retornar:
-            raise HTTPException(status_code=500, detail="Error al recuperar la visita creada")
+        db.commit()
         
-        # El schema ahora acepta None, no necesitamos normalizar
         return visita_retornar
         
     except HTTPException:
@@ -331,8 +444,200 @@ def crear_visita_completa_pae(
             detail=f"Error al crear visita completa: {str(e)}"
         )
 
+@router.post("/visitas-completas-pae/lote", response_model=schemas.VisitaCompletaPAELoteOut)
+def crear_visitas_completas_pae_lote(
+    datos: schemas.VisitaCompletaPAELoteCreate,
+    background_tasks: BackgroundTasks,
+    db: Session = Depends(get_db),
+    current_user: models.Usuario = Depends(get_current_user)
+):
+    """
+    Recibe en una sola petición las visitas acumuladas en la cola offline de la app móvil.
+    
+    Cada visita trae una `clave_idempotencia` generada por el cliente: si la clave ya fue
+    registrada por el usuario (por ejemplo, un reintento tras perder la conexión) la visita
+    no se vuelve a crear y se devuelve la existente como "duplicada". Cada visita se inserta
+    en su propio savepoint, de modo que un error en una no descarta las demás.
+    """
+    visitas = datos.visitas
+    if not visitas:
+        raise HTTPException(status_code=400, detail="El lote no contiene visitas")
+    if len(visitas) > LOTE_VISITAS_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"El lote supera el máximo de {LOTE_VISITAS_MAX_ITEMS} visitas"
+        )
+    
+    try:
+        print(f"📦 Lote de {len(visitas)} visitas recibido del usuario {current_user.id}")
+        
+        # Claves ya registradas por el usuario (reintentos de envíos anteriores)
+        claves = {v.clave_idempotencia for v in visitas}
+        registradas = {
+            fila.clave: (fila.visita_id, fila.numero_visita_usuario)
+            for fila in db.query(
+                models.ClaveIdempotenciaVisita.clave,
+                models.ClaveIdempotenciaVisita.visita_id,
+                models.VisitaCompletaPAE.numero_visita_usuario,
+            ).join(
+                models.VisitaCompletaPAE,
+                models.VisitaCompletaPAE.id == models.ClaveIdempotenciaVisita.visita_id
+            ).filter(
+                models.ClaveIdempotenciaVisita.usuario_id == current_user.id,
+                models.ClaveIdempotenciaVisita.clave.in_(claves)
+            ).all()
+        }
+        
+        # Validar todos los IDs referenciados con una consulta por tabla
+        municipios_validos = {
+            fila.id for fila in db.query(models.Municipio.id).filter(
+                models.Municipio.id.in_({v.municipio_id for v in visitas})
+            )
+        }
+        instituciones_validas = {
+            fila.id for fila in db.query(models.Institucion.id).filter(
+                models.Institucion.id.in_({v.institucion_id for v in visitas})
+            )
+        }
+        sedes_validas = {
+            fila.id for fila in db.query(models.SedeEducativa.id).filter(
+                models.SedeEducativa.id.in_({v.sede_id for v in visitas})
+            )
+        }
+        profesionales = {
+            u.id: u for u in db.query(models.Usuario).filter(
+                models.Usuario.id.in_({v.profesional_id for v in visitas})
+            )
+        }
+        categorias_items = cache_checklist.categorias_de(
+            db, (r.item_id for v in visitas for r in v.respuestas_checklist)
+        )
+        
+        numeracion = NumeracionVisitasService(db)
+        
+        # Supervisor por defecto para las visitas asignadas que haya que crear
+        supervisor_defecto = db.query(models.Usuario).join(models.Rol).filter(
+            models.Rol.nombre == "supervisor"
+        ).first()
+        
+        resultados = []
+        procesadas = {}  # clave -> resultado dentro de este mismo lote
+        profesionales_con_visitas = set()
+        
+        for item in visitas:
+            clave = item.clave_idempotencia
+            
+            if clave in registradas:
+                visita_id, numero = registradas[clave]
+                resultados.append(schemas.VisitaCompletaPAELoteResultado(
+                    clave_idempotencia=clave, estado="duplicada",
+                    visita_id=visita_id, numero_visita_usuario=numero
+                ))
+                continue
+            
+            if clave in procesadas:
+                anterior = procesadas[clave]
+                resultados.append(anterior.model_copy(
+                    update={"estado": "duplicada"} if anterior.estado == "creada" else {}
+                ))
+                continue
+            
+            error = None
+            if item.municipio_id not in municipios_validos:
+                error = "Municipio no encontrado"
+            elif item.institucion_id not in instituciones_validas:
+                error = "Institución no encontrada"
+            elif item.sede_id not in sedes_validas:
+                error = "Sede no encontrada"
+            elif item.profesional_id not in profesionales:
+                error = "Profesional no encontrado"
+            else:
+                faltantes = sorted({r.item_id for r in item.respuestas_checklist} - categorias_items.keys())
+                if faltantes:
+                    error = f"Items del checklist no encontrados: {faltantes}"
+            
+            if error:
+                resultado = schemas.VisitaCompletaPAELoteResultado(
+                    clave_idempotencia=clave, estado="error", error=error
+                )
+            else:
+                profesional = profesionales[item.profesional_id]
+                try:
+                    with db.begin_nested():
+                        numero_visita_usuario = numeracion.siguiente_numero(item.profesional_id)
+                        visita_completa = _registrar_visita_completa(
+                            db, item, profesional, numero_visita_usuario,
+                            supervisor=supervisor_defecto or profesional
+                        )
+                        db.add(models.ClaveIdempotenciaVisita(
+                            usuario_id=current_user.id,
+                            clave=clave,
+                            visita_id=visita_completa.id
+                        ))
+                        db.flush()
+                    profesionales_con_visitas.add(item.profesional_id)
+                    resultado = schemas.VisitaCompletaPAELoteResultado(
+                        clave_idempotencia=clave, estado="creada",
+                        visita_id=visita_completa.id,
+                        numero_visita_usuario=numero_visita_usuario
+                    )
+                except IntegrityError:
+                    # Otra petición concurrente registró la misma clave primero
+                    existente = db.query(models.ClaveIdempotenciaVisita).filter(
+                        models.ClaveIdempotenciaVisita.usuario_id == current_user.id,
+                        models.ClaveIdempotenciaVisita.clave == clave
+                    ).first()
+                    if existente:
+                        resultado = schemas.VisitaCompletaPAELoteResultado(
+                            clave_idempotencia=clave, estado="duplicada",
+                            visita_id=existente.visita_id,
+                            numero_visita_usuario=existente.visita.numero_visita_usuario
+                        )
+                    else:
+                        resultado = schemas.VisitaCompletaPAELoteResultado(
+                            clave_idempotencia=clave, estado="error",
+                            error="Conflicto de integridad al guardar la visita"
+                        )
+                except HTTPException as e:
+                    resultado = schemas.VisitaCompletaPAELoteResultado(
+                        clave_idempotencia=clave, estado="error", error=str(e.detail)
+                    )
+            
+            procesadas[clave] = resultado
+            resultados.append(resultado)
+        
+        db.commit()
+        
+        for profesional_id in profesionales_con_visitas:
+            background_tasks.add_task(reconciliar_asignadas_del_visitador, profesional_id)
+        
+        conteo = {"creada": 0, "duplicada": 0, "error": 0}
+        for resultado in resultados:
+            conteo[resultado.estado] += 1
+        print(f"✅ Lote procesado: {conteo['creada']} creadas, {conteo['duplicada']} duplicadas, {conteo['error']} con error")
+        
+        return schemas.VisitaCompletaPAELoteOut(
+            total=len(resultados),
+            creadas=conteo["creada"],
+            duplicadas=conteo["duplicada"],
+            errores=conteo["error"],
+            resultados=resultados
+        )
+        
+    except HTTPException:
+        db.rollback()
+        raise
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Error al procesar lote de visitas: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al procesar lote de visitas: {str(e)}"
+        )
+
 @router.get("/visitas-completas-pae", response_model=List[schemas.VisitaCompletaPAEOut])
 def listar_visitas_completas_pae(
+    response: Response,
     contrato: Optional[str] = Query(None, description="Filtrar por contrato"),
     operador: Optional[str] = Query(None, description="Filtrar por operador"),
     municipio_id: Optional[int] = Query(None, description="Filtrar por municipio"),
@@ -340,11 +645,15 @@ def listar_visitas_completas_pae(
     estado: Optional[str] = Query(None, description="Filtrar por estado"),
     fecha_inicio: Optional[str] = Query(None, description="Filtrar desde fecha (YYYY-MM-DD)"),
     fecha_fin: Optional[str] = Query(None, description="Filtrar hasta fecha (YYYY-MM-DD)"),
+    vista: str = Query("completa", description="'completa' o 'resumen' (sin checklist ni objetos anidados)"),
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO_PAGINA, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor recibido en el encabezado X-Siguiente-Cursor"),
     db: Session = Depends(get_db),
     current_user: models.Usuario = Depends(get_current_user)
 ):
     """
-    Lista las visitas completas PAE del usuario actual con filtros opcionales
+    Lista las visitas completas PAE del usuario actual con filtros opcionales.
+    Con `limite` se pagina por cursor sobre (fecha_visita, id).
     """
     try:
         # Construir query base - FILTRAR POR USUARIO ACTUAL
@@ -386,21 +695,12 @@ def listar_visitas_completas_pae(
             except ValueError:
                 raise HTTPException(status_code=400, detail="Formato de fecha_fin inválido. Use YYYY-MM-DD")
         
-        # Obtener visitas con relaciones cargadas
-        visitas = query.options(
-            joinedload(models.VisitaCompletaPAE.municipio),
-            joinedload(models.VisitaCompletaPAE.institucion),
-            joinedload(models.VisitaCompletaPAE.sede),
-            joinedload(models.VisitaCompletaPAE.profesional),
-            joinedload(models.VisitaCompletaPAE.respuestas_checklist)
-        ).order_by(models.VisitaCompletaPAE.fecha_visita.desc()).all()
+        # Obtener la página de visitas en la vista solicitada
+        visitas = listar_visitas_paginadas(query, response, vista=vista, limite=limite, cursor=cursor)
         
-        # El schema ahora acepta None, no necesitamos normalizar
         print(f"🔍 Encontradas {len(visitas)} visitas completas PAE")
-        for visita in visitas:
-            print(f"   - Visita ID: {visita.id}, Estado: {visita.estado}, Profesional: {visita.profesional.nombre if visita.profesional else 'N/A'}, Contrato: {visita.contrato}, Operador: {visita.operador}")
         
-        return visitas
+        return respuesta_listado(visitas, response)
     except HTTPException:
         raise
     except Exception as e:
@@ -452,6 +752,10 @@ def obtener_opciones_filtros(
 
 @router.get("/visitas-completas-pae/pendientes", response_model=List[schemas.VisitaCompletaPAEOut])
 def listar_visitas_pendientes(
+    response: Response,
+    vista: str = Query("completa", description="'completa' o 'resumen' (sin checklist ni objetos anidados)"),
+    limite: Optional[int] = Query(None, ge=1, le=LIMITE_MAXIMO_PAGINA, description="Tamaño de página"),
+    cursor: Optional[str] = Query(None, description="Cursor recibido en el encabezado X-Siguiente-Cursor"),
     db: Session = Depends(get_db),
     current_user: models.Usuario = Depends(get_current_user)
 ):
@@ -459,23 +763,17 @@ def listar_visitas_pendientes(
     Lista solo las visitas pendientes PAE
     """
     try:
-        # Obtener solo las visitas pendientes con relaciones cargadas
-        visitas = db.query(models.VisitaCompletaPAE).filter(
+        # Obtener solo las visitas pendientes en la vista solicitada
+        query = db.query(models.VisitaCompletaPAE).filter(
             models.VisitaCompletaPAE.estado == "pendiente"
-        ).options(
-            joinedload(models.VisitaCompletaPAE.municipio),
-            joinedload(models.VisitaCompletaPAE.institucion),
-            joinedload(models.VisitaCompletaPAE.sede),
-            joinedload(models.VisitaCompletaPAE.profesional),
-            joinedload(models.VisitaCompletaPAE.respuestas_checklist)
-        ).all()
-        
-        # El schema ahora acepta None, no necesitamos normalizar
+        )
+        visitas = listar_visitas_paginadas(query, response, vista=vista, limite=limite, cursor=cursor)
+        
         print(f"🔍 Encontradas {len(visitas)} visitas pendientes PAE")
-        for visita in visitas:
-            print(f"   - Visita ID: {visita.id}, Estado: {visita.estado}, Profesional: {visita.profesional.nombre if visita.profesional else 'N/A'}")
         
-        return visitas
+        return respuesta_listado(visitas, response)
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error al listar visitas pendientes: {str(e)}")
         raise HTTPException(
@@ -483,6 +781,62 @@ def listar_visitas_pendientes(
             detail=f"Error al listar visitas pendientes: {str(e)}"
         )
 
+@router.get("/visitas-completas-pae/excel")
+def generar_excel_visitas_completas(
+    contrato: Optional[str] = Query(None, description="Filtrar por contrato"),
+    sede_id: Optional[int] = Query(None, description="Filtrar por sede"),
+    municipio_id: Optional[int] = Query(None, description="Filtrar por municipio"),
+    fecha_inicio: Optional[str] = Query(None, description="Filtrar desde fecha (YYYY-MM-DD)"),
+    fecha_fin: Optional[str] = Query(None, description="Filtrar hasta fecha (YYYY-MM-DD)"),
+    db: Session = Depends(get_db),
+    current_user: models.Usuario = Depends(get_current_user)
+):
+    """
+    Genera un único Excel con varias visitas completas PAE (por contrato, sede o rango de fechas).
+    Las filas se leen por lotes y se escriben directamente al libro, sin cargar todas las visitas.
+    """
+    try:
+        filas = _consulta_filas_excel(db)
+        
+        # Los visitadores solo exportan sus propias visitas
+        rol = current_user.rol.nombre.lower() if current_user.rol else ""
+        if rol == "visitador":
+            filas = filas.filter(models.VisitaCompletaPAE.profesional_id == current_user.id)
+        
+        if contrato:
+            filas = filas.filter(models.VisitaCompletaPAE.contrato.ilike(f"%{contrato}%"))
+        if sede_id:
+            filas = filas.filter(models.VisitaCompletaPAE.sede_id == sede_id)
+        if municipio_id:
+            filas = filas.filter(models.VisitaCompletaPAE.municipio_id == municipio_id)
+        if fecha_inicio:
+            try:
+                fecha_inicio_dt = datetime.strptime(fecha_inicio, "%Y-%m-%d")
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Formato de fecha_inicio inválido. Use YYYY-MM-DD")
+            filas = filas.filter(models.VisitaCompletaPAE.fecha_visita >= fecha_inicio_dt)
+        if fecha_fin:
+            try:
+                fecha_fin_dt = datetime.strptime(fecha_fin, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Formato de fecha_fin inválido. Use YYYY-MM-DD")
+            filas = filas.filter(models.VisitaCompletaPAE.fecha_visita <= fecha_fin_dt)
+        
+        exportador = ExportadorExcel()
+        total = exportador.agregar_hoja("Visitas", COLUMNAS_EXCEL_VISITAS, _filas_excel_visitas(db, filas))
+        print(f"✅ Excel de visitas generado: {total} filas")
+        
+        return exportador.respuesta(f"visitas_pae_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx")
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"❌ Error al generar Excel de visitas: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error al generar Excel: {str(e)}"
+        )
+
 @router.get("/visitas-completas-pae/{visita_id}", response_model=schemas.VisitaCompletaPAEOut)
 def obtener_visita_completa_pae(
     visita_id: int,
@@ -512,164 +866,21 @@ def generar_excel_visita_completa(
     """
     Genera un archivo Excel basado en la plantilla personalizada con toda la información de una visita completa PAE
     """
-    # Obtener la visita completa con todas las relaciones cargadas
-    visita = db.query(models.VisitaCompletaPAE).options(
-        joinedload(models.VisitaCompletaPAE.municipio),
-        joinedload(models.VisitaCompletaPAE.institucion),
-        joinedload(models.VisitaCompletaPAE.sede),
-        joinedload(models.VisitaCompletaPAE.profesional)
-    ).filter(
-        models.VisitaCompletaPAE.id == visita_id
-    ).first()
-    
-    if not visita:
+    if not db.query(models.VisitaCompletaPAE.id).filter(models.VisitaCompletaPAE.id == visita_id).first():
         raise HTTPException(status_code=404, detail="Visita no encontrada")
     
-    # Obtener las respuestas del checklist
-    respuestas = db.query(models.VisitaRespuestaCompleta).filter(
-        models.VisitaRespuestaCompleta.visita_id == visita_id
-    ).all()
-    
     try:
-        # Crear un nuevo workbook de Excel desde cero
-        print(f"📝 Creando nuevo workbook Excel para visita {visita_id}...")
-        print(f"📊 Total de respuestas: {len(respuestas)}")
-        
-        workbook = Workbook()
-        worksheet = workbook.active
-        worksheet.title = "Visita Completa"
-        
-        # Definir estilos
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=11)
-        border = Border(
-            left=Side(style='thin'),
-            right=Side(style='thin'),
-            top=Side(style='thin'),
-            bottom=Side(style='thin')
-        )
+        print(f"📝 Generando Excel para visita {visita_id}...")
         
-        # Crear encabezados (fila 1)
-        print(f"📋 Creando encabezados del Excel...")
-        headers = [
-            'ID Visita', 'Fecha', 'Contrato', 'Operador', 'Caso Prioritario',
-            'Municipio', 'Institución', 'Sede', 'Profesional', 'Item ID', 
-            'Pregunta', 'Respuesta', 'Observaciones', 'Evidencia'
-        ]
+        filas = _consulta_filas_excel(db).filter(models.VisitaCompletaPAE.id == visita_id)
         
-        for col_idx, header in enumerate(headers, start=1):
-            cell = worksheet.cell(row=1, column=col_idx)
-            cell.value = header
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = Alignment(horizontal='center', vertical='center')
-            cell.border = border
-        
-        # Ajustar ancho de columnas
-        worksheet.column_dimensions['A'].width = 12
-        worksheet.column_dimensions['B'].width = 18
-        worksheet.column_dimensions['C'].width = 15
-        worksheet.column_dimensions['D'].width = 15
-        worksheet.column_dimensions['E'].width = 18
-        worksheet.column_dimensions['F'].width = 20
-        worksheet.column_dimensions['G'].width = 25
-        worksheet.column_dimensions['H'].width = 30
-        worksheet.column_dimensions['I'].width = 20
-        worksheet.column_dimensions['J'].width = 10
-        worksheet.column_dimensions['K'].width = 50
-        worksheet.column_dimensions['L'].width = 30
-        worksheet.column_dimensions['M'].width = 40
-        worksheet.column_dimensions['N'].width = 25
-        
-        # Llenar la información de la visita
-        print(f"📋 Llenando información de visita ID {visita.id}")
-        fila_actual = 2
-        
-        # Si no hay respuestas, crear una fila con información básica
-        if not respuestas:
-            print(f"⚠️ No hay respuestas para la visita {visita_id}. Generando Excel con información básica.")
-            data = [
-                visita.id,
-                visita.fecha_visita.strftime('%Y-%m-%d %H:%M') if visita.fecha_visita else 'N/A',
-                visita.contrato or 'N/A',
-                visita.operador or 'N/A',
-                visita.caso_atencion_prioritaria or 'N/A',
-                visita.municipio.nombre if visita.municipio else 'N/A',
-                visita.institucion.nombre if visita.institucion else 'N/A',
-                visita.sede.nombre_sede if visita.sede and hasattr(visita.sede, 'nombre_sede') else 'N/A',
-                visita.profesional.nombre if visita.profesional else 'N/A',
-                'N/A',
-                'No hay respuestas registradas',
-                'N/A',
-                'N/A',
-                'N/A'
-            ]
-            
-            for col_idx, value in enumerate(data, start=1):
-                cell = worksheet.cell(row=fila_actual, column=col_idx)
-                cell.value = value
-                cell.border = border
-            
-            fila_actual += 1
-        else:
-            # Procesar cada respuesta
-            for respuesta in respuestas:
-                try:
-                    item = db.query(models.ChecklistItem).filter(
-                        models.ChecklistItem.id == respuesta.item_id
-                    ).first()
-                    
-                    if item:
-                        # Llenar datos
-                        data = [
-                            visita.id,
-                            visita.fecha_visita.strftime('%Y-%m-%d %H:%M') if visita.fecha_visita else 'N/A',
-                            visita.contrato or 'N/A',
-                            visita.operador or 'N/A',
-                            visita.caso_atencion_prioritaria or 'N/A',
-                            visita.municipio.nombre if visita.municipio else 'N/A',
-                            visita.institucion.nombre if visita.institucion else 'N/A',
-                            visita.sede.nombre_sede if visita.sede and hasattr(visita.sede, 'nombre_sede') else 'N/A',
-                            visita.profesional.nombre if visita.profesional else 'N/A',
-                            item.id,
-                            item.pregunta_texto or 'N/A',
-                            respuesta.respuesta or 'N/A',
-                            respuesta.observacion or 'N/A',
-                            'N/A'  # Evidencia
-                        ]
-                        
-                        for col_idx, value in enumerate(data, start=1):
-                            cell = worksheet.cell(row=fila_actual, column=col_idx)
-                            cell.value = value
-                            cell.border = border
-                        
-                        fila_actual += 1
-                    else:
-                        print(f"⚠️ Item con ID {respuesta.item_id} no encontrado")
-                except Exception as row_error:
-                    print(f"❌ Error al procesar respuesta {respuesta.id}: {str(row_error)}")
-                    import traceback
-                    print(traceback.format_exc())
-                    continue
-        
-        # Guardar el archivo modificado en memoria
-        print(f"💾 Guardando archivo Excel en memoria...")
-        output = BytesIO()
-        try:
-            workbook.save(output)
-            output.seek(0)
-            print(f"✅ Excel generado exitosamente. Tamaño: {len(output.getvalue())} bytes")
-        except Exception as save_error:
-            print(f"❌ Error al guardar workbook: {str(save_error)}")
-            import traceback
-            print(traceback.format_exc())
-            raise
-        
-        return StreamingResponse(
-            output,
-            media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            headers={"Content-Disposition": f"attachment; filename=historial_visita_{visita_id}.xlsx"}
+        exportador = ExportadorExcel()
+        total = exportador.agregar_hoja(
+            "Visita Completa", COLUMNAS_EXCEL_VISITAS, _filas_excel_visitas(db, filas)
         )
+        print(f"✅ Excel generado exitosamente: {total} filas")
+        
+        return exportador.respuesta(f"historial_visita_{visita_id}.xlsx")
         
     except Exception as e:
         import traceback
@@ -770,71 +981,8 @@ def test_sincronizacion(
     try:
         print(f"🔄 TEST SINCRONIZACIÓN para usuario 9")
         
-        # 1. Sincronizar visitas en proceso
-        visitas_en_proceso = db.query(models.VisitaAsignada).filter(
-            models.VisitaAsignada.visitador_id == 9,
-            models.VisitaAsignada.estado == "en_proceso"
-        ).all()
-        
-        print(f"📋 Encontradas {len(visitas_en_proceso)} visitas en proceso")
-        
-        visitas_sincronizadas = 0
-        
-        for visita_asignada in visitas_en_proceso:
-            print(f"🔍 Verificando visita asignada ID {visita_asignada.id} - Contrato: {visita_asignada.contrato}")
-            
-            # Buscar visita completa correspondiente
-            visita_completa = db.query(models.VisitaCompletaPAE).filter(
-                models.VisitaCompletaPAE.sede_id == visita_asignada.sede_id,
-                models.VisitaCompletaPAE.profesional_id == visita_asignada.visitador_id,
-                models.VisitaCompletaPAE.contrato == visita_asignada.contrato
-            ).first()
-            
-            if visita_completa:
-                print(f"✅ Encontrada visita completa ID {visita_completa.id} - Estado: {visita_completa.estado}")
-                
-                # Si la visita completa está completada, actualizar la asignada
-                if visita_completa.estado == "completada":
-                    visita_asignada.estado = "completada"
-                    if visita_asignada.fecha_completada is None:
-                        visita_asignada.fecha_completada = datetime.utcnow()
-                    visitas_sincronizadas += 1
-                    print(f"🔄 Actualizando visita asignada ID {visita_asignada.id} a 'completada'")
-                else:
-                    print(f"⚠️ Visita completa no está completada, estado: {visita_completa.estado}")
-            else:
-                print(f"❌ No se encontró visita completa para contrato {visita_asignada.contrato}")
-        
-        # 2. Sincronizar visitas completas pendientes
-        visitas_completas_pendientes = db.query(models.VisitaCompletaPAE).filter(
-            models.VisitaCompletaPAE.profesional_id == 9,
-            models.VisitaCompletaPAE.estado == "pendiente"
-        ).all()
-        
-        print(f"📋 Encontradas {len(visitas_completas_pendientes)} visitas completas pendientes")
-        
-        for visita_completa in visitas_completas_pendientes:
-            print(f"🔍 Verificando visita completa ID {visita_completa.id} - Contrato: {visita_completa.contrato}")
-            
-            # Buscar visita asignada correspondiente
-            visita_asignada = db.query(models.VisitaAsignada).filter(
-                models.VisitaAsignada.sede_id == visita_completa.sede_id,
-                models.VisitaAsignada.visitador_id == visita_completa.profesional_id,
-                models.VisitaAsignada.contrato == visita_completa.contrato
-            ).first()
-            
-            if visita_asignada:
-                print(f"✅ Encontrada visita asignada ID {visita_asignada.id} - Estado: {visita_asignada.estado}")
-                
-                # Si la visita asignada está completada, actualizar la completa
-                if visita_asignada.estado == "completada":
-                    visita_completa.estado = "completada"
-                    visitas_sincronizadas += 1
-                    print(f"🔄 Actualizando visita completa ID {visita_completa.id} a 'completada'")
-                else:
-                    print(f"⚠️ Visita asignada no está completada, estado: {visita_asignada.estado}")
-            else:
-                print(f"❌ No se encontró visita asignada para contrato {visita_completa.contrato}")
+        detalle = SincronizacionService(db).reconciliar(visitador_id=9)
+        visitas_sincronizadas = detalle["total"]
         
         db.commit()
         
@@ -842,7 +990,8 @@ def test_sincronizacion(
         
         return {
             "mensaje": f"Test de sincronización completado. {visitas_sincronizadas} visitas sincronizadas.",
-            "visitas_sincronizadas": visitas_sincronizadas
+            "visitas_sincronizadas": visitas_sincronizadas,
+            "detalle": detalle
         }
         
     except Exception as e:
@@ -865,71 +1014,9 @@ def sincronizar_todas_las_visitas(
     try:
         print(f"🔄 SINCRONIZACIÓN COMPLETA para usuario {current_user.id}")
         
-        # 1. Sincronizar visitas en proceso
-        visitas_en_proceso = db.query(models.VisitaAsignada).filter(
-            models.VisitaAsignada.visitador_id == current_user.id,
-            models.VisitaAsignada.estado == "en_proceso"
-        ).all()
-        
-        print(f"📋 Encontradas {len(visitas_en_proceso)} visitas en proceso")
-        
-        visitas_sincronizadas = 0
-        
-        for visita_asignada in visitas_en_proceso:
-            print(f"🔍 Verificando visita asignada ID {visita_asignada.id} - Contrato: {visita_asignada.contrato}")
-            
-            # Buscar visita completa correspondiente
-            visita_completa = db.query(models.VisitaCompletaPAE).filter(
-                models.VisitaCompletaPAE.sede_id == visita_asignada.sede_id,
-                models.VisitaCompletaPAE.profesional_id == visita_asignada.visitador_id,
-                models.VisitaCompletaPAE.contrato == visita_asignada.contrato
-            ).first()
-            
-            if visita_completa:
-                print(f"✅ Encontrada visita completa ID {visita_completa.id} - Estado: {visita_completa.estado}")
-                
-                # Si la visita completa está completada, actualizar la asignada
-                if visita_completa.estado == "completada":
-                    visita_asignada.estado = "completada"
-                    if visita_asignada.fecha_completada is None:
-                        visita_asignada.fecha_completada = datetime.utcnow()
-                    visitas_sincronizadas += 1
-                    print(f"🔄 Actualizando visita asignada ID {visita_asignada.id} a 'completada'")
-                else:
-                    print(f"⚠️ Visita completa no está completada, estado: {visita_completa.estado}")
-            else:
-                print(f"❌ No se encontró visita completa para contrato {visita_asignada.contrato}")
-        
-        # 2. Sincronizar visitas completas pendientes
-        visitas_completas_pendientes = db.query(models.VisitaCompletaPAE).filter(
-            models.VisitaCompletaPAE.profesional_id == current_user.id,
-            models.VisitaCompletaPAE.estado == "pendiente"
-        ).all()
-        
-        print(f"📋 Encontradas {len(visitas_completas_pendientes)} visitas completas pendientes")
-        
-        for visita_completa in visitas_completas_pendientes:
-            print(f"🔍 Verificando visita completa ID {visita_completa.id} - Contrato: {visita_completa.contrato}")
-            
-            # Buscar visita asignada correspondiente
-            visita_asignada = db.query(models.VisitaAsignada).filter(
-                models.VisitaAsignada.sede_id == visita_completa.sede_id,
-                models.VisitaAsignada.visitador_id == visita_completa.profesional_id,
-                models.VisitaAsignada.contrato == visita_completa.contrato
-            ).first()
-            
-            if visita_asignada:
-                print(f"✅ Encontrada visita asignada ID {visita_asignada.id} - Estado: {visita_asignada.estado}")
-                
-                # Si la visita asignada está completada, actualizar la completa
-                if visita_asignada.estado == "completada":
-                    visita_completa.estado = "completada"
-                    visitas_sincronizadas += 1
-                    print(f"🔄 Actualizando visita completa ID {visita_completa.id} a 'completada'")
-                else:
-                    print(f"⚠️ Visita asignada no está completada, estado: {visita_asignada.estado}")
-            else:
-                print(f"❌ No se encontró visita asignada para contrato {visita_completa.contrato}")
+        # Visitas asignadas en proceso -> completada, y visitas completas pendientes -> completada
+        detalle = SincronizacionService(db).reconciliar(visitador_id=current_user.id)
+        visitas_sincronizadas = detalle["total"]
         
         db.commit()
         
@@ -937,7 +1024,8 @@ def sincronizar_todas_las_visitas(
         
         return {
             "mensaje": f"Sincronización completa realizada. {visitas_sincronizadas} visitas sincronizadas.",
-            "visitas_sincronizadas": visitas_sincronizadas
+            "visitas_sincronizadas": visitas_sincronizadas,
+            "detalle": detalle
         }
         
     except Exception as e:
@@ -960,40 +1048,9 @@ def sincronizar_visitas_en_proceso(
     try:
         print(f"🔄 SINCRONIZANDO VISITAS EN PROCESO para usuario {current_user.id}")
         
-        # Buscar visitas asignadas en proceso
-        visitas_en_proceso = db.query(models.VisitaAsignada).filter(
-            models.VisitaAsignada.visitador_id == current_user.id,
-            models.VisitaAsignada.estado == "en_proceso"
-        ).all()
-        
-        print(f"📋 Encontradas {len(visitas_en_proceso)} visitas en proceso")
-        
-        visitas_sincronizadas = 0
-        
-        for visita_asignada in visitas_en_proceso:
-            print(f"🔍 Verificando visita asignada ID {visita_asignada.id} - Contrato: {visita_asignada.contrato}")
-            
-            # Buscar visita completa correspondiente
-            visita_completa = db.query(models.VisitaCompletaPAE).filter(
-                models.VisitaCompletaPAE.sede_id == visita_asignada.sede_id,
-                models.VisitaCompletaPAE.profesional_id == visita_asignada.visitador_id,
-                models.VisitaCompletaPAE.contrato == visita_asignada.contrato
-            ).first()
-            
-            if visita_completa:
-                print(f"✅ Encontrada visita completa ID {visita_completa.id} - Estado: {visita_completa.estado}")
-                
-                # Si la visita completa está completada, actualizar la asignada
-                if visita_completa.estado == "completada":
-                    visita_asignada.estado = "completada"
-                    if visita_asignada.fecha_completada is None:
-                        visita_asignada.fecha_completada = datetime.utcnow()
-                    visitas_sincronizadas += 1
-                    print(f"🔄 Actualizando visita asignada ID {visita_asignada.id} a 'completada'")
-                else:
-                    print(f"⚠️ Visita completa no está completada, estado: {visita_completa.estado}")
-            else:
-                print(f"❌ No se encontró visita completa para contrato {visita_asignada.contrato}")
+        visitas_sincronizadas = SincronizacionService(db).completar_asignadas(
+            visitador_id=current_user.id
+        )
         
         db.commit()
         
@@ -1018,20 +1075,26 @@ def sincronizar_visitas_programadas(
     current_user: models.Usuario = Depends(get_current_user)
 ):
     """
-    Sincroniza el estado de las visitas programadas con las visitas completas PAE
+    Sincroniza el estado de las visitas programadas (cronograma de visitas
+    asignadas) con las visitas completas PAE.
+    Los supervisores sincronizan las visitas que asignaron, los administradores
+    todo el sistema y el resto de usuarios sus propias visitas.
     """
     try:
         print("🔄 INICIANDO SINCRONIZACIÓN DE VISITAS PROGRAMADAS...")
         
-        # NOTA: VisitaProgramada no tiene campos visitador_id, estado, ni contrato
-        # Esta lógica se eliminó porque el modelo VisitaProgramada no tiene estos campos
-        visitas_programadas = []
-        
-        print(f"📅 Encontradas {len(visitas_programadas)} visitas programadas para sincronizar")
-        
-        visitas_actualizadas = 0
+        # NOTA: VisitaProgramada no tiene campos visitador_id, estado, ni contrato,
+        # por lo que el cronograma se sincroniza a través de VisitaAsignada
+        rol = current_user.rol.nombre.lower() if current_user.rol else ""
+        servicio = SincronizacionService(db)
+        if rol == "supervisor":
+            detalle = servicio.reconciliar(supervisor_id=current_user.id)
+        elif "admin" in rol:
+            detalle = servicio.reconciliar()
+        else:
+            detalle = servicio.reconciliar(visitador_id=current_user.id)
         
-        # NOTA: La lógica de sincronización se eliminó porque VisitaProgramada no tiene los campos necesarios
+        visitas_actualizadas = detalle["total"]
         
         db.commit()
         
@@ -1039,7 +1102,8 @@ def sincronizar_visitas_programadas(
         
         return {
             "mensaje": f"Sincronización completada. {visitas_actualizadas} visitas programadas actualizadas.",
-            "visitas_actualizadas": visitas_actualizadas
+            "visitas_actualizadas": visitas_actualizadas,
+            "detalle": detalle
         }
         
     except Exception as e:
@@ -1,6 +1,6 @@
 # app/schemas.py
 
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 from datetime import datetime
 
@@ -117,6 +117,9 @@ class SedeEducativaBasicaOut(BaseModel):
     class Config:
         from_attributes = True
 
+class SedeCercanaOut(SedeEducativaBasicaOut):
+    distancia_km: float
+
 # Schema para crear sedes educativas
 class SedeEducativaCreate(BaseModel):
     nombre: str
@@ -320,6 +323,50 @@ class VisitaCompletaPAEOut(BaseModel):
     class Config:
         from_attributes = True
 
+class VisitaCompletaPAEResumen(BaseModel):
+    """Proyección liviana para pantallas de listado (vista=resumen): sin checklist ni objetos anidados."""
+    id: int
+    fecha_visita: datetime
+    contrato: Optional[str] = None
+    operador: Optional[str] = None
+    estado: Optional[str] = None
+    municipio_id: int
+    institucion_id: int
+    sede_id: int
+    profesional_id: int
+    numero_visita_usuario: Optional[int] = None
+    fecha_creacion: Optional[datetime] = None
+    municipio_nombre: Optional[str] = None
+    institucion_nombre: Optional[str] = None
+    sede_nombre: Optional[str] = None
+    profesional_nombre: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+# --- Schemas para envío en lote desde la cola offline ---
+
+class VisitaCompletaPAELoteItem(VisitaCompletaPAECreate):
+    # Clave generada por el cliente; reintentos con la misma clave no duplican la visita
+    clave_idempotencia: str = Field(min_length=1, max_length=100)
+
+class VisitaCompletaPAELoteCreate(BaseModel):
+    visitas: List[VisitaCompletaPAELoteItem]
+
+class VisitaCompletaPAELoteResultado(BaseModel):
+    clave_idempotencia: str
+    estado: str  # "creada", "duplicada", "error"
+    visita_id: Optional[int] = None
+    numero_visita_usuario: Optional[int] = None
+    error: Optional[str] = None
+
+class VisitaCompletaPAELoteOut(BaseModel):
+    total: int
+    creadas: int
+    duplicadas: int
+    errores: int
+    resultados: List[VisitaCompletaPAELoteResultado]
+
 # --- Schemas para Notificaciones Push ---
 
 class DispositivoNotificacionCreate(BaseModel):
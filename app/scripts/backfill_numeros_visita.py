@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Backfill de la numeración de visitas por profesional.
+
+Completa `numero_visita_usuario` en las visitas que no lo tienen (en orden de
+creación, a continuación del mayor número ya usado) e inicializa la tabla
+contadores_visitas_usuario a partir del historial existente.
+
+Uso:
+    python app/scripts/backfill_numeros_visita.py
+    python app/scripts/backfill_numeros_visita.py --renumerar   # reasigna 1..N a todas las visitas
+"""
+
+import sys
+import os
+import argparse
+from collections import defaultdict
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal, engine
+from app.models import ContadorVisitasUsuario, VisitaCompletaPAE
+from app.services.numeracion_visitas import NumeracionVisitasService
+
+
+def asignar_numeros_faltantes(db: Session, renumerar: bool = False) -> int:
+    """
+    Asigna números a las visitas sin número (o a todas si `renumerar`).
+    Devuelve la cantidad de visitas actualizadas.
+    """
+    filas = db.query(
+        VisitaCompletaPAE.id,
+        VisitaCompletaPAE.profesional_id,
+        VisitaCompletaPAE.numero_visita_usuario,
+    ).order_by(
+        VisitaCompletaPAE.profesional_id,
+        VisitaCompletaPAE.fecha_creacion,
+        VisitaCompletaPAE.id,
+    ).all()
+
+    ultimo_por_profesional = defaultdict(int)
+    if not renumerar:
+        for fila in filas:
+            if fila.numero_visita_usuario:
+                ultimo_por_profesional[fila.profesional_id] = max(
+                    ultimo_por_profesional[fila.profesional_id], fila.numero_visita_usuario
+                )
+
+    cambios = []
+    for fila in filas:
+        if not renumerar and fila.numero_visita_usuario:
+            continue
+        ultimo_por_profesional[fila.profesional_id] += 1
+        numero = ultimo_por_profesional[fila.profesional_id]
+        if numero != fila.numero_visita_usuario:
+            cambios.append({"id": fila.id, "numero_visita_usuario": numero})
+
+    if cambios:
+        # UPDATE por clave primaria en lote (executemany)
+        db.execute(update(VisitaCompletaPAE), cambios)
+    return len(cambios)
+
+
+def contar_duplicados(db: Session) -> int:
+    """Cuenta los números de visita repetidos dentro de un mismo profesional."""
+    return db.query(
+        VisitaCompletaPAE.profesional_id,
+        VisitaCompletaPAE.numero_visita_usuario,
+    ).filter(
+        VisitaCompletaPAE.numero_visita_usuario.isnot(None)
+    ).group_by(
+        VisitaCompletaPAE.profesional_id,
+        VisitaCompletaPAE.numero_visita_usuario,
+    ).having(func.count(VisitaCompletaPAE.id) > 1).count()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill de numero_visita_usuario y sus contadores")
+    parser.add_argument(
+        "--renumerar",
+        action="store_true",
+        help="Reasignar la numeración completa de cada profesional en orden de creación",
+    )
+    args = parser.parse_args()
+
+    print("🚀 Iniciando backfill de numeración de visitas...\n")
+
+    # Asegurar que exista la tabla de contadores
+    ContadorVisitasUsuario.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        duplicados = contar_duplicados(db)
+        if duplicados and not args.renumerar:
+            print(f"⚠️ Hay {duplicados} números de visita repetidos; use --renumerar para corregirlos")
+
+        actualizadas = asignar_numeros_faltantes(db, renumerar=args.renumerar)
+        print(f"✅ Visitas numeradas: {actualizadas}")
+
+        if args.renumerar:
+            # Los contadores deben reflejar la nueva numeración aunque antes fueran mayores
+            db.query(ContadorVisitasUsuario).delete(synchronize_session=False)
+
+        contadores = NumeracionVisitasService(db).sincronizar_contadores()
+        print(f"✅ Contadores inicializados: {len(contadores)} profesionales")
+
+        db.commit()
+        print("\n🎉 Backfill completado exitosamente!")
+
+    except Exception as e:
+        print(f"❌ Error durante el backfill: {str(e)}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Reconstrucción de los resúmenes diarios de visitas.
+
+Recalcula las tablas resumen_diario_visitas_asignadas y
+resumen_diario_visitas_completas a partir de visitas_asignadas y
+visitas_completas_pae. Sirve para cargar el historial la primera vez o para
+corregir desvíos tras cambios hechos directamente en la base de datos.
+
+Uso:
+    python app/scripts/reconstruir_resumenes_diarios.py
+    python app/scripts/reconstruir_resumenes_diarios.py --desde 2025-01-01 --hasta 2025-03-31
+"""
+
+import sys
+import os
+import argparse
+from datetime import date
+
+# Añadir el directorio raíz al path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.database import SessionLocal, engine
+from app.models import ResumenDiarioVisitasAsignadas, ResumenDiarioVisitasCompletas
+from app.services.resumenes_diarios import ResumenesDiariosService
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye los resúmenes diarios de visitas")
+    parser.add_argument("--desde", type=date.fromisoformat, help="Primer día a recalcular (AAAA-MM-DD)")
+    parser.add_argument("--hasta", type=date.fromisoformat, help="Último día a recalcular (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    print("🚀 Reconstruyendo resúmenes diarios de visitas...\n")
+
+    # Asegurar que existan las tablas de resumen
+    ResumenDiarioVisitasAsignadas.__table__.create(bind=engine, checkfirst=True)
+    ResumenDiarioVisitasCompletas.__table__.create(bind=engine, checkfirst=True)
+
+    db = SessionLocal()
+    try:
+        filas = ResumenesDiariosService(db).reconstruir(desde=args.desde, hasta=args.hasta)
+        db.commit()
+        for tabla, total in filas.items():
+            print(f"✅ {tabla}: {total} filas")
+        print("\n🎉 Reconstrucción completada exitosamente!")
+
+    except Exception as e:
+        print(f"❌ Error durante la reconstrucción: {str(e)}")
+        db.rollback()
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,24 @@
 # app/services/__init__.py
 
 from .notificaciones_service import NotificacionesService
+from .cache_usuarios import CacheUsuarios, cache_usuarios
+from .sincronizacion_service import SincronizacionService
+from .numeracion_visitas import NumeracionVisitasService
+from .exportador_excel import ExportadorExcel, ColumnaExcel
+from .exportaciones_service import ColaExportaciones, cola_exportaciones
+from .render_pdf import renderizar_tabla_pdf
+from .resumenes_diarios import ResumenesDiariosService
+from .kpis_service import MotorKPIs, motor_kpis
+from .calendario_visitas import CacheCalendario, cache_calendario
+from .programacion_visitas import ProgramacionVisitasService
+from .rutas_visitas import optimizar_ruta
+from .indice_sedes import IndiceSedes, indice_sedes
+from .catalogo_geografico import CatalogoGeografico, catalogo_geografico
+from .cambios_sincronizacion import CambiosSincronizacionService
 
-__all__ = ["NotificacionesService"]
+__all__ = ["NotificacionesService", "CacheUsuarios", "cache_usuarios", "SincronizacionService", "NumeracionVisitasService", "ExportadorExcel", "ColumnaExcel",
+           "ColaExportaciones", "cola_exportaciones", "renderizar_tabla_pdf",
+           "MotorKPIs", "motor_kpis", "ResumenesDiariosService", "CacheCalendario", "cache_calendario",
+           "ProgramacionVisitasService", "optimizar_ruta",
+           "IndiceSedes", "indice_sedes", "CatalogoGeografico", "catalogo_geografico",
+           "CambiosSincronizacionService"]
@@ -0,0 +1,114 @@
+# app/services/cache_checklist.py
+
+import threading
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional
+
+from sqlalchemy.orm import Session
+
+from ..models import ChecklistCategoria, ChecklistItem
+from ..config import CACHE_CHECKLIST_TTL_SEGUNDOS
+from ..utils.cache_http import ContenidoJson, serializar_json
+
+
+class ItemChecklistInfo(NamedTuple):
+    id: int
+    categoria_id: int
+    pregunta_texto: str
+    orden: Optional[int]
+
+
+class CacheChecklist:
+    """
+    Caché en memoria de los ítems del checklist PAE (ítem -> categoría, texto).
+
+    El checklist cambia muy poco, así que se carga con una sola consulta y se
+    reutiliza al guardar respuestas, al generar reportes y para servir el
+    checklist completo a la app (JSON ya serializado con su ETag). Las rutas que
+    modifican ítems o categorías llaman a `invalidar()`; el TTL acota el
+    tiempo que otros workers pueden servir datos desactualizados.
+    """
+
+    def __init__(self, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self._items: Optional[Dict[int, ItemChecklistInfo]] = None
+        self._vence = 0.0
+        self._json: Optional[ContenidoJson] = None
+        self._vence_json = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        """Número de versión, incrementado en cada invalidación."""
+        return self._version
+
+    def obtener_items(self, db: Session, recargar: bool = False) -> Dict[int, ItemChecklistInfo]:
+        """Devuelve el mapa completo {item_id: ItemChecklistInfo}."""
+        with self._lock:
+            if not recargar and self._items is not None and self._vence > time.monotonic():
+                return self._items
+
+        filas = db.query(
+            ChecklistItem.id,
+            ChecklistItem.categoria_id,
+            ChecklistItem.pregunta_texto,
+            ChecklistItem.orden,
+        ).all()
+        items = {fila.id: ItemChecklistInfo(*fila) for fila in filas}
+
+        with self._lock:
+            self._items = items
+            self._vence = time.monotonic() + self.ttl_segundos
+        return items
+
+    def categorias_de(self, db: Session, item_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Devuelve {item_id: categoria_id} para los ítems indicados. Si falta
+        alguno se recarga la caché una vez antes de darlo por inexistente.
+        """
+        item_ids = set(item_ids)
+        items = self.obtener_items(db)
+        if not item_ids.issubset(items):
+            items = self.obtener_items(db, recargar=True)
+        return {item_id: items[item_id].categoria_id for item_id in item_ids if item_id in items}
+
+    def obtener_json(self, db: Session) -> ContenidoJson:
+        """
+        Checklist completo (categorías por id con sus ítems por id) con el
+        formato de `ChecklistCategoriaBase`, serializado una vez por versión.
+        """
+        with self._lock:
+            if self._json is not None and self._vence_json > time.monotonic():
+                return self._json
+            version = self._version
+
+        items_por_categoria: Dict[int, List[Dict]] = {}
+        for item in sorted(self.obtener_items(db).values(), key=lambda item: item.id):
+            items_por_categoria.setdefault(item.categoria_id, []).append(
+                {"id": item.id, "pregunta_texto": item.pregunta_texto}
+            )
+        categorias = [
+            {"id": fila.id, "nombre": fila.nombre, "items": items_por_categoria.get(fila.id, [])}
+            for fila in db.query(ChecklistCategoria.id, ChecklistCategoria.nombre).order_by(ChecklistCategoria.id)
+        ]
+        datos = serializar_json(categorias)
+
+        with self._lock:
+            # Si hubo una invalidación durante la carga, este JSON ya no se guarda
+            if self._version == version:
+                self._json = datos
+                self._vence_json = time.monotonic() + self.ttl_segundos
+        return datos
+
+    def invalidar(self):
+        """Descarta los ítems cacheados y avanza la versión."""
+        with self._lock:
+            self._items = None
+            self._vence = 0.0
+            self._json = None
+            self._vence_json = 0.0
+            self._version += 1
+
+
+cache_checklist = CacheChecklist(ttl_segundos=CACHE_CHECKLIST_TTL_SEGUNDOS)
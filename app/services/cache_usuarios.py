@@ -0,0 +1,150 @@
+# app/services/cache_usuarios.py
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session, joinedload, make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from sqlalchemy.orm.attributes import set_committed_value
+
+from ..models import Rol, Usuario
+from ..config import CACHE_USUARIOS_TTL_SEGUNDOS, CACHE_USUARIOS_MAX_ENTRADAS
+
+
+class CacheUsuarios:
+    """
+    Caché LRU con expiración (TTL) de usuarios autenticados.
+
+    La clave es el par (sub, exp) del token JWT, de modo que cada token
+    resuelve su usuario contra la base de datos una sola vez por ventana
+    de TTL. Se guarda una copia plana de las columnas del usuario y de su
+    rol; en cada acierto se reconstruye un objeto ORM y se adjunta a la
+    sesión de la petición sin emitir ninguna consulta, por lo que las rutas
+    pueden seguir modificándolo y haciendo commit como antes.
+    """
+
+    def __init__(self, ttl_segundos: int, max_entradas: int):
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self._entradas: "OrderedDict[Tuple[str, Optional[int]], Tuple[float, Dict, Optional[Dict]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obtener(self, db: Session, correo: str, exp: Optional[int] = None) -> Optional[Usuario]:
+        """
+        Devuelve el usuario del token (con su rol cargado) o None si no existe.
+        """
+        clave = (correo, exp)
+        ahora = time.monotonic()
+
+        if self.ttl_segundos > 0:
+            with self._lock:
+                entrada = self._entradas.get(clave)
+                if entrada is not None:
+                    if entrada[0] > ahora:
+                        self._entradas.move_to_end(clave)
+                        return self._adjuntar(db, entrada[1], entrada[2])
+                    del self._entradas[clave]
+
+        usuario = db.query(Usuario).options(
+            joinedload(Usuario.rol)
+        ).filter(Usuario.correo == correo).first()
+
+        if usuario is None or self.ttl_segundos <= 0:
+            return usuario
+
+        datos_usuario = {
+            "id": usuario.id,
+            "nombre": usuario.nombre,
+            "correo": usuario.correo,
+            "contrasena": usuario.contrasena,
+            "rol_id": usuario.rol_id,
+        }
+        datos_rol = {"id": usuario.rol.id, "nombre": usuario.rol.nombre} if usuario.rol else None
+
+        # La entrada nunca sobrevive al propio token
+        vence = ahora + self.ttl_segundos
+        if exp is not None:
+            vence = min(vence, ahora + max(0, exp - time.time()))
+
+        with self._lock:
+            self._entradas[clave] = (vence, datos_usuario, datos_rol)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+
+        return usuario
+
+    def invalidar_usuario(self, usuario_id: Optional[int] = None, correo: Optional[str] = None) -> int:
+        """
+        Elimina las entradas de un usuario (por ID o por correo).
+        Debe llamarse al modificar o eliminar el usuario.
+        """
+        with self._lock:
+            claves = [
+                clave for clave, (_, datos_usuario, _) in self._entradas.items()
+                if (usuario_id is not None and datos_usuario["id"] == usuario_id)
+                or (correo is not None and datos_usuario["correo"] == correo)
+            ]
+            for clave in claves:
+                del self._entradas[clave]
+        return len(claves)
+
+    def invalidar_rol(self, rol_id: int) -> int:
+        """
+        Elimina las entradas de todos los usuarios con el rol indicado.
+        """
+        with self._lock:
+            claves = [
+                clave for clave, (_, datos_usuario, _) in self._entradas.items()
+                if datos_usuario["rol_id"] == rol_id
+            ]
+            for clave in claves:
+                del self._entradas[clave]
+        return len(claves)
+
+    def limpiar(self):
+        """Vacía la caché completa."""
+        with self._lock:
+            self._entradas.clear()
+
+    def estadisticas(self) -> Dict[str, int]:
+        """Tamaño actual y límites configurados de la caché."""
+        with self._lock:
+            return {
+                "entradas": len(self._entradas),
+                "max_entradas": self.max_entradas,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+    @staticmethod
+    def _adjuntar(db: Session, datos_usuario: Dict, datos_rol: Optional[Dict]) -> Usuario:
+        """
+        Reconstruye el usuario cacheado como instancia persistente de la sesión
+        sin consultar la base de datos.
+        """
+        existente = db.identity_map.get(identity_key(Usuario, datos_usuario["id"]))
+        if existente is not None:
+            return existente
+
+        usuario = Usuario(**datos_usuario)
+        make_transient_to_detached(usuario)
+
+        rol = None
+        if datos_rol is not None:
+            rol = db.identity_map.get(identity_key(Rol, datos_rol["id"]))
+            if rol is None:
+                rol = Rol(**datos_rol)
+                make_transient_to_detached(rol)
+                db.add(rol)
+        set_committed_value(usuario, "rol", rol)
+
+        db.add(usuario)
+        return usuario
+
+
+cache_usuarios = CacheUsuarios(
+    ttl_segundos=CACHE_USUARIOS_TTL_SEGUNDOS,
+    max_entradas=CACHE_USUARIOS_MAX_ENTRADAS,
+)
@@ -0,0 +1,235 @@
+# app/services/calendario_visitas.py
+
+import calendar
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy import inspect as inspeccionar
+from sqlalchemy.orm import Session
+
+from ..models import SedeEducativa, Usuario, VisitaAsignada
+from ..config import CALENDARIO_CACHE_TTL_SEGUNDOS, CALENDARIO_CACHE_MAX_MESES
+
+# Clave de session.info con los días tocados en la transacción en curso
+_DIAS_PENDIENTES = "calendario_dias_pendientes"
+
+# Campos de la visita asignada que se muestran en el calendario
+_CAMPOS_CALENDARIO = ("fecha_programada", "estado", "visitador_id", "sede_id")
+
+
+def _a_dia(valor) -> Optional[date]:
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _dias_del_mes(anio: int, mes: int) -> List[date]:
+    return [date(anio, mes, dia) for dia in range(1, calendar.monthrange(anio, mes)[1] + 1)]
+
+
+class CacheCalendario:
+    """
+    Caché en memoria del calendario de visitas asignadas, por (anio, mes).
+
+    Cada mes se guarda como un mapa día -> lista de visitas ya serializadas.
+    Al confirmarse una transacción que crea, reprograma, cancela o elimina
+    visitas solo se descartan los días afectados; la siguiente lectura del mes
+    vuelve a consultar únicamente esos días. Las semanas, trimestres y el
+    filtro por visitador se arman con los días cacheados. El TTL acota el
+    tiempo que otros workers (o cambios de nombres de sedes y usuarios)
+    pueden servir datos desactualizados.
+    """
+
+    def __init__(self, ttl_segundos: int, max_meses: int):
+        self.ttl_segundos = ttl_segundos
+        self.max_meses = max_meses
+        # (anio, mes) -> (vence, {día: [visitas]}); los días ausentes están invalidados
+        self._meses: "OrderedDict[Tuple[int, int], Tuple[float, Dict[date, List[Dict]]]]" = OrderedDict()
+        # Se incrementa en cada invalidación para no guardar lecturas que se cruzaron con ella
+        self._generacion = 0
+        self._lock = threading.Lock()
+
+    def obtener_rango(self, db: Session, desde: date, hasta: date,
+                      visitador_id: Optional[int] = None) -> List[Dict]:
+        """
+        Días de `desde` a `hasta` (inclusive) con sus visitas, total y
+        nombres de visitadores, opcionalmente solo de un visitador.
+        """
+        dias_por_mes: Dict[Tuple[int, int], List[date]] = {}
+        dia = desde
+        while dia <= hasta:
+            dias_por_mes.setdefault((dia.year, dia.month), []).append(dia)
+            dia += timedelta(days=1)
+
+        calendario = []
+        for (anio, mes), dias in dias_por_mes.items():
+            visitas_por_dia = self._obtener_mes(db, anio, mes)
+            for dia in dias:
+                visitas = visitas_por_dia[dia]
+                if visitador_id is not None:
+                    visitas = [visita for visita in visitas if visita["visitador_id"] == visitador_id]
+                calendario.append({
+                    "fecha": dia.strftime("%Y-%m-%d"),
+                    "visitas": visitas,
+                    "total": len(visitas),
+                    # Nombres únicos en orden de aparición
+                    "visitadores": list(dict.fromkeys(
+                        visita["visitador"] for visita in visitas if visita["visitador_id"] is not None
+                    )),
+                })
+        return calendario
+
+    def _obtener_mes(self, db: Session, anio: int, mes: int) -> Dict[date, List[Dict]]:
+        clave = (anio, mes)
+        dias_mes = _dias_del_mes(anio, mes)
+        ahora = time.monotonic()
+
+        with self._lock:
+            generacion = self._generacion
+            entrada = self._meses.get(clave)
+            if entrada is not None and entrada[0] <= ahora:
+                del self._meses[clave]
+                entrada = None
+            if entrada is not None:
+                self._meses.move_to_end(clave)
+                vence, cacheados = entrada[0], dict(entrada[1])
+            else:
+                vence, cacheados = ahora + self.ttl_segundos, {}
+
+        faltantes = [dia for dia in dias_mes if dia not in cacheados]
+        if not faltantes:
+            return cacheados
+
+        cacheados.update(self._consultar_dias(db, faltantes))
+
+        with self._lock:
+            if self._generacion == generacion:
+                self._meses[clave] = (vence, cacheados)
+                self._meses.move_to_end(clave)
+                while len(self._meses) > self.max_meses:
+                    self._meses.popitem(last=False)
+        return cacheados
+
+    @staticmethod
+    def _consultar_dias(db: Session, dias: List[date]) -> Dict[date, List[Dict]]:
+        """Visitas de los días indicados (una consulta del primero al último)."""
+        por_dia: Dict[date, List[Dict]] = {dia: [] for dia in dias}
+        inicio = datetime.combine(dias[0], datetime.min.time())
+        fin = datetime.combine(dias[-1] + timedelta(days=1), datetime.min.time())
+
+        filas = db.execute(
+            select(
+                VisitaAsignada.id,
+                VisitaAsignada.visitador_id,
+                VisitaAsignada.fecha_programada,
+                VisitaAsignada.estado,
+                SedeEducativa.nombre_sede,
+                Usuario.nombre,
+            )
+            .outerjoin(SedeEducativa, VisitaAsignada.sede_id == SedeEducativa.id)
+            .outerjoin(Usuario, VisitaAsignada.visitador_id == Usuario.id)
+            .where(VisitaAsignada.fecha_programada >= inicio, VisitaAsignada.fecha_programada < fin)
+            .order_by(VisitaAsignada.fecha_programada, VisitaAsignada.id)
+        )
+        for id_visita, visitador_id, fecha_programada, estado, sede_nombre, visitador_nombre in filas:
+            visitas = por_dia.get(fecha_programada.date())
+            if visitas is None:
+                # Día del rango que sigue vigente en la caché
+                continue
+            visitas.append({
+                "id": id_visita,
+                "sede_nombre": sede_nombre or "Sin sede",
+                "visitador": visitador_nombre or "Sin asignar",
+                "visitador_id": visitador_id,
+                "estado": estado or "programada",
+                "hora": fecha_programada.strftime("%H:%M"),
+            })
+        return por_dia
+
+    def invalidar_dias(self, dias: Iterable) -> int:
+        """Descarta los días indicados de los meses cacheados."""
+        dias = {_a_dia(dia) for dia in dias} - {None}
+        descartados = 0
+        with self._lock:
+            self._generacion += 1
+            for dia in dias:
+                entrada = self._meses.get((dia.year, dia.month))
+                if entrada is not None and dia in entrada[1]:
+                    entrada[1].pop(dia)
+                    descartados += 1
+        return descartados
+
+    def marcar_dias(self, db: Session, dias: Iterable):
+        """
+        Registra días modificados sin pasar por el ORM (UPDATE masivo); se
+        invalidan cuando la sesión confirma la transacción.
+        """
+        db.info.setdefault(_DIAS_PENDIENTES, set()).update(_a_dia(dia) for dia in dias)
+
+    def limpiar(self):
+        """Vacía la caché completa."""
+        with self._lock:
+            self._generacion += 1
+            self._meses.clear()
+
+
+cache_calendario = CacheCalendario(
+    ttl_segundos=CALENDARIO_CACHE_TTL_SEGUNDOS,
+    max_meses=CALENDARIO_CACHE_MAX_MESES,
+)
+
+
+def _dias_de_visita(objeto: VisitaAsignada, estado_objeto) -> Set[date]:
+    """Día actual y, si cambió, el día anterior de la visita."""
+    dias = {_a_dia(objeto.fecha_programada)}
+    historial = estado_objeto.attrs.fecha_programada.history
+    dias.update(_a_dia(valor) for valor in historial.deleted)
+    return dias
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_dias_modificados(session: Session, flush_context):
+    """
+    Anota los días de las visitas asignadas creadas, eliminadas o con cambios
+    visibles en el calendario. Se invalidan al hacer commit, para que otra
+    petición no vuelva a cachear el estado previo a la transacción.
+    """
+    dias: Set[date] = set()
+    for objeto in session.new:
+        if isinstance(objeto, VisitaAsignada):
+            dias.add(_a_dia(objeto.fecha_programada))
+    for objeto in session.deleted:
+        if isinstance(objeto, VisitaAsignada):
+            dias.update(_dias_de_visita(objeto, inspeccionar(objeto)))
+    for objeto in session.dirty:
+        if not isinstance(objeto, VisitaAsignada):
+            continue
+        estado_objeto = inspeccionar(objeto)
+        if any(estado_objeto.attrs[campo].history.has_changes() for campo in _CAMPOS_CALENDARIO):
+            dias.update(_dias_de_visita(objeto, estado_objeto))
+
+    dias.discard(None)
+    if dias:
+        session.info.setdefault(_DIAS_PENDIENTES, set()).update(dias)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidar_dias_confirmados(session: Session):
+    dias = session.info.pop(_DIAS_PENDIENTES, None)
+    if dias:
+        cache_calendario.invalidar_dias(dias)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _descartar_dias_pendientes(session: Session, previous_transaction):
+    # El rollback de un SAVEPOINT no descarta lo que el resto de la
+    # transacción exterior todavía puede confirmar
+    if previous_transaction.nested or session.in_transaction():
+        return
+    session.info.pop(_DIAS_PENDIENTES, None)
@@ -0,0 +1,394 @@
+# app/services/cambios_sincronizacion.py
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+
+from sqlalchemy import DateTime, Integer, String, delete, event, func, insert, literal, or_, select
+from sqlalchemy import inspect as inspeccionar
+from sqlalchemy.orm import Session, aliased
+
+from ..models import (
+    CambioSincronizacion,
+    ChecklistCategoria,
+    ChecklistItem,
+    Institucion,
+    Municipio,
+    Notificacion,
+    SedeEducativa,
+    Usuario,
+    VisitaAsignada,
+    VisitaCompletaPAE,
+)
+from ..config import SINCRONIZACION_MARGEN_SEGUNDOS, SINCRONIZACION_RETENCION_DIAS
+
+logger = logging.getLogger(__name__)
+
+LIMITE_MAXIMO_CAMBIOS = 1000
+# Intervalo mínimo entre depuraciones disparadas desde el feed, por proceso
+_INTERVALO_DEPURACION_SEGUNDOS = 3600
+_ultima_depuracion = 0.0
+_lock_depuracion = threading.Lock()
+
+
+class DefinicionEntidad(NamedTuple):
+    nombre: str
+    # Columna con el usuario dueño del registro; None en catálogos compartidos
+    campo_usuario: Optional[str]
+
+
+ENTIDADES = {
+    VisitaAsignada: DefinicionEntidad("visitas_asignadas", "visitador_id"),
+    VisitaCompletaPAE: DefinicionEntidad("visitas_completas", "profesional_id"),
+    Notificacion: DefinicionEntidad("notificaciones", "usuario_id"),
+    SedeEducativa: DefinicionEntidad("sedes", None),
+    ChecklistItem: DefinicionEntidad("checklist_items", None),
+}
+
+
+def _insertar_desde(modelo, fecha: datetime, *filtros):
+    """INSERT ... SELECT con una entrada por cada registro de `modelo` que cumple los filtros."""
+    definicion = ENTIDADES[modelo]
+    usuario = getattr(modelo, definicion.campo_usuario) if definicion.campo_usuario else literal(None, Integer)
+    return insert(CambioSincronizacion).from_select(
+        ["entidad", "registro_id", "usuario_id", "fecha"],
+        select(literal(definicion.nombre, String), modelo.id, usuario, literal(fecha, DateTime)).where(*filtros),
+    )
+
+
+def _entradas(objeto, definicion: DefinicionEntidad, eliminado: bool = False) -> List[Dict]:
+    """
+    Entradas del registro para su dueño actual y, si cambió en el flush, para
+    el anterior (que así recibe la baja). Si el dueño no está cargado la
+    entrada queda sin usuario y llega a todos; el feed la resuelve como baja
+    para quien no sea dueño.
+    """
+    estado = inspeccionar(objeto)
+    registro_id = estado.identity[0] if estado.identity else objeto.id
+    usuarios: Set[Optional[int]] = {None}
+    if definicion.campo_usuario:
+        historial = estado.attrs[definicion.campo_usuario].history
+        usuarios = set(historial.added) | set(historial.unchanged) | set(historial.deleted)
+        if not usuarios and not eliminado:
+            usuarios = {getattr(objeto, definicion.campo_usuario)}
+        usuarios = usuarios or {None}
+    return [
+        {"entidad": definicion.nombre, "registro_id": registro_id, "usuario_id": usuario}
+        for usuario in usuarios
+    ]
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar_cambios(session: Session, flush_context):
+    """
+    Registra las altas, cambios y bajas del flush en la misma transacción.
+    Las sentencias masivas no llegan aquí y deben usar
+    `CambiosSincronizacionService.registrar` o `registrar_filtro`.
+    """
+    entradas: List[Dict] = []
+    for objeto in session.new:
+        definicion = ENTIDADES.get(type(objeto))
+        if definicion:
+            entradas.extend(_entradas(objeto, definicion))
+    for objeto in session.deleted:
+        definicion = ENTIDADES.get(type(objeto))
+        if definicion:
+            entradas.extend(_entradas(objeto, definicion, eliminado=True))
+    for objeto in session.dirty:
+        definicion = ENTIDADES.get(type(objeto))
+        if definicion and session.is_modified(objeto, include_collections=False):
+            entradas.extend(_entradas(objeto, definicion))
+
+    # Los ítems del checklist se envían con el nombre de su categoría
+    categorias = [
+        objeto.id for objeto in session.dirty
+        if isinstance(objeto, ChecklistCategoria) and inspeccionar(objeto).attrs.nombre.history.has_changes()
+    ]
+
+    if not entradas and not categorias:
+        return
+    conexion = session.connection()
+    fecha = datetime.utcnow()
+    if entradas:
+        conexion.execute(insert(CambioSincronizacion), [dict(entrada, fecha=fecha) for entrada in entradas])
+    if categorias:
+        conexion.execute(_insertar_desde(ChecklistItem, fecha, ChecklistItem.categoria_id.in_(categorias)))
+
+
+def _visitas_asignadas(db: Session, ids: Set[int], usuario_id: int) -> List[Dict]:
+    Visitador = aliased(Usuario)
+    Supervisor = aliased(Usuario)
+    filas = db.execute(
+        select(
+            VisitaAsignada,
+            SedeEducativa.nombre_sede,
+            Municipio.nombre,
+            Institucion.nombre,
+            Visitador.nombre,
+            Supervisor.nombre,
+        )
+        .outerjoin(SedeEducativa, SedeEducativa.id == VisitaAsignada.sede_id)
+        .outerjoin(Municipio, Municipio.id == VisitaAsignada.municipio_id)
+        .outerjoin(Institucion, Institucion.id == VisitaAsignada.institucion_id)
+        .outerjoin(Visitador, Visitador.id == VisitaAsignada.visitador_id)
+        .outerjoin(Supervisor, Supervisor.id == VisitaAsignada.supervisor_id)
+        .where(VisitaAsignada.id.in_(ids), VisitaAsignada.visitador_id == usuario_id)
+        .order_by(VisitaAsignada.id)
+    )
+    # Mismo formato que VisitaAsignadaOut en /visitas-asignadas/mis-visitas
+    return [
+        {
+            "id": visita.id,
+            "sede_id": visita.sede_id,
+            "sede_nombre": sede or "Sede no encontrada",
+            "visitador_id": visita.visitador_id,
+            "visitador_nombre": visitador or "",
+            "supervisor_id": visita.supervisor_id,
+            "supervisor_nombre": supervisor or "Supervisor no encontrado",
+            "fecha_programada": visita.fecha_programada,
+            "tipo_visita": visita.tipo_visita,
+            "prioridad": visita.prioridad,
+            "estado": visita.estado,
+            "contrato": visita.contrato,
+            "operador": visita.operador,
+            "caso_atencion_prioritaria": visita.caso_atencion_prioritaria,
+            "municipio_id": visita.municipio_id,
+            "municipio_nombre": municipio or "Municipio no encontrado",
+            "institucion_id": visita.institucion_id,
+            "institucion_nombre": institucion or "Institución no encontrada",
+            "observaciones": visita.observaciones,
+            "fecha_creacion": visita.fecha_creacion,
+            "fecha_inicio": visita.fecha_inicio,
+            "fecha_completada": visita.fecha_completada,
+        }
+        for visita, sede, municipio, institucion, visitador, supervisor in filas
+    ]
+
+
+def _visitas_completas(db: Session, ids: Set[int], usuario_id: int) -> List[Dict]:
+    # Mismas columnas que la vista "resumen" de los listados de visitas completas
+    filas = db.execute(
+        select(
+            VisitaCompletaPAE.id,
+            VisitaCompletaPAE.fecha_visita,
+            VisitaCompletaPAE.contrato,
+            VisitaCompletaPAE.operador,
+            VisitaCompletaPAE.estado,
+            VisitaCompletaPAE.municipio_id,
+            VisitaCompletaPAE.institucion_id,
+            VisitaCompletaPAE.sede_id,
+            VisitaCompletaPAE.profesional_id,
+            VisitaCompletaPAE.numero_visita_usuario,
+            VisitaCompletaPAE.fecha_creacion,
+            Municipio.nombre.label("municipio_nombre"),
+            Institucion.nombre.label("institucion_nombre"),
+            SedeEducativa.nombre_sede.label("sede_nombre"),
+            Usuario.nombre.label("profesional_nombre"),
+        )
+        .outerjoin(Municipio, Municipio.id == VisitaCompletaPAE.municipio_id)
+        .outerjoin(Institucion, Institucion.id == VisitaCompletaPAE.institucion_id)
+        .outerjoin(SedeEducativa, SedeEducativa.id == VisitaCompletaPAE.sede_id)
+        .outerjoin(Usuario, Usuario.id == VisitaCompletaPAE.profesional_id)
+        .where(VisitaCompletaPAE.id.in_(ids), VisitaCompletaPAE.profesional_id == usuario_id)
+        .order_by(VisitaCompletaPAE.id)
+    )
+    return [dict(fila._mapping) for fila in filas]
+
+
+def _notificaciones(db: Session, ids: Set[int], usuario_id: int) -> List[Dict]:
+    filas = db.execute(
+        select(
+            Notificacion.id,
+            Notificacion.usuario_id,
+            Notificacion.titulo,
+            Notificacion.mensaje,
+            Notificacion.tipo,
+            Notificacion.prioridad,
+            Notificacion.leida,
+        )
+        .where(Notificacion.id.in_(ids), Notificacion.usuario_id == usuario_id)
+        .order_by(Notificacion.id)
+    )
+    return [dict(fila._mapping) for fila in filas]
+
+
+def _sedes(db: Session, ids: Set[int], usuario_id: int) -> List[Dict]:
+    filas = db.execute(
+        select(
+            SedeEducativa.id,
+            SedeEducativa.nombre_sede,
+            SedeEducativa.dane,
+            SedeEducativa.due,
+            SedeEducativa.municipio_id,
+            SedeEducativa.institucion_id,
+            SedeEducativa.principal,
+            SedeEducativa.lat,
+            SedeEducativa.lon,
+        )
+        .where(SedeEducativa.id.in_(ids))
+        .order_by(SedeEducativa.id)
+    )
+    # Mismo formato que el catálogo geográfico (/sedes)
+    return [
+        {
+            "id": fila.id,
+            "nombre": fila.nombre_sede,
+            "dane": fila.dane or "",
+            "due": fila.due or "",
+            "municipio_id": fila.municipio_id,
+            "institucion_id": fila.institucion_id,
+            "principal": fila.principal or False,
+            "lat": fila.lat,
+            "lon": fila.lon,
+        }
+        for fila in filas
+    ]
+
+
+def _checklist_items(db: Session, ids: Set[int], usuario_id: int) -> List[Dict]:
+    filas = db.execute(
+        select(
+            ChecklistItem.id,
+            ChecklistItem.categoria_id,
+            ChecklistCategoria.nombre.label("categoria_nombre"),
+            ChecklistItem.pregunta_texto,
+            ChecklistItem.orden,
+        )
+        .outerjoin(ChecklistCategoria, ChecklistCategoria.id == ChecklistItem.categoria_id)
+        .where(ChecklistItem.id.in_(ids))
+        .order_by(ChecklistItem.id)
+    )
+    return [dict(fila._mapping) for fila in filas]
+
+
+# Estado vigente de los registros pedidos que el usuario puede ver
+_SERIALIZADORES: Dict[str, Callable[[Session, Set[int], int], List[Dict]]] = {
+    "visitas_asignadas": _visitas_asignadas,
+    "visitas_completas": _visitas_completas,
+    "notificaciones": _notificaciones,
+    "sedes": _sedes,
+    "checklist_items": _checklist_items,
+}
+
+
+class CambiosSincronizacionService:
+    """
+    Registro de cambios para la sincronización incremental de la app móvil.
+
+    El listener de after_flush registra lo que pasa por el ORM; las
+    sentencias masivas deben llamar a `registrar` (con los ids devueltos por
+    RETURNING) o a `registrar_filtro` (antes del UPDATE o DELETE). Ningún
+    método hace commit.
+    """
+
+    def __init__(self, db: Session, margen_segundos: int = SINCRONIZACION_MARGEN_SEGUNDOS):
+        self.db = db
+        self.margen_segundos = margen_segundos
+
+    def registrar(self, modelo, registros: Iterable[Tuple[int, Optional[int]]]) -> int:
+        """Registra pares (id, usuario dueño) escritos sin el ORM."""
+        nombre = ENTIDADES[modelo].nombre
+        fecha = datetime.utcnow()
+        entradas = [
+            {"entidad": nombre, "registro_id": registro_id, "usuario_id": usuario_id, "fecha": fecha}
+            for registro_id, usuario_id in registros
+        ]
+        if entradas:
+            self.db.execute(insert(CambioSincronizacion), entradas)
+        return len(entradas)
+
+    def registrar_filtro(self, modelo, *filtros) -> int:
+        """
+        Registra los registros que cumplen los filtros con un solo INSERT ...
+        SELECT. Se llama antes del UPDATE o DELETE masivo, mientras los
+        filtros todavía seleccionan esas filas.
+        """
+        return self.db.execute(_insertar_desde(modelo, datetime.utcnow(), *filtros)).rowcount or 0
+
+    def cursor_actual(self) -> int:
+        return self.db.execute(select(func.max(CambioSincronizacion.id))).scalar() or 0
+
+    def carga_completa(self) -> Dict:
+        """Respuesta que pide al cliente descargar todo y seguir desde el cursor vigente."""
+        return {"cursor": self.cursor_actual(), "hay_mas": False, "requiere_carga_completa": True, "cambios": {}}
+
+    def depurar(self, retencion_dias: int = SINCRONIZACION_RETENCION_DIAS) -> int:
+        """
+        Elimina las entradas con más de `retencion_dias`. La más reciente se
+        conserva siempre: su id marca el límite a partir del cual un cursor
+        ya no puede ponerse al día con el registro.
+        """
+        C = CambioSincronizacion
+        ultimo = self.cursor_actual()
+        limite = datetime.utcnow() - timedelta(days=retencion_dias)
+        eliminadas = self.db.execute(
+            delete(C).where(C.fecha < limite, C.id < ultimo).execution_options(synchronize_session=False)
+        ).rowcount or 0
+        if eliminadas:
+            logger.info(f"{eliminadas} entradas del registro de cambios depuradas (retención {retencion_dias} días)")
+        return eliminadas
+
+    def depurar_si_corresponde(self) -> int:
+        """Depura como mucho una vez por hora en este proceso (hace commit)."""
+        global _ultima_depuracion
+        with _lock_depuracion:
+            if time.monotonic() - _ultima_depuracion < _INTERVALO_DEPURACION_SEGUNDOS:
+                return 0
+            _ultima_depuracion = time.monotonic()
+        eliminadas = self.depurar()
+        self.db.commit()
+        return eliminadas
+
+    def listar(self, usuario_id: int, cursor: int, limite: int) -> Dict:
+        """
+        Cambios visibles para el usuario posteriores a `cursor`, agrupados por
+        entidad: los registros vigentes con sus datos actuales y los ids de
+        los que ya no existen (o dejaron de ser suyos). Varias entradas del
+        mismo registro se envían una sola vez.
+
+        Los ids del registro se asignan antes del commit, así que una
+        transacción lenta puede confirmar un id menor que otro ya entregado.
+        Por eso no se entregan las entradas de los últimos `margen_segundos`.
+
+        Si el cursor es anterior a la entrada más antigua conservada, las
+        entradas intermedias ya se depuraron y se responde como `carga_completa`.
+        """
+        C = CambioSincronizacion
+        primero = self.db.execute(select(func.min(C.id))).scalar()
+        if primero is not None and cursor < primero - 1:
+            return self.carga_completa()
+
+        filas = self.db.execute(
+            select(C.id, C.entidad, C.registro_id)
+            .where(
+                C.id > cursor,
+                or_(C.usuario_id == usuario_id, C.usuario_id.is_(None)),
+                C.fecha <= datetime.utcnow() - timedelta(seconds=self.margen_segundos),
+            )
+            .order_by(C.id)
+            .limit(limite + 1)
+        ).all()
+        hay_mas = len(filas) > limite
+        filas = filas[:limite]
+
+        ids_por_entidad: Dict[str, Set[int]] = {}
+        for _, entidad, registro_id in filas:
+            ids_por_entidad.setdefault(entidad, set()).add(registro_id)
+
+        cambios = {}
+        for entidad, ids in ids_por_entidad.items():
+            serializar = _SERIALIZADORES.get(entidad)
+            if serializar is None:
+                continue
+            actualizados = serializar(self.db, ids, usuario_id)
+            vigentes = {registro["id"] for registro in actualizados}
+            cambios[entidad] = {"actualizados": actualizados, "eliminados": sorted(ids - vigentes)}
+
+        return {
+            "cursor": filas[-1].id if filas else cursor,
+            "hay_mas": hay_mas,
+            "requiere_carga_completa": False,
+            "cambios": cambios,
+        }
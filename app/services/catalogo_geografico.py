@@ -0,0 +1,137 @@
+# app/services/catalogo_geografico.py
+
+import threading
+import time
+from typing import Callable, Dict, Hashable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from ..models import Institucion, Municipio, SedeEducativa
+from ..config import CATALOGO_CACHE_TTL_SEGUNDOS
+from ..utils.cache_http import ContenidoJson, serializar_json
+
+# Respuesta compartida para filtros sin resultados (p. ej. ids inexistentes)
+_LISTA_VACIA = serializar_json([])
+
+
+class DatosCatalogo:
+    """
+    Foto del catálogo geográfico (municipios -> instituciones -> sedes) con
+    índices por municipio e institución. Las respuestas JSON (y su ETag) se
+    calculan una sola vez por clave y se reutilizan hasta la siguiente versión.
+    """
+
+    def __init__(self, version: int, municipios: List[Dict], instituciones: List[Dict], sedes: List[Dict]):
+        self.version = version
+        self.municipios = municipios
+        self.instituciones = instituciones
+        self.sedes = sedes
+
+        self.instituciones_por_municipio: Dict[int, List[Dict]] = {}
+        for institucion in instituciones:
+            self.instituciones_por_municipio.setdefault(institucion["municipio_id"], []).append(institucion)
+
+        self.sedes_por_municipio: Dict[int, List[Dict]] = {}
+        self.sedes_por_institucion: Dict[int, List[Dict]] = {}
+        for sede in sedes:
+            self.sedes_por_municipio.setdefault(sede["municipio_id"], []).append(sede)
+            self.sedes_por_institucion.setdefault(sede["institucion_id"], []).append(sede)
+
+        self._json: Dict[Hashable, ContenidoJson] = {}
+
+    def json(self, clave: Hashable, construir: Callable[["DatosCatalogo"], object]) -> ContenidoJson:
+        """
+        JSON y ETag de la respuesta `clave`, construida con `construir` la
+        primera vez. Las respuestas vacías no se guardan: las claves incluyen
+        ids enviados por el cliente y así solo se cachean las de registros
+        existentes.
+        """
+        contenido = self._json.get(clave)
+        if contenido is None:
+            datos = construir(self)
+            if not datos:
+                return _LISTA_VACIA
+            contenido = self._json[clave] = serializar_json(datos)
+        return contenido
+
+
+class CatalogoGeografico:
+    """
+    Caché en memoria del catálogo geográfico usado por la app móvil y el
+    panel de administración.
+
+    Se carga con una consulta por tabla y lleva un número de versión que
+    avanza con cada invalidación; las rutas de creación, actualización y
+    eliminación de sedes llaman a `invalidar()`. El TTL acota el tiempo que
+    otros workers pueden servir datos desactualizados.
+    """
+
+    def __init__(self, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self._datos: Optional[DatosCatalogo] = None
+        self._vence = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        """Número de versión, incrementado en cada invalidación."""
+        return self._version
+
+    def obtener(self, db: Session, recargar: bool = False) -> DatosCatalogo:
+        with self._lock:
+            if not recargar and self._datos is not None and self._vence > time.monotonic():
+                return self._datos
+            version = self._version
+
+        municipios = [
+            {"id": fila.id, "nombre": fila.nombre}
+            for fila in db.query(Municipio.id, Municipio.nombre).order_by(Municipio.nombre, Municipio.id)
+        ]
+        instituciones = [
+            {"id": fila.id, "nombre": fila.nombre, "dane": None, "municipio_id": fila.municipio_id}
+            for fila in db.query(Institucion.id, Institucion.nombre, Institucion.municipio_id)
+            .order_by(Institucion.nombre, Institucion.id)
+        ]
+        sedes = [
+            {
+                "id": fila.id,
+                "nombre": fila.nombre_sede,
+                "dane": fila.dane or "",
+                "due": fila.due or "",
+                "municipio_id": fila.municipio_id,
+                "institucion_id": fila.institucion_id,
+                "principal": fila.principal or False,
+                "lat": fila.lat,
+                "lon": fila.lon,
+            }
+            for fila in db.query(
+                SedeEducativa.id,
+                SedeEducativa.nombre_sede,
+                SedeEducativa.dane,
+                SedeEducativa.due,
+                SedeEducativa.municipio_id,
+                SedeEducativa.institucion_id,
+                SedeEducativa.principal,
+                SedeEducativa.lat,
+                SedeEducativa.lon,
+            ).order_by(SedeEducativa.nombre_sede, SedeEducativa.id)
+        ]
+        datos = DatosCatalogo(version, municipios, instituciones, sedes)
+
+        with self._lock:
+            # Si hubo una invalidación durante la carga, esta foto ya no se guarda
+            if self._version == version:
+                self._datos = datos
+                self._vence = time.monotonic() + self.ttl_segundos
+        return datos
+
+    def invalidar(self):
+        """Descarta el catálogo cacheado y avanza la versión."""
+        with self._lock:
+            self._datos = None
+            self._vence = 0.0
+            self._version += 1
+
+
+catalogo_geografico = CatalogoGeografico(ttl_segundos=CATALOGO_CACHE_TTL_SEGUNDOS)
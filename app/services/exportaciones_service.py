@@ -0,0 +1,221 @@
+# app/services/exportaciones_service.py
+
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import ExportJob, Usuario
+from ..config import (
+    EXPORTACIONES_MAX_WORKERS,
+    EXPORTACIONES_DIAS_VIGENCIA,
+    EXPORTACIONES_DIRECTORIO,
+    EXPORTACIONES_TIMEOUT_MINUTOS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Firma de los generadores: (db, filtros, formato, timestamp, export_dir, usuario) -> dict
+# con las claves success, message, filename, registros y formato
+GeneradorExportacion = Callable[..., Dict]
+
+
+class ColaExportaciones:
+    """
+    Cola en proceso para las exportaciones del panel de administración.
+
+    Cada solicitud crea un ExportJob y se devuelve de inmediato; el archivo se
+    genera en un pool de hilos con su propia sesión de base de datos, de modo
+    que la petición no retiene un worker ni una conexión durante el render.
+    El estado queda en la tabla export_jobs, así que cualquier worker de
+    uvicorn puede consultar el progreso y servir la descarga.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._generadores: Dict[str, GeneradorExportacion] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def registrar_generador(self, tipo: str, generador: GeneradorExportacion):
+        """Asocia un ID de plantilla con la función que genera su archivo."""
+        self._generadores[tipo] = generador
+
+    def tipos_disponibles(self) -> List[str]:
+        return list(self._generadores)
+
+    def _obtener_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="exportaciones",
+                )
+            return self._executor
+
+    def encolar(self, db: Session, usuario: Usuario, tipo: str, formato: str, filtros: Dict) -> ExportJob:
+        """
+        Registra el trabajo (commit incluido, para que el hilo lo vea) y lo envía
+        al pool. Lanza ValueError si la plantilla no existe.
+        """
+        if tipo not in self._generadores:
+            raise ValueError(f"Plantilla no encontrada: {tipo}")
+
+        trabajo = ExportJob(
+            actor_id=usuario.id,
+            tipo_exportacion=tipo,
+            formato=formato,
+            filtros_json=json.dumps(filtros or {}),
+            estado="pendiente",
+            progreso=0,
+            expires_at=datetime.utcnow() + timedelta(days=EXPORTACIONES_DIAS_VIGENCIA),
+        )
+        db.add(trabajo)
+        db.commit()
+        db.refresh(trabajo)
+
+        self._obtener_executor().submit(self._ejecutar, trabajo.id)
+        logger.info(f"Exportación {trabajo.id} ({tipo}, {formato}) encolada por el usuario {usuario.id}")
+        return trabajo
+
+    def recuperar_pendientes(self) -> int:
+        """
+        Reenvía al pool los trabajos que quedaron pendientes (por ejemplo tras un
+        reinicio). Si varios workers los reenvían, solo uno logra reclamar cada trabajo.
+
+        Los trabajos "en_proceso" iniciados hace más de EXPORTACIONES_TIMEOUT_MINUTOS
+        quedaron huérfanos cuando el proceso que los generaba se detuvo; vuelven
+        a "pendiente" para reintentarse. El plazo evita robar trabajos que otro
+        worker sigue procesando.
+        """
+        db = SessionLocal()
+        try:
+            limite = datetime.utcnow() - timedelta(minutes=EXPORTACIONES_TIMEOUT_MINUTOS)
+            huerfanos = db.execute(
+                update(ExportJob)
+                .where(
+                    ExportJob.estado == "en_proceso",
+                    or_(ExportJob.timestamp_inicio.is_(None), ExportJob.timestamp_inicio < limite),
+                )
+                .values(estado="pendiente", progreso=0, timestamp_inicio=None)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if huerfanos:
+                logger.warning(f"{huerfanos} exportaciones en proceso abandonadas vuelven a pendiente")
+
+            ids = [
+                fila.id for fila in db.query(ExportJob.id).filter(ExportJob.estado == "pendiente").all()
+            ]
+        finally:
+            db.close()
+
+        for trabajo_id in ids:
+            self._obtener_executor().submit(self._ejecutar, trabajo_id)
+        if ids:
+            logger.info(f"{len(ids)} exportaciones pendientes reenviadas a la cola")
+        return len(ids)
+
+    def _ejecutar(self, trabajo_id: int):
+        db = SessionLocal()
+        try:
+            # Reclamar el trabajo de forma atómica para no procesarlo dos veces
+            reclamado = db.execute(
+                update(ExportJob)
+                .where(ExportJob.id == trabajo_id, ExportJob.estado == "pendiente")
+                .values(estado="en_proceso", progreso=10, timestamp_inicio=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            db.commit()
+            if not reclamado:
+                return
+
+            trabajo = db.get(ExportJob, trabajo_id)
+            usuario = db.get(Usuario, trabajo.actor_id)
+            generador = self._generadores.get(trabajo.tipo_exportacion)
+            if generador is None:
+                raise ValueError(f"Plantilla no encontrada: {trabajo.tipo_exportacion}")
+
+            os.makedirs(EXPORTACIONES_DIRECTORIO, exist_ok=True)
+            # El ID del trabajo evita colisiones entre exportaciones del mismo segundo
+            timestamp = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{trabajo_id}"
+            filtros = json.loads(trabajo.filtros_json or "{}")
+
+            resultado = generador(db, filtros, trabajo.formato, timestamp, EXPORTACIONES_DIRECTORIO, usuario)
+
+            # Los generadores pueden haber dejado la sesión con cambios o en error
+            db.rollback()
+            trabajo = db.get(ExportJob, trabajo_id)
+            if resultado.get("success") and resultado.get("filename"):
+                trabajo.estado = "completado"
+                trabajo.progreso = 100
+                trabajo.archivo_nombre = resultado["filename"]
+                trabajo.registros = resultado.get("registros")
+                trabajo.mensaje = resultado.get("message")
+            else:
+                trabajo.estado = "error"
+                trabajo.error_mensaje = resultado.get("message") or "La exportación no generó ningún archivo"
+            trabajo.timestamp_fin = datetime.utcnow()
+            db.commit()
+            logger.info(f"Exportación {trabajo_id} finalizada con estado {trabajo.estado}")
+
+        except Exception as e:
+            db.rollback()
+            logger.error(f"Error en la exportación {trabajo_id}: {str(e)}")
+            db.execute(
+                update(ExportJob)
+                .where(ExportJob.id == trabajo_id)
+                .values(estado="error", error_mensaje=str(e), timestamp_fin=datetime.utcnow())
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def limpiar_vencidas(self, db: Session) -> int:
+        """Elimina los archivos de exportaciones vencidas y las marca como 'vencido'."""
+        vencidas = db.query(ExportJob).filter(
+            ExportJob.estado == "completado",
+            ExportJob.expires_at < datetime.utcnow(),
+        ).all()
+        for trabajo in vencidas:
+            if trabajo.archivo_nombre:
+                ruta = os.path.join(EXPORTACIONES_DIRECTORIO, trabajo.archivo_nombre)
+                if os.path.exists(ruta):
+                    os.remove(ruta)
+            trabajo.estado = "vencido"
+        if vencidas:
+            db.commit()
+        return len(vencidas)
+
+    @staticmethod
+    def serializar(trabajo: ExportJob) -> Dict:
+        """
+        Estado del trabajo; al completarse incluye las mismas claves que devolvía
+        la exportación síncrona (success, message, filename, registros, formato).
+        """
+        return {
+            "job_id": trabajo.id,
+            "plantilla_id": trabajo.tipo_exportacion,
+            "estado": trabajo.estado,
+            "progreso": trabajo.progreso,
+            "success": trabajo.estado != "error",
+            "message": trabajo.mensaje or trabajo.error_mensaje or f"Exportación {trabajo.estado}",
+            "filename": trabajo.archivo_nombre,
+            "registros": trabajo.registros,
+            "formato": trabajo.formato,
+            "error_mensaje": trabajo.error_mensaje,
+            "timestamp_creado": trabajo.timestamp_creado.isoformat() if trabajo.timestamp_creado else None,
+            "timestamp_fin": trabajo.timestamp_fin.isoformat() if trabajo.timestamp_fin else None,
+            "expires_at": trabajo.expires_at.isoformat() if trabajo.expires_at else None,
+        }
+
+
+cola_exportaciones = ColaExportaciones(max_workers=EXPORTACIONES_MAX_WORKERS)
@@ -0,0 +1,159 @@
+# app/services/exportador_excel.py
+
+import tempfile
+from itertools import chain, islice
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Sequence
+
+from fastapi.responses import StreamingResponse
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+
+TIPO_XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# El archivo se mantiene en memoria hasta este tamaño y luego pasa a disco
+TAMANO_MAXIMO_EN_MEMORIA = 4 * 1024 * 1024
+TAMANO_BLOQUE = 64 * 1024
+
+# Filas leídas por adelantado para estimar el ancho de las columnas sin ancho fijo
+FILAS_MUESTRA_ANCHO = 200
+ANCHO_MAXIMO_COLUMNA = 50
+
+
+class ColumnaExcel(NamedTuple):
+    titulo: str
+    ancho: Optional[float] = None
+
+
+def _crear_estilos():
+    """Estilos de encabezado y de datos, creados una sola vez por libro."""
+    borde = Border(
+        left=Side(style="thin"),
+        right=Side(style="thin"),
+        top=Side(style="thin"),
+        bottom=Side(style="thin"),
+    )
+    encabezado = NamedStyle(
+        name="encabezado_exportacion",
+        font=Font(bold=True, color="FFFFFF", size=11),
+        fill=PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+        alignment=Alignment(horizontal="center", vertical="center"),
+        border=borde,
+    )
+    dato = NamedStyle(name="dato_exportacion", border=borde)
+    return encabezado, dato
+
+
+def _anchos_por_muestra(columnas: Sequence[ColumnaExcel], muestra: Sequence[Sequence[Any]],
+                        ancho_maximo: float) -> List[Optional[float]]:
+    """Ancho de cada columna: el fijo si lo tiene, si no el texto más largo de la muestra."""
+    anchos = []
+    for indice, columna in enumerate(columnas):
+        if columna.ancho:
+            anchos.append(columna.ancho)
+            continue
+        largo = max(
+            [len(columna.titulo)]
+            + [len(str(fila[indice])) for fila in muestra if fila[indice] is not None]
+        )
+        anchos.append(min(largo + 2, ancho_maximo))
+    return anchos
+
+
+def _leer_por_bloques(archivo) -> Iterator[bytes]:
+    try:
+        while True:
+            bloque = archivo.read(TAMANO_BLOQUE)
+            if not bloque:
+                break
+            yield bloque
+    finally:
+        archivo.close()
+
+
+class ExportadorExcel:
+    """
+    Motor de exportación a Excel sobre el modo write-only de openpyxl.
+
+    Las filas se consumen de un iterable y openpyxl las escribe a disco a medida
+    que llegan, así que la hoja nunca está completa en memoria. Los estilos se
+    registran una vez como NamedStyle y cada celda solo referencia su nombre.
+    Las columnas sin ancho fijo se dimensionan con las primeras filas, sin
+    recorrer la hoja al terminar. El archivo final se entrega por bloques con
+    `respuesta()` o se escribe en disco con `guardar_en()`.
+    """
+
+    def __init__(self, con_bordes: bool = True):
+        self.workbook = Workbook(write_only=True)
+        self.con_bordes = con_bordes
+        self.total_filas = 0
+
+        encabezado, dato = _crear_estilos()
+        self.workbook.add_named_style(encabezado)
+        self.workbook.add_named_style(dato)
+        self._estilo_encabezado = encabezado.name
+        self._estilo_dato = dato.name
+
+    def _celdas(self, hoja, valores: Sequence[Any], estilo: str) -> List[WriteOnlyCell]:
+        celdas = []
+        for valor in valores:
+            celda = WriteOnlyCell(hoja, value=valor)
+            celda.style = estilo
+            celdas.append(celda)
+        return celdas
+
+    def agregar_hoja(self, titulo: str, columnas: Sequence[ColumnaExcel], filas: Iterable[Sequence[Any]],
+                     ancho_maximo: float = ANCHO_MAXIMO_COLUMNA) -> int:
+        """
+        Crea una hoja con encabezados y escribe las filas en orden.
+        Devuelve el número de filas de datos escritas.
+        """
+        hoja = self.workbook.create_sheet(title=titulo)
+        filas = iter(filas)
+
+        # Solo se adelanta una muestra acotada si alguna columna no trae ancho
+        muestra = []
+        if any(not columna.ancho for columna in columnas):
+            muestra = list(islice(filas, FILAS_MUESTRA_ANCHO))
+
+        # En modo write-only los anchos deben definirse antes de la primera fila
+        for indice, ancho in enumerate(_anchos_por_muestra(columnas, muestra, ancho_maximo), start=1):
+            hoja.column_dimensions[get_column_letter(indice)].width = ancho
+
+        hoja.append(self._celdas(hoja, [c.titulo for c in columnas], self._estilo_encabezado))
+
+        escritas = 0
+        for fila in chain(muestra, filas):
+            if self.con_bordes:
+                hoja.append(self._celdas(hoja, fila, self._estilo_dato))
+            else:
+                hoja.append(fila)
+            escritas += 1
+
+        self.total_filas += escritas
+        return escritas
+
+    def guardar(self):
+        """Cierra el libro y devuelve el archivo temporal posicionado al inicio."""
+        archivo = tempfile.SpooledTemporaryFile(max_size=TAMANO_MAXIMO_EN_MEMORIA)
+        try:
+            self.workbook.save(archivo)
+        except Exception:
+            archivo.close()
+            raise
+        archivo.seek(0)
+        return archivo
+
+    def guardar_en(self, ruta: str):
+        """Cierra el libro y lo escribe en `ruta`."""
+        self.workbook.save(ruta)
+
+    def respuesta(self, nombre_archivo: str) -> StreamingResponse:
+        """Guarda el libro y lo envía por bloques como descarga."""
+        archivo = self.guardar()
+        return StreamingResponse(
+            _leer_por_bloques(archivo),
+            media_type=TIPO_XLSX,
+            headers={"Content-Disposition": f"attachment; filename={nombre_archivo}"},
+        )
@@ -0,0 +1,180 @@
+# app/services/indice_sedes.py
+
+import heapq
+import math
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..models import SedeEducativa
+from ..config import INDICE_SEDES_TTL_SEGUNDOS
+from .rutas_visitas import RADIO_TIERRA_KM
+
+
+class SedeUbicada(NamedTuple):
+    id: int
+    nombre: str
+    dane: Optional[str]
+    due: Optional[str]
+    lat: float
+    lon: float
+    principal: bool
+    municipio_id: int
+    institucion_id: int
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+class ArbolKD:
+    """
+    Árbol k-d implícito sobre (lat, lon): los puntos se ordenan una vez en un
+    arreglo donde el elemento central de cada tramo es el nodo y sus mitades
+    los subárboles, alternando el eje (latitud en profundidad par).
+    """
+
+    def __init__(self, sedes: List[SedeUbicada]):
+        self.sedes = list(sedes)
+        self._construir(0, len(self.sedes), 0)
+
+    def _construir(self, inicio: int, fin: int, profundidad: int):
+        if fin - inicio <= 1:
+            return
+        eje = 4 if profundidad % 2 == 0 else 5  # índice de lat / lon en SedeUbicada
+        self.sedes[inicio:fin] = sorted(self.sedes[inicio:fin], key=lambda sede: sede[eje])
+        medio = (inicio + fin) // 2
+        self._construir(inicio, medio, profundidad + 1)
+        self._construir(medio + 1, fin, profundidad + 1)
+
+    def en_area(self, lat_min: float, lat_max: float, lon_min: float, lon_max: float) -> List[SedeUbicada]:
+        """Sedes dentro del rectángulo (bordes incluidos)."""
+        resultado = []
+        pila = [(0, len(self.sedes), 0)]
+        while pila:
+            inicio, fin, profundidad = pila.pop()
+            if inicio >= fin:
+                continue
+            medio = (inicio + fin) // 2
+            sede = self.sedes[medio]
+            if lat_min <= sede.lat <= lat_max and lon_min <= sede.lon <= lon_max:
+                resultado.append(sede)
+            if profundidad % 2 == 0:
+                minimo, maximo, valor = lat_min, lat_max, sede.lat
+            else:
+                minimo, maximo, valor = lon_min, lon_max, sede.lon
+            if minimo <= valor:
+                pila.append((inicio, medio, profundidad + 1))
+            if maximo >= valor:
+                pila.append((medio + 1, fin, profundidad + 1))
+        return resultado
+
+    def cercanas(self, lat: float, lon: float, limite: int,
+                 radio_km: Optional[float] = None) -> List[Tuple[float, SedeUbicada]]:
+        """
+        Las `limite` sedes más cercanas por distancia haversine, como
+        (distancia_km, sede) de menor a mayor. Un subárbol se descarta cuando
+        la distancia mínima posible al plano de corte supera la peor de las
+        encontradas: |Δlat| sobre un meridiano, o asin(cos(lat)·sin|Δlon|)
+        hasta el meridiano de corte.
+        """
+        mejores: List[Tuple[float, int, SedeUbicada]] = []  # montículo de máximos con distancias negativas
+        cos_lat = math.cos(math.radians(lat))
+
+        def peor() -> float:
+            if len(mejores) < limite:
+                return radio_km if radio_km is not None else math.inf
+            return -mejores[0][0]
+
+        def buscar(inicio: int, fin: int, profundidad: int):
+            if inicio >= fin:
+                return
+            medio = (inicio + fin) // 2
+            sede = self.sedes[medio]
+            distancia = _haversine_km(lat, lon, sede.lat, sede.lon)
+            if distancia <= peor():
+                heapq.heappush(mejores, (-distancia, -sede.id, sede))
+                if len(mejores) > limite:
+                    heapq.heappop(mejores)
+
+            if profundidad % 2 == 0:
+                diferencia = lat - sede.lat
+                cota = RADIO_TIERRA_KM * abs(math.radians(diferencia))
+            else:
+                diferencia = lon - sede.lon
+                delta = min(abs(math.radians(diferencia)), math.pi / 2)
+                cota = RADIO_TIERRA_KM * math.asin(min(1.0, cos_lat * math.sin(delta)))
+
+            cerca, lejos = ((inicio, medio), (medio + 1, fin)) if diferencia < 0 else ((medio + 1, fin), (inicio, medio))
+            buscar(cerca[0], cerca[1], profundidad + 1)
+            if cota <= peor():
+                buscar(lejos[0], lejos[1], profundidad + 1)
+
+        if limite > 0:
+            buscar(0, len(self.sedes), 0)
+        return [(-distancia, sede) for distancia, _, sede in sorted(mejores, reverse=True)]
+
+
+class IndiceSedes:
+    """
+    Índice espacial en memoria de las sedes educativas con coordenadas.
+
+    Se construye al iniciar la aplicación y se reconstruye en la siguiente
+    consulta después de que las rutas de creación, actualización o
+    eliminación de sedes llamen a `invalidar()`. El TTL acota el tiempo que
+    otros workers pueden servir un índice desactualizado.
+    """
+
+    def __init__(self, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self._arbol: Optional[ArbolKD] = None
+        self._vence = 0.0
+        # Se incrementa en cada invalidación para no guardar árboles leídos antes de ella
+        self._generacion = 0
+        self._lock = threading.Lock()
+
+    def obtener(self, db: Session, recargar: bool = False) -> ArbolKD:
+        with self._lock:
+            if not recargar and self._arbol is not None and self._vence > time.monotonic():
+                return self._arbol
+            generacion = self._generacion
+
+        filas = db.query(
+            SedeEducativa.id,
+            SedeEducativa.nombre_sede,
+            SedeEducativa.dane,
+            SedeEducativa.due,
+            SedeEducativa.lat,
+            SedeEducativa.lon,
+            SedeEducativa.principal,
+            SedeEducativa.municipio_id,
+            SedeEducativa.institucion_id,
+        ).filter(SedeEducativa.lat.isnot(None), SedeEducativa.lon.isnot(None)).all()
+        arbol = ArbolKD([SedeUbicada(*fila) for fila in filas])
+
+        with self._lock:
+            # Si hubo una invalidación durante la carga, este árbol ya no se guarda
+            if self._generacion == generacion:
+                self._arbol = arbol
+                self._vence = time.monotonic() + self.ttl_segundos
+        return arbol
+
+    def invalidar(self):
+        with self._lock:
+            self._arbol = None
+            self._vence = 0.0
+            self._generacion += 1
+
+    def estadisticas(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "sedes": len(self._arbol.sedes) if self._arbol is not None else 0,
+                "ttl_segundos": self.ttl_segundos,
+            }
+
+
+indice_sedes = IndiceSedes(ttl_segundos=INDICE_SEDES_TTL_SEGUNDOS)
@@ -0,0 +1,161 @@
+# app/services/kpis_service.py
+
+import calendar
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from ..config import KPIS_CACHE_TTL_SEGUNDOS
+from .resumenes_diarios import ResumenesDiariosService
+
+PERIODOS_KPI = ("dia", "semana", "mes", "trimestre", "ano")
+
+
+def calcular_rango_periodo(periodo: str, now: Optional[datetime] = None) -> Tuple[datetime, datetime, datetime]:
+    """
+    Devuelve (fecha_inicio, fecha_fin, fecha_comparacion) del período actual.
+    El período anterior va de fecha_comparacion a fecha_inicio (sin incluirla).
+    """
+    now = (now or datetime.now()).replace(microsecond=0)
+
+    if periodo == "dia":
+        fecha_inicio = now.replace(hour=0, minute=0, second=0)
+        fecha_fin = now.replace(hour=23, minute=59, second=59)
+        fecha_comparacion = fecha_inicio - timedelta(days=1)
+    elif periodo == "semana":
+        dias_desde_lunes = now.weekday()
+        fecha_inicio = (now - timedelta(days=dias_desde_lunes)).replace(hour=0, minute=0, second=0)
+        fecha_fin = fecha_inicio + timedelta(days=6, hours=23, minutes=59, seconds=59)
+        fecha_comparacion = fecha_inicio - timedelta(weeks=1)
+    elif periodo == "trimestre":
+        trimestre = (now.month - 1) // 3
+        mes_inicio = trimestre * 3 + 1
+        fecha_inicio = now.replace(month=mes_inicio, day=1, hour=0, minute=0, second=0)
+        fecha_fin = (fecha_inicio + timedelta(days=93)).replace(day=1) - timedelta(days=1)
+        fecha_comparacion = fecha_inicio - timedelta(days=93)
+    elif periodo == "ano":
+        fecha_inicio = now.replace(month=1, day=1, hour=0, minute=0, second=0)
+        fecha_fin = now.replace(month=12, day=31, hour=23, minute=59, second=59)
+        fecha_comparacion = fecha_inicio.replace(year=fecha_inicio.year - 1)
+    else:  # mes por defecto
+        fecha_inicio = now.replace(day=1, hour=0, minute=0, second=0)
+        ultimo_dia = calendar.monthrange(now.year, now.month)[1]
+        fecha_fin = now.replace(day=ultimo_dia, hour=23, minute=59, second=59)
+        if now.month == 1:
+            fecha_comparacion = fecha_inicio.replace(year=fecha_inicio.year - 1, month=12)
+        else:
+            fecha_comparacion = fecha_inicio.replace(month=fecha_inicio.month - 1)
+
+    return fecha_inicio, fecha_fin, fecha_comparacion
+
+
+def calcular_cambio(actual, anterior):
+    """Cambio porcentual respecto al período anterior."""
+    if anterior == 0:
+        return 100 if actual > 0 else 0
+    return ((actual - anterior) / anterior) * 100
+
+
+class MotorKPIs:
+    """
+    Calcula los KPIs del dashboard de administración para un período y el
+    anterior con una consulta de agregación condicional por tabla de
+    resúmenes diarios (ver ResumenesDiariosService.conteos_periodos).
+
+    Los resultados se memorizan por (periodo, inicio del período) durante
+    `ttl_segundos`: los dashboards consultan el endpoint con frecuencia y los
+    valores solo cambian al registrarse visitas.
+    """
+
+    def __init__(self, ttl_segundos: int):
+        self.ttl_segundos = ttl_segundos
+        self._resultados: Dict[Tuple[str, datetime], Tuple[float, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def obtener(self, db: Session, periodo: str, now: Optional[datetime] = None) -> Dict:
+        fecha_inicio, fecha_fin, fecha_comparacion = calcular_rango_periodo(periodo, now)
+        clave = (periodo, fecha_inicio)
+
+        ahora = time.monotonic()
+        with self._lock:
+            guardado = self._resultados.get(clave)
+            if guardado and guardado[0] > ahora:
+                return guardado[1]
+
+        resultado = self._calcular(db, periodo, fecha_inicio, fecha_fin, fecha_comparacion)
+
+        with self._lock:
+            # Descartar entradas vencidas (p. ej. de períodos ya cerrados)
+            self._resultados = {k: v for k, v in self._resultados.items() if v[0] > ahora}
+            self._resultados[clave] = (ahora + self.ttl_segundos, resultado)
+        return resultado
+
+    def invalidar(self):
+        with self._lock:
+            self._resultados.clear()
+
+    def _calcular(self, db: Session, periodo: str, fecha_inicio: datetime,
+                  fecha_fin: datetime, fecha_comparacion: datetime) -> Dict:
+        # Los períodos empiezan a medianoche, así que se pueden contar por días completos
+        conteos = ResumenesDiariosService(db).conteos_periodos(
+            fecha_comparacion.date(), fecha_inicio.date(), fecha_fin.date()
+        )
+
+        visitas_programadas = int(conteos["programadas"])
+        visitas_programadas_anterior = int(conteos["programadas_anterior"])
+        visitas_completadas = int(conteos["completadas"])
+        visitas_completadas_anterior = int(conteos["completadas_anterior"])
+        sedes_activas = conteos["sedes"]
+        sedes_activas_anterior = conteos["sedes_anterior"]
+        visitadores_activos = conteos["visitadores"]
+        visitadores_activos_anterior = conteos["visitadores_anterior"]
+
+        tasa_cumplimiento = (visitas_completadas / visitas_programadas * 100) if visitas_programadas > 0 else 0
+        tasa_cumplimiento_anterior = (visitas_completadas_anterior / visitas_programadas_anterior * 100) if visitas_programadas_anterior > 0 else 0
+
+        promedio_visitas = visitas_programadas / visitadores_activos if visitadores_activos > 0 else 0
+        promedio_visitas_anterior = visitas_programadas_anterior / visitadores_activos_anterior if visitadores_activos_anterior > 0 else 0
+
+        return {
+            "periodo": periodo,
+            "fecha_inicio": fecha_inicio.isoformat(),
+            "fecha_fin": fecha_fin.isoformat(),
+            "kpis": {
+                "visitas_programadas": {
+                    "valor": visitas_programadas,
+                    "anterior": visitas_programadas_anterior,
+                    "cambio": calcular_cambio(visitas_programadas, visitas_programadas_anterior),
+                },
+                "visitas_completadas": {
+                    "valor": visitas_completadas,
+                    "anterior": visitas_completadas_anterior,
+                    "cambio": calcular_cambio(visitas_completadas, visitas_completadas_anterior),
+                },
+                "tasa_cumplimiento": {
+                    "valor": round(tasa_cumplimiento, 1),
+                    "anterior": round(tasa_cumplimiento_anterior, 1),
+                    "cambio": tasa_cumplimiento - tasa_cumplimiento_anterior,
+                },
+                "sedes_activas": {
+                    "valor": sedes_activas,
+                    "anterior": sedes_activas_anterior,
+                    "cambio": calcular_cambio(sedes_activas, sedes_activas_anterior),
+                },
+                "visitadores_activos": {
+                    "valor": visitadores_activos,
+                    "anterior": visitadores_activos_anterior,
+                    "cambio": calcular_cambio(visitadores_activos, visitadores_activos_anterior),
+                },
+                "promedio_visitas_visitador": {
+                    "valor": round(promedio_visitas, 1),
+                    "anterior": round(promedio_visitas_anterior, 1),
+                    "cambio": promedio_visitas - promedio_visitas_anterior,
+                },
+            },
+        }
+
+
+motor_kpis = MotorKPIs(ttl_segundos=KPIS_CACHE_TTL_SEGUNDOS)
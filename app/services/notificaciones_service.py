@@ -15,6 +15,7 @@ from ..config import (
     NOTIFICACIONES_MAX_RETRY, NOTIFICACIONES_TIMEOUT,
     RECORDATORIOS_VISITA_PROXIMA_HORAS, RECORDATORIOS_VISITA_VENCIDA_DIAS
 )
+from .cambios_sincronizacion import CambiosSincronizacionService
 
 logger = logging.getLogger(__name__)
 
@@ -422,7 +423,10 @@ class NotificacionesService:
                 Notificacion.fecha_envio < fecha_limite
             ).count()
             
-            # Eliminar notificaciones antiguas
+            # Eliminar notificaciones antiguas (la baja se registra para la sincronización)
+            CambiosSincronizacionService(self.db).registrar_filtro(
+                Notificacion, Notificacion.fecha_envio < fecha_limite
+            )
             self.db.query(Notificacion).filter(
                 Notificacion.fecha_envio < fecha_limite
             ).delete()
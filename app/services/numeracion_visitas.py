@@ -0,0 +1,129 @@
+# app/services/numeracion_visitas.py
+
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..models import ContadorVisitasUsuario, VisitaCompletaPAE
+
+logger = logging.getLogger(__name__)
+
+
+class NumeracionVisitasService:
+    """
+    Asigna `numero_visita_usuario` a partir de un contador por profesional
+    (tabla contadores_visitas_usuario) en lugar de contar todo su historial.
+
+    El incremento es un único UPDATE ... RETURNING, que bloquea la fila del
+    contador hasta el commit: dos envíos concurrentes del mismo profesional
+    nunca reciben el mismo número. Si la transacción se revierte, el número
+    reservado también se revierte. Ningún método hace commit.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def siguiente_numero(self, usuario_id: int) -> int:
+        """Reserva y devuelve el siguiente número de visita del profesional."""
+        return self.reservar(usuario_id, 1)
+
+    def reservar(self, usuario_id: int, cantidad: int = 1) -> int:
+        """
+        Reserva `cantidad` números consecutivos y devuelve el primero.
+        """
+        ultimo = self.db.execute(
+            update(ContadorVisitasUsuario)
+            .where(ContadorVisitasUsuario.usuario_id == usuario_id)
+            .values(
+                ultimo_numero=ContadorVisitasUsuario.ultimo_numero + cantidad,
+                fecha_actualizacion=datetime.utcnow(),
+            )
+            .returning(ContadorVisitasUsuario.ultimo_numero)
+            .execution_options(synchronize_session=False)
+        ).scalar()
+
+        if ultimo is None:
+            # Primer número del profesional desde que existe el contador
+            ultimo = self._crear_contador(usuario_id, cantidad)
+
+        return ultimo - cantidad + 1
+
+    def _numero_actual_historico(self, usuario_id: int) -> int:
+        """Mayor número ya usado por el profesional (o su total de visitas si es mayor)."""
+        maximo, total = self.db.query(
+            func.max(VisitaCompletaPAE.numero_visita_usuario),
+            func.count(VisitaCompletaPAE.id),
+        ).filter(VisitaCompletaPAE.profesional_id == usuario_id).one()
+        return max(maximo or 0, total or 0)
+
+    def _crear_contador(self, usuario_id: int, cantidad: int) -> int:
+        """
+        Crea el contador partiendo del historial existente. Si otro worker lo
+        creó primero, el conflicto se resuelve incrementando su fila.
+        """
+        inicial = self._numero_actual_historico(usuario_id) + cantidad
+        dialecto = self.db.get_bind().dialect.name
+
+        if dialecto in ("postgresql", "sqlite"):
+            modulo = postgresql if dialecto == "postgresql" else sqlite
+            sentencia = modulo.insert(ContadorVisitasUsuario).values(
+                usuario_id=usuario_id,
+                ultimo_numero=inicial,
+                fecha_actualizacion=datetime.utcnow(),
+            )
+            sentencia = sentencia.on_conflict_do_update(
+                index_elements=[ContadorVisitasUsuario.usuario_id],
+                set_={
+                    "ultimo_numero": ContadorVisitasUsuario.ultimo_numero + cantidad,
+                    "fecha_actualizacion": datetime.utcnow(),
+                },
+            ).returning(ContadorVisitasUsuario.ultimo_numero)
+            return self.db.execute(sentencia).scalar()
+
+        # Otros motores: insertar dentro de un savepoint y reintentar el UPDATE si ya existía
+        try:
+            with self.db.begin_nested():
+                self.db.add(ContadorVisitasUsuario(usuario_id=usuario_id, ultimo_numero=inicial))
+            return inicial
+        except Exception:
+            contador = self.db.query(ContadorVisitasUsuario).filter(
+                ContadorVisitasUsuario.usuario_id == usuario_id
+            ).with_for_update().one()
+            contador.ultimo_numero += cantidad
+            self.db.flush()
+            return contador.ultimo_numero
+
+    def sincronizar_contadores(self, usuario_id: Optional[int] = None) -> Dict[int, int]:
+        """
+        Ajusta los contadores al mayor número ya usado por cada profesional.
+        Nunca los hace retroceder. Devuelve {usuario_id: ultimo_numero}.
+        """
+        consulta = self.db.query(
+            VisitaCompletaPAE.profesional_id,
+            func.max(VisitaCompletaPAE.numero_visita_usuario),
+            func.count(VisitaCompletaPAE.id),
+        ).group_by(VisitaCompletaPAE.profesional_id)
+        if usuario_id is not None:
+            consulta = consulta.filter(VisitaCompletaPAE.profesional_id == usuario_id)
+
+        contadores = {
+            c.usuario_id: c for c in self.db.query(ContadorVisitasUsuario).all()
+        }
+        resultado = {}
+        for profesional_id, maximo, total in consulta.all():
+            ultimo = max(maximo or 0, total or 0)
+            contador = contadores.get(profesional_id)
+            if contador is None:
+                contador = ContadorVisitasUsuario(usuario_id=profesional_id, ultimo_numero=ultimo)
+                self.db.add(contador)
+            elif contador.ultimo_numero < ultimo:
+                contador.ultimo_numero = ultimo
+            resultado[profesional_id] = contador.ultimo_numero
+
+        self.db.flush()
+        logger.info(f"Contadores de visitas sincronizados para {len(resultado)} profesionales")
+        return resultado
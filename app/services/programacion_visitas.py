@@ -0,0 +1,242 @@
+# app/services/programacion_visitas.py
+
+import heapq
+import logging
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.orm import Session
+
+from ..models import ResumenDiarioVisitasAsignadas, SedeEducativa, Usuario, VisitaAsignada
+from ..config import CAPACIDAD_DIARIA_VISITADOR
+from .calendario_visitas import cache_calendario
+from .resumenes_diarios import ResumenesDiariosService
+from .cambios_sincronizacion import CambiosSincronizacionService
+
+logger = logging.getLogger(__name__)
+
+# (sede_id, visitador_id, día)
+ClaveAsignacion = Tuple[int, int, date]
+
+
+class AsignacionPlanificada(NamedTuple):
+    sede: SedeEducativa
+    visitador: Usuario
+    dia: date
+
+
+class ProgramacionVisitasService:
+    """
+    Motor de la programación masiva de visitas asignadas: calcula la carga
+    de los visitadores, reparte las sedes según el cupo diario y las inserta
+    en lote. La disponibilidad que se muestra antes de programar sale de los
+    mismos cálculos. Ningún método hace commit.
+    """
+
+    def __init__(self, db: Session, capacidad_diaria: int = CAPACIDAD_DIARIA_VISITADOR):
+        self.db = db
+        self.capacidad_diaria = capacidad_diaria
+
+    def cargas_por_dia(self, visitadores_ids: Iterable[int], desde: date,
+                       hasta: date) -> Dict[Tuple[int, date], int]:
+        """
+        {(visitador_id, día): visitas} asignadas y no canceladas entre `desde`
+        y `hasta`, leídas de los resúmenes diarios.
+        """
+        A = ResumenDiarioVisitasAsignadas
+        filas = self.db.execute(
+            select(A.visitador_id, A.fecha, func.sum(A.total))
+            .where(
+                A.visitador_id.in_(list(visitadores_ids)),
+                A.fecha >= desde,
+                A.fecha <= hasta,
+                A.estado != "cancelada",
+            )
+            .group_by(A.visitador_id, A.fecha)
+        )
+        return {(visitador_id, fecha): int(total) for visitador_id, fecha, total in filas if total}
+
+    def disponibilidad(self, visitadores: Sequence[Usuario], desde: date, hasta: date) -> List[Dict]:
+        """
+        Carga actual y cupo libre de cada visitador en el rango, con la misma
+        capacidad diaria que usa `planificar`.
+        """
+        dias_periodo = (hasta - desde).days + 1
+        capacidad_maxima = dias_periodo * self.capacidad_diaria
+        cargas = self.cargas_por_dia([visitador.id for visitador in visitadores], desde, hasta)
+
+        programadas: Dict[int, int] = {}
+        libres: Dict[int, int] = {}
+        for (visitador_id, _), total in cargas.items():
+            programadas[visitador_id] = programadas.get(visitador_id, 0) + total
+            # Los días por encima de la capacidad no restan cupo a los demás
+            libres[visitador_id] = libres.get(visitador_id, 0) + max(0, self.capacidad_diaria - total) - self.capacidad_diaria
+
+        resultado = []
+        for visitador in visitadores:
+            cupo_libre = capacidad_maxima + libres.get(visitador.id, 0)
+            porcentaje = (cupo_libre / capacidad_maxima * 100) if capacidad_maxima > 0 else 0
+            resultado.append({
+                "visitador_id": visitador.id,
+                "nombre": visitador.nombre,
+                "visitas_programadas": programadas.get(visitador.id, 0),
+                "capacidad_maxima": capacidad_maxima,
+                "cupo_libre": cupo_libre,
+                "disponibilidad_porcentaje": round(porcentaje, 1),
+                "estado": "disponible" if porcentaje >= 50 else "ocupado" if cupo_libre > 0 else "sin_cupo",
+            })
+        return resultado
+
+    def planificar(self, sedes: Sequence[SedeEducativa], visitadores: Sequence[Usuario], desde: date,
+                   hasta: date) -> Tuple[List[AsignacionPlanificada], List[Tuple[SedeEducativa, str]]]:
+        """
+        Reparte las sedes entre visitadores y días del rango.
+
+        Parte de la carga actual de cada visitador (una consulta a los
+        resúmenes) y de las asignaciones existentes (una consulta por rango).
+        Las sedes de un mismo municipio se agrupan en bloques del tamaño del
+        cupo diario para que el mismo visitador las atienda el mismo día; cada
+        bloque va al visitador con menos carga total y, dentro de él, al día
+        con más cupo libre (a igualdad, al día con menos visitas nuevas). Devuelve (asignaciones, rechazos), donde cada
+        rechazo es (sede, motivo): "sin_cupo" o "conflicto" (ya tenía visita
+        en todos los espacios con cupo).
+        """
+        dias = [desde + timedelta(days=n) for n in range((hasta - desde).days + 1)]
+        visitadores_por_id = {visitador.id: visitador for visitador in visitadores}
+        cargas = self.cargas_por_dia(visitadores_por_id, desde, hasta)
+        ocupadas = self.asignaciones_existentes(
+            [sede.id for sede in sedes], visitadores_por_id, desde, hasta
+        )
+
+        libre = {
+            visitador_id: [max(0, self.capacidad_diaria - cargas.get((visitador_id, dia), 0)) for dia in dias]
+            for visitador_id in visitadores_por_id
+        }
+        carga_total = {
+            visitador_id: sum(cargas.get((visitador_id, dia), 0) for dia in dias)
+            for visitador_id in visitadores_por_id
+        }
+        # Visitas nuevas por día entre todos los visitadores, para repartir el rango
+        nuevas_por_dia = [0] * len(dias)
+        # Montículo (carga, id) de visitadores con cupo; las entradas viejas se descartan al sacarlas
+        monticulo = [(carga_total[v], v) for v in visitadores_por_id if any(libre[v])]
+        heapq.heapify(monticulo)
+
+        def siguiente_espacio(excluidos: Set[Tuple[int, int]] = frozenset()) -> Optional[Tuple[int, int]]:
+            """
+            (visitador_id, índice de día) del visitador menos cargado: el día con
+            más cupo y, a igual cupo, el que menos visitas nuevas lleva.
+            """
+            descartados = []
+            encontrado = None
+            while monticulo:
+                carga, visitador_id = monticulo[0]
+                if carga != carga_total[visitador_id] or not any(libre[visitador_id]):
+                    heapq.heappop(monticulo)
+                    continue
+                candidatos = [
+                    (cupo, -nuevas_por_dia[indice], -indice) for indice, cupo in enumerate(libre[visitador_id])
+                    if cupo and (visitador_id, indice) not in excluidos
+                ]
+                if candidatos:
+                    encontrado = (visitador_id, -max(candidatos)[2])
+                    break
+                descartados.append(heapq.heappop(monticulo))
+            for entrada in descartados:
+                heapq.heappush(monticulo, entrada)
+            return encontrado
+
+        def asignar(visitador_id: int, indice: int):
+            libre[visitador_id][indice] -= 1
+            carga_total[visitador_id] += 1
+            nuevas_por_dia[indice] += 1
+            heapq.heappush(monticulo, (carga_total[visitador_id], visitador_id))
+
+        # Municipios con más sedes primero; el orden de entrada se conserva dentro de cada uno
+        por_municipio: Dict[int, List[SedeEducativa]] = {}
+        for sede in sedes:
+            por_municipio.setdefault(sede.municipio_id, []).append(sede)
+        grupos = sorted(por_municipio.values(), key=len, reverse=True)
+
+        asignaciones: List[AsignacionPlanificada] = []
+        rechazos: List[Tuple[SedeEducativa, str]] = []
+        conflictos: List[SedeEducativa] = []
+        for grupo in grupos:
+            pendientes = deque(grupo)
+            while pendientes:
+                espacio = siguiente_espacio()
+                if espacio is None:
+                    rechazos.extend((sede, "sin_cupo") for sede in pendientes)
+                    break
+                visitador_id, indice = espacio
+                # El bloque llena el cupo de ese día con sedes del mismo municipio
+                while pendientes and libre[visitador_id][indice]:
+                    sede = pendientes.popleft()
+                    clave = (sede.id, visitador_id, dias[indice])
+                    if clave in ocupadas:
+                        conflictos.append(sede)
+                        continue
+                    ocupadas.add(clave)
+                    asignar(visitador_id, indice)
+                    asignaciones.append(AsignacionPlanificada(sede, visitadores_por_id[visitador_id], dias[indice]))
+
+        # Sedes que ya tenían visita con el visitador/día elegido: buscar otro espacio
+        for sede in conflictos:
+            excluidos = {
+                (visitador_id, indice)
+                for visitador_id in visitadores_por_id
+                for indice, dia in enumerate(dias)
+                if (sede.id, visitador_id, dia) in ocupadas
+            }
+            espacio = siguiente_espacio(excluidos)
+            if espacio is None:
+                rechazos.append((sede, "conflicto"))
+                continue
+            visitador_id, indice = espacio
+            ocupadas.add((sede.id, visitador_id, dias[indice]))
+            asignar(visitador_id, indice)
+            asignaciones.append(AsignacionPlanificada(sede, visitadores_por_id[visitador_id], dias[indice]))
+
+        return asignaciones, rechazos
+
+    def asignaciones_existentes(self, sedes_ids: Iterable[int], visitadores_ids: Iterable[int],
+                                desde: date, hasta: date) -> Set[ClaveAsignacion]:
+        """
+        Claves (sede, visitador, día) ya asignadas entre `desde` y `hasta`
+        (inclusive). El filtro es un rango sobre fecha_programada, sin DATE(),
+        para que pueda usar índices.
+        """
+        filas = self.db.execute(
+            select(VisitaAsignada.sede_id, VisitaAsignada.visitador_id, VisitaAsignada.fecha_programada)
+            .where(
+                VisitaAsignada.sede_id.in_(list(sedes_ids)),
+                VisitaAsignada.visitador_id.in_(list(visitadores_ids)),
+                VisitaAsignada.fecha_programada >= datetime.combine(desde, datetime.min.time()),
+                VisitaAsignada.fecha_programada < datetime.combine(hasta + timedelta(days=1), datetime.min.time()),
+            )
+        )
+        return {(sede_id, visitador_id, fecha.date()) for sede_id, visitador_id, fecha in filas}
+
+    def insertar_asignaciones(self, filas: List[Dict]) -> int:
+        """
+        Inserta las visitas asignadas en una sola sentencia. Como no pasan por
+        el ORM, se recalculan los resúmenes diarios de los días afectados, se
+        marcan esos días para invalidar la caché del calendario al confirmar y
+        se registran las altas para la sincronización incremental.
+        """
+        if not filas:
+            return 0
+
+        insertadas = self.db.execute(
+            insert(VisitaAsignada).returning(VisitaAsignada.id, VisitaAsignada.visitador_id), filas
+        ).all()
+
+        dias = {fila["fecha_programada"].date() for fila in filas}
+        ResumenesDiariosService(self.db).recalcular_dias(VisitaAsignada, dias)
+        cache_calendario.marcar_dias(self.db, dias)
+        CambiosSincronizacionService(self.db).registrar(VisitaAsignada, insertadas)
+
+        logger.info(f"{len(filas)} visitas asignadas insertadas en lote ({len(dias)} días)")
+        return len(filas)
@@ -0,0 +1,171 @@
+# app/services/render_pdf.py
+
+import io
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import List, Optional, Sequence
+
+from ..config import PDF_MAX_PROCESOS, PDF_FILAS_POR_FRAGMENTO
+
+try:
+    from pypdf import PdfWriter
+    PYPDF_DISPONIBLE = True
+except ImportError:
+    PYPDF_DISPONIBLE = False
+
+logger = logging.getLogger(__name__)
+
+# Relleno horizontal por defecto de una celda de reportlab (6 pt a cada lado)
+RELLENO_CELDA = 12
+
+_executor: Optional[ProcessPoolExecutor] = None
+_lock = threading.Lock()
+
+
+def _obtener_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: el proceso padre tiene hilos (uvicorn, cola de exportaciones)
+            # y un fork podría heredar locks tomados
+            _executor = ProcessPoolExecutor(
+                max_workers=PDF_MAX_PROCESOS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _executor
+
+
+def _calcular_anchos(columnas: Sequence[str], filas: Sequence[Sequence[str]],
+                     tamano_encabezado: int, tamano_datos: int) -> List[float]:
+    """
+    Ancho fijo por columna a partir del texto más largo, para que todos los
+    fragmentos compartan la misma tabla y reportlab no tenga que medirla.
+    """
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    anchos = []
+    for indice, titulo in enumerate(columnas):
+        mas_largo = max((fila[indice] for fila in filas), key=len, default="")
+        anchos.append(max(
+            stringWidth(titulo, "Helvetica-Bold", tamano_encabezado),
+            stringWidth(mas_largo, "Helvetica", tamano_datos),
+        ) + RELLENO_CELDA)
+    return anchos
+
+
+def _renderizar_fragmento(titulo: Optional[str], lineas_info: Sequence[str], columnas: Sequence[str],
+                          filas: Sequence[Sequence[str]], anchos: Sequence[float], horizontal: bool,
+                          tamano_encabezado: int, tamano_datos: int) -> bytes:
+    """
+    Genera un PDF con una porción de las filas. Se ejecuta en los procesos del
+    pool, por eso recibe solo datos simples y devuelve los bytes del archivo.
+    """
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(A4) if horizontal else A4)
+    story = []
+
+    if titulo:
+        styles = getSampleStyleSheet()
+        title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            spaceAfter=30,
+            alignment=1  # Centrado
+        )
+        story.append(Paragraph(titulo, title_style))
+        story.append(Spacer(1, 12))
+        if lineas_info:
+            story.append(Paragraph("<br/>".join(lineas_info), styles['Normal']))
+            story.append(Spacer(1, 20))
+
+    # repeatRows repite el encabezado en cada página de la tabla
+    table = Table([list(columnas)] + [list(fila) for fila in filas], colWidths=list(anchos), repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), tamano_encabezado),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), tamano_datos),
+    ]))
+    story.append(table)
+
+    doc.build(story)
+    return buffer.getvalue()
+
+
+def renderizar_tabla_pdf(
+    ruta: str,
+    titulo: str,
+    columnas: Sequence[str],
+    filas: Sequence[Sequence[str]],
+    lineas_info: Sequence[str] = (),
+    horizontal: bool = False,
+    tamano_encabezado: int = 10,
+    tamano_datos: int = 8,
+) -> int:
+    """
+    Escribe en `ruta` un reporte PDF con título y una tabla con todas las filas.
+
+    Las filas se dividen en fragmentos de PDF_FILAS_POR_FRAGMENTO que se
+    renderizan en paralelo en un pool de procesos y luego se concatenan con
+    pypdf (con PDF_MAX_PROCESOS <= 1 los fragmentos se generan en serie). Sin
+    pypdf el reporte se genera como un único documento. Devuelve el número de
+    fragmentos generados.
+    """
+    filas = [[str(valor) for valor in fila] for fila in filas]
+    anchos = _calcular_anchos(columnas, filas, tamano_encabezado, tamano_datos)
+    lineas_info = list(lineas_info) or [
+        f"Fecha: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        f"Total registros: {len(filas)}",
+    ]
+
+    fragmentos = [
+        filas[inicio:inicio + PDF_FILAS_POR_FRAGMENTO]
+        for inicio in range(0, len(filas), PDF_FILAS_POR_FRAGMENTO)
+    ] or [[]]
+
+    argumentos = [
+        (titulo if indice == 0 else None, lineas_info, columnas, fragmento,
+         anchos, horizontal, tamano_encabezado, tamano_datos)
+        for indice, fragmento in enumerate(fragmentos)
+    ]
+
+    if len(fragmentos) == 1 or not PYPDF_DISPONIBLE:
+        if len(fragmentos) > 1:
+            logger.info("pypdf no disponible; el PDF se genera como un solo documento")
+        contenido = _renderizar_fragmento(
+            titulo, lineas_info, columnas, filas, anchos, horizontal, tamano_encabezado, tamano_datos
+        )
+        with open(ruta, "wb") as archivo:
+            archivo.write(contenido)
+        return 1
+
+    if PDF_MAX_PROCESOS > 1:
+        executor = _obtener_executor()
+        contenidos = executor.map(_renderizar_fragmento, *zip(*argumentos))
+    else:
+        # Aun sin pool, varias tablas cortas se maquetan más rápido que una sola larga
+        contenidos = (_renderizar_fragmento(*args) for args in argumentos)
+
+    writer = PdfWriter()
+    for contenido in contenidos:
+        writer.append(io.BytesIO(contenido))
+    with open(ruta, "wb") as archivo:
+        writer.write(archivo)
+    writer.close()
+
+    logger.info(f"PDF {ruta} generado en {len(fragmentos)} fragmentos ({len(filas)} filas)")
+    return len(fragmentos)
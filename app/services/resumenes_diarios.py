@@ -0,0 +1,450 @@
+# app/services/resumenes_diarios.py
+
+import logging
+from collections import Counter
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import and_, case, delete, distinct, event, func, insert, select, update
+from sqlalchemy import inspect as inspeccionar
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from ..models import (
+    Institucion,
+    Municipio,
+    ResumenDiarioVisitasAsignadas,
+    ResumenDiarioVisitasCompletas,
+    SedeEducativa,
+    Usuario,
+    VisitaAsignada,
+    VisitaCompletaPAE,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class DefinicionResumen(NamedTuple):
+    resumen: type
+    campo_fecha: str
+    # Columnas de la clave, con el mismo nombre en la visita y en el resumen
+    campos_clave: Tuple[str, ...]
+    estado_por_defecto: str
+
+
+RESUMENES = {
+    VisitaAsignada: DefinicionResumen(
+        ResumenDiarioVisitasAsignadas, "fecha_programada",
+        ("municipio_id", "sede_id", "visitador_id", "estado"), "pendiente",
+    ),
+    VisitaCompletaPAE: DefinicionResumen(
+        ResumenDiarioVisitasCompletas, "fecha_visita",
+        ("municipio_id", "sede_id", "profesional_id", "estado"), "completada",
+    ),
+}
+RESUMENES_POR_TABLA = {definicion.resumen: definicion for definicion in RESUMENES.values()}
+
+
+def _conservar_valor_anterior(objeto, valor, anterior, iniciador):
+    return valor
+
+
+# Con active_history el ORM carga el valor anterior al asignar un campo de la
+# clave aunque el objeto esté expirado (p. ej. tras un commit), así el flush
+# sabe de qué fila del resumen restar
+for _modelo, _definicion in RESUMENES.items():
+    for _campo in (_definicion.campo_fecha,) + _definicion.campos_clave:
+        event.listen(getattr(_modelo, _campo), "set", _conservar_valor_anterior, active_history=True, retval=True)
+
+
+def _a_fecha(valor) -> Optional[date]:
+    if valor is None:
+        return None
+    if isinstance(valor, str):
+        valor = datetime.fromisoformat(valor)
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _clave(definicion: DefinicionResumen, valores: Dict) -> Optional[Tuple]:
+    """(fecha, municipio, sede, visitador/profesional, estado) o None si falta algún dato."""
+    fecha = _a_fecha(valores.get(definicion.campo_fecha))
+    clave = [fecha]
+    for campo in definicion.campos_clave:
+        valor = valores.get(campo)
+        if campo == "estado":
+            valor = valor or definicion.estado_por_defecto
+        clave.append(valor)
+    if any(parte is None for parte in clave):
+        return None
+    return tuple(clave)
+
+
+def _valores(objeto, definicion: DefinicionResumen, anteriores: bool) -> Dict:
+    """Valores actuales del objeto o, con `anteriores`, los que tenía antes del flush."""
+    estado = inspeccionar(objeto)
+    valores = {}
+    for campo in (definicion.campo_fecha,) + definicion.campos_clave:
+        if anteriores:
+            historial = estado.attrs[campo].history
+            if historial.deleted:
+                valores[campo] = historial.deleted[0]
+            elif historial.unchanged:
+                valores[campo] = historial.unchanged[0]
+            else:
+                valores[campo] = getattr(objeto, campo)
+        else:
+            valores[campo] = getattr(objeto, campo)
+    return valores
+
+
+@event.listens_for(Session, "after_flush")
+def _actualizar_resumenes(session: Session, flush_context):
+    """
+    Aplica a los resúmenes diarios las altas, cambios y bajas de visitas del
+    flush, en la misma transacción. Las actualizaciones masivas (UPDATE sin
+    pasar por el ORM) no llegan aquí y deben llamar a `recalcular_dias`.
+    """
+    deltas: Counter = Counter()
+
+    for objeto in session.new:
+        definicion = RESUMENES.get(type(objeto))
+        if definicion:
+            clave = _clave(definicion, _valores(objeto, definicion, anteriores=False))
+            if clave:
+                deltas[(definicion.resumen, clave)] += 1
+
+    for objeto in session.deleted:
+        definicion = RESUMENES.get(type(objeto))
+        if definicion:
+            clave = _clave(definicion, _valores(objeto, definicion, anteriores=True))
+            if clave:
+                deltas[(definicion.resumen, clave)] -= 1
+
+    for objeto in session.dirty:
+        definicion = RESUMENES.get(type(objeto))
+        if not definicion or not session.is_modified(objeto, include_collections=False):
+            continue
+        anterior = _clave(definicion, _valores(objeto, definicion, anteriores=True))
+        actual = _clave(definicion, _valores(objeto, definicion, anteriores=False))
+        if anterior != actual:
+            if anterior:
+                deltas[(definicion.resumen, anterior)] -= 1
+            if actual:
+                deltas[(definicion.resumen, actual)] += 1
+
+    cambios = [(resumen, clave, delta) for (resumen, clave), delta in deltas.items() if delta]
+    if not cambios:
+        return
+
+    conexion = session.connection()
+    # Orden estable para que transacciones concurrentes bloqueen filas en el mismo orden
+    for resumen, clave, delta in sorted(cambios, key=lambda c: (c[0].__tablename__, str(c[1]))):
+        _sumar(conexion, resumen, clave, delta)
+
+
+def _sumar(conexion, resumen, clave: Tuple, delta: int):
+    """Suma `delta` al total de la fila del resumen, creándola si no existe."""
+    columnas = ["fecha"] + list(RESUMENES_POR_TABLA[resumen].campos_clave)
+    valores = dict(zip(columnas, clave))
+    dialecto = conexion.dialect.name
+
+    if dialecto in ("postgresql", "sqlite"):
+        modulo = postgresql if dialecto == "postgresql" else sqlite
+        sentencia = modulo.insert(resumen).values(**valores, total=delta)
+        sentencia = sentencia.on_conflict_do_update(
+            index_elements=[getattr(resumen, c) for c in columnas],
+            set_={"total": resumen.total + sentencia.excluded.total},
+        )
+        conexion.execute(sentencia)
+        return
+
+    actualizadas = conexion.execute(
+        update(resumen)
+        .where(*[getattr(resumen, c) == v for c, v in valores.items()])
+        .values(total=resumen.total + delta)
+    ).rowcount
+    if not actualizadas:
+        conexion.execute(insert(resumen).values(**valores, total=delta))
+
+
+class ResumenesDiariosService:
+    """
+    Lectura y mantenimiento de los resúmenes diarios de visitas.
+
+    Los conteos del dashboard y de la analítica de administración se leen de
+    estas tablas (una fila por día y combinación de municipio, sede, visitador
+    y estado) en lugar de recorrer visitas_asignadas y visitas_completas_pae.
+    Ningún método hace commit.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    # --- Mantenimiento ---
+
+    def reconstruir(self, desde: Optional[date] = None, hasta: Optional[date] = None) -> Dict[str, int]:
+        """
+        Recalcula los resúmenes desde las tablas de visitas, para todo el
+        historial o para el rango de días [desde, hasta]. Devuelve las filas
+        de resumen generadas por tabla.
+        """
+        resultado = {}
+        for modelo, definicion in RESUMENES.items():
+            resultado[definicion.resumen.__tablename__] = self._reconstruir_tabla(modelo, definicion, desde, hasta)
+        return resultado
+
+    def recalcular_dias(self, modelo, dias: Iterable[date]) -> int:
+        """
+        Recalcula los días indicados de un resumen. Se usa tras un UPDATE
+        masivo que no pasa por el ORM (y por tanto no dispara el listener).
+        """
+        dias = sorted({_a_fecha(dia) for dia in dias if dia is not None})
+        if not dias:
+            return 0
+        definicion = RESUMENES[modelo]
+        return self._reconstruir_tabla(modelo, definicion, dias[0], dias[-1], dias)
+
+    def dias_afectados(self, modelo, *filtros) -> List[date]:
+        """Días (según la fecha del resumen) de las visitas que cumplen los filtros."""
+        campo_fecha = getattr(modelo, RESUMENES[modelo].campo_fecha)
+        filas = self.db.execute(select(func.date(campo_fecha)).where(*filtros).distinct()).scalars().all()
+        return [_a_fecha(dia) for dia in filas]
+
+    def _reconstruir_tabla(self, modelo, definicion: DefinicionResumen, desde: Optional[date],
+                           hasta: Optional[date], dias: Optional[List[date]] = None) -> int:
+        resumen = definicion.resumen
+        campo_fecha = getattr(modelo, definicion.campo_fecha)
+        dia = func.date(campo_fecha)
+
+        filtros_resumen, filtros_visitas = [], []
+        if desde:
+            filtros_resumen.append(resumen.fecha >= desde)
+            filtros_visitas.append(campo_fecha >= datetime.combine(desde, datetime.min.time()))
+        if hasta:
+            filtros_resumen.append(resumen.fecha <= hasta)
+            filtros_visitas.append(campo_fecha < datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+        if dias is not None:
+            filtros_resumen.append(resumen.fecha.in_(dias))
+            filtros_visitas.append(dia.in_(dias))
+
+        self.db.execute(delete(resumen).where(*filtros_resumen).execution_options(synchronize_session=False))
+
+        estado = func.coalesce(modelo.estado, definicion.estado_por_defecto)
+        columnas_clave = [getattr(modelo, campo) for campo in definicion.campos_clave if campo != "estado"]
+        consulta = (
+            select(dia, *columnas_clave, estado, func.count(modelo.id))
+            .where(campo_fecha.isnot(None), *filtros_visitas)
+            .group_by(dia, *columnas_clave, estado)
+        )
+        destino = ["fecha"] + [campo for campo in definicion.campos_clave if campo != "estado"] + ["estado", "total"]
+        return self.db.execute(insert(resumen).from_select(destino, consulta)).rowcount or 0
+
+    def esta_vacio(self) -> bool:
+        """True si los resúmenes no tienen filas pero sí hay visitas registradas."""
+        hay_resumen = self.db.query(ResumenDiarioVisitasAsignadas.id).first() or \
+            self.db.query(ResumenDiarioVisitasCompletas.id).first()
+        hay_visitas = self.db.query(VisitaAsignada.id).first() or self.db.query(VisitaCompletaPAE.id).first()
+        return bool(hay_visitas) and not hay_resumen
+
+    # --- Consultas ---
+
+    def totales_dashboard(self, hoy: date, inicio_semana: date, fin_semana: date):
+        """Visitas asignadas de hoy, de la semana, en total y completadas."""
+        R = ResumenDiarioVisitasAsignadas
+        return self.db.query(
+            func.coalesce(func.sum(case((R.fecha == hoy, R.total), else_=0)), 0).label("hoy"),
+            func.coalesce(func.sum(case((and_(R.fecha >= inicio_semana, R.fecha <= fin_semana), R.total), else_=0)), 0).label("semana"),
+            func.coalesce(func.sum(R.total), 0).label("total"),
+            func.coalesce(func.sum(case((R.estado == "completada", R.total), else_=0)), 0).label("completadas"),
+        ).one()
+
+    def conteos_periodos(self, comparacion: date, inicio: date, fin: date) -> Dict[str, int]:
+        """
+        Métricas de los KPIs para el período [inicio, fin] y el anterior
+        [comparacion, inicio), con una consulta por resumen.
+        """
+        A = ResumenDiarioVisitasAsignadas
+        C = ResumenDiarioVisitasCompletas
+        actual_a, anterior_a = A.fecha >= inicio, A.fecha < inicio
+
+        asignadas = self.db.query(
+            func.coalesce(func.sum(case((actual_a, A.total), else_=0)), 0).label("programadas"),
+            func.coalesce(func.sum(case((anterior_a, A.total), else_=0)), 0).label("programadas_anterior"),
+            func.count(distinct(case((actual_a, A.sede_id)))).label("sedes"),
+            func.count(distinct(case((anterior_a, A.sede_id)))).label("sedes_anterior"),
+            func.count(distinct(case((actual_a, A.visitador_id)))).label("visitadores"),
+            func.count(distinct(case((anterior_a, A.visitador_id)))).label("visitadores_anterior"),
+        ).filter(A.fecha >= comparacion, A.fecha <= fin, A.total > 0).one()
+
+        completas = self.db.query(
+            func.coalesce(func.sum(case((C.fecha >= inicio, C.total), else_=0)), 0).label("completadas"),
+            func.coalesce(func.sum(case((C.fecha < inicio, C.total), else_=0)), 0).label("completadas_anterior"),
+        ).filter(C.fecha >= comparacion, C.fecha <= fin, C.total > 0).one()
+
+        return {**asignadas._asdict(), **completas._asdict()}
+
+    def por_municipio(self, desde: date) -> List[Dict]:
+        """
+        Visitas programadas y completadas por municipio desde `desde`. Cada
+        resumen se agrega por separado y se combinan en Python.
+        """
+        A = ResumenDiarioVisitasAsignadas
+        C = ResumenDiarioVisitasCompletas
+        programadas = dict(
+            self.db.query(A.municipio_id, func.sum(A.total))
+            .filter(A.fecha >= desde).group_by(A.municipio_id).all()
+        )
+        completadas = dict(
+            self.db.query(C.municipio_id, func.sum(C.total))
+            .filter(C.fecha >= desde).group_by(C.municipio_id).all()
+        )
+        ids = [municipio_id for municipio_id, total in programadas.items() if total]
+        nombres = dict(self.db.query(Municipio.id, Municipio.nombre).filter(Municipio.id.in_(ids)).all()) if ids else {}
+
+        return [
+            {
+                "municipio_id": municipio_id,
+                "municipio": nombres.get(municipio_id),
+                "visitas_programadas": int(programadas[municipio_id]),
+                "visitas_completadas": int(completadas.get(municipio_id) or 0),
+            }
+            for municipio_id in ids
+            if municipio_id in nombres
+        ]
+
+    def _totales_por_sede(self, desde: date, municipio_id: int) -> Dict[int, List[int]]:
+        """{sede_id: [programadas, completadas]} del municipio desde `desde`."""
+        A = ResumenDiarioVisitasAsignadas
+        C = ResumenDiarioVisitasCompletas
+        totales: Dict[int, List[int]] = {}
+        for sede_id, total in (
+            self.db.query(A.sede_id, func.sum(A.total))
+            .filter(A.fecha >= desde, A.municipio_id == municipio_id).group_by(A.sede_id)
+        ):
+            totales.setdefault(sede_id, [0, 0])[0] = int(total or 0)
+        for sede_id, total in (
+            self.db.query(C.sede_id, func.sum(C.total))
+            .filter(C.fecha >= desde, C.municipio_id == municipio_id).group_by(C.sede_id)
+        ):
+            totales.setdefault(sede_id, [0, 0])[1] = int(total or 0)
+        return totales
+
+    def por_institucion(self, desde: date, municipio_id: int) -> List[Dict]:
+        """
+        Visitas programadas y completadas por institución de un municipio. Los
+        totales por sede salen de los resúmenes y se suman por institución en
+        Python con el mapa sede -> institución del municipio.
+        """
+        totales = self._totales_por_sede(desde, municipio_id)
+        if not totales:
+            return []
+
+        sedes = (
+            self.db.query(SedeEducativa.id, Institucion.id, Institucion.nombre)
+            .join(Institucion, Institucion.id == SedeEducativa.institucion_id)
+            .filter(SedeEducativa.id.in_(list(totales)))
+        )
+        instituciones: Dict[int, Dict] = {}
+        for sede_id, institucion_id, nombre in sedes:
+            fila = instituciones.setdefault(institucion_id, {
+                "institucion_id": institucion_id,
+                "institucion": nombre,
+                "visitas_programadas": 0,
+                "visitas_completadas": 0,
+            })
+            fila["visitas_programadas"] += totales[sede_id][0]
+            fila["visitas_completadas"] += totales[sede_id][1]
+
+        return [fila for fila in instituciones.values() if fila["visitas_programadas"] > 0]
+
+    def por_sede(self, desde: date, municipio_id: int, limite: int = 50,
+                 offset: int = 0) -> Tuple[int, List[Dict]]:
+        """
+        Página de sedes de un municipio con visitas programadas desde `desde`,
+        ordenadas por programadas. Igual que en el ranking de visitadores, cada
+        resumen se agrega en su propia subconsulta antes de unirlo a las sedes.
+        Devuelve (total de sedes, página pedida).
+        """
+        A = ResumenDiarioVisitasAsignadas
+        C = ResumenDiarioVisitasCompletas
+
+        programadas = (
+            select(A.sede_id, func.sum(A.total).label("total"))
+            .where(A.fecha >= desde, A.municipio_id == municipio_id)
+            .group_by(A.sede_id).subquery()
+        )
+        completadas = (
+            select(C.sede_id, func.sum(C.total).label("total"))
+            .where(C.fecha >= desde, C.municipio_id == municipio_id)
+            .group_by(C.sede_id).subquery()
+        )
+        visitas_completadas = func.coalesce(completadas.c.total, 0)
+
+        consulta = (
+            select(
+                SedeEducativa.id.label("sede_id"),
+                SedeEducativa.nombre_sede.label("sede"),
+                Institucion.nombre.label("institucion"),
+                programadas.c.total.label("visitas_programadas"),
+                visitas_completadas.label("visitas_completadas"),
+            )
+            .join(programadas, programadas.c.sede_id == SedeEducativa.id)
+            .join(Institucion, Institucion.id == SedeEducativa.institucion_id)
+            .outerjoin(completadas, completadas.c.sede_id == SedeEducativa.id)
+            .where(programadas.c.total > 0)
+        )
+
+        total = self.db.execute(select(func.count()).select_from(consulta.subquery())).scalar() or 0
+        filas = self.db.execute(
+            consulta.order_by(programadas.c.total.desc(), SedeEducativa.id)
+            .limit(limite).offset(offset)
+        ).all()
+        return total, [fila._asdict() for fila in filas]
+
+    def ranking_visitadores(self, desde: date, hasta: Optional[date] = None, limite: int = 10,
+                            offset: int = 0, rol_id: int = 1) -> Tuple[int, List[Dict]]:
+        """
+        Ranking de visitadores por tasa de cumplimiento en [desde, hasta].
+
+        Programadas y completadas se agregan por separado (una subconsulta por
+        resumen, agrupada por usuario) y después se unen, así cada visitador
+        aporta una fila por agregado sin multiplicar asignaciones por visitas.
+        Devuelve (total de visitadores con visitas programadas, página pedida).
+        """
+        A = ResumenDiarioVisitasAsignadas
+        C = ResumenDiarioVisitasCompletas
+        filtros_a, filtros_c = [A.fecha >= desde], [C.fecha >= desde]
+        if hasta:
+            filtros_a.append(A.fecha <= hasta)
+            filtros_c.append(C.fecha <= hasta)
+
+        programadas = (
+            select(A.visitador_id.label("usuario_id"), func.sum(A.total).label("total"))
+            .where(*filtros_a).group_by(A.visitador_id).subquery()
+        )
+        completadas = (
+            select(C.profesional_id.label("usuario_id"), func.sum(C.total).label("total"))
+            .where(*filtros_c).group_by(C.profesional_id).subquery()
+        )
+        visitas_completadas = func.coalesce(completadas.c.total, 0)
+        tasa = visitas_completadas * 100.0 / programadas.c.total
+
+        consulta = (
+            select(
+                Usuario.id,
+                Usuario.nombre,
+                programadas.c.total.label("visitas_programadas"),
+                visitas_completadas.label("visitas_completadas"),
+                tasa.label("tasa_cumplimiento"),
+            )
+            .join(programadas, programadas.c.usuario_id == Usuario.id)
+            .outerjoin(completadas, completadas.c.usuario_id == Usuario.id)
+            .where(Usuario.rol_id == rol_id, programadas.c.total > 0)
+        )
+
+        total = self.db.execute(select(func.count()).select_from(consulta.subquery())).scalar() or 0
+        filas = self.db.execute(
+            consulta.order_by(tasa.desc(), visitas_completadas.desc(), Usuario.id)
+            .limit(limite).offset(offset)
+        ).all()
+        return total, [fila._asdict() for fila in filas]
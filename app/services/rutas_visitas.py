@@ -0,0 +1,111 @@
+# app/services/rutas_visitas.py
+
+import math
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from ..config import RUTAS_CACHE_DISTANCIAS_MAX
+
+RADIO_TIERRA_KM = 6371.0088
+
+Coordenada = Tuple[float, float]
+
+
+class ParadaRuta(NamedTuple):
+    clave: object
+    lat: float
+    lon: float
+
+
+def _normalizar(coordenada: Coordenada) -> Coordenada:
+    # ~0,1 m: coordenadas iguales comparten entrada en la caché
+    return round(coordenada[0], 6), round(coordenada[1], 6)
+
+
+@lru_cache(maxsize=RUTAS_CACHE_DISTANCIAS_MAX)
+def _haversine_km(a: Coordenada, b: Coordenada) -> float:
+    lat1, lon1 = map(math.radians, a)
+    lat2, lon2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * math.asin(min(1.0, math.sqrt(h)))
+
+
+def distancia_km(a: Coordenada, b: Coordenada) -> float:
+    """
+    Distancia haversine entre dos coordenadas (lat, lon). La caché se indexa
+    por el par de coordenadas (no por sede), así se reutiliza entre
+    peticiones y un cambio de ubicación nunca devuelve un valor viejo.
+    """
+    a, b = _normalizar(a), _normalizar(b)
+    return _haversine_km(a, b) if a <= b else _haversine_km(b, a)
+
+
+def matriz_distancias(puntos: Sequence[Coordenada]) -> List[List[float]]:
+    n = len(puntos)
+    matriz = [[0.0] * n for _ in range(n)]
+    for i in range(n):
+        for j in range(i + 1, n):
+            matriz[i][j] = matriz[j][i] = distancia_km(puntos[i], puntos[j])
+    return matriz
+
+
+def longitud_ruta(orden: Sequence[int], matriz: Sequence[Sequence[float]]) -> float:
+    return sum(matriz[orden[i - 1]][orden[i]] for i in range(1, len(orden)))
+
+
+def _vecino_mas_cercano(matriz: Sequence[Sequence[float]], inicio: int) -> List[int]:
+    pendientes = set(range(len(matriz))) - {inicio}
+    orden = [inicio]
+    while pendientes:
+        actual = matriz[orden[-1]]
+        siguiente = min(pendientes, key=lambda j: (actual[j], j))
+        pendientes.remove(siguiente)
+        orden.append(siguiente)
+    return orden
+
+
+def _dos_opt(orden: List[int], matriz: Sequence[Sequence[float]]) -> List[int]:
+    """
+    Mejora 2-opt de un camino abierto con el primer punto fijo: invierte
+    tramos mientras acorten el recorrido. El final del camino queda libre.
+    """
+    n = len(orden)
+    mejora = True
+    while mejora:
+        mejora = False
+        for i in range(1, n - 1):
+            a, b = orden[i - 1], orden[i]
+            for k in range(i + 1, n):
+                c = orden[k]
+                d = orden[k + 1] if k + 1 < n else None
+                delta = matriz[a][c] - matriz[a][b]
+                if d is not None:
+                    delta += matriz[b][d] - matriz[c][d]
+                if delta < -1e-9:
+                    orden[i:k + 1] = reversed(orden[i:k + 1])
+                    b = orden[i]
+                    mejora = True
+    return orden
+
+
+def optimizar_ruta(paradas: Sequence[ParadaRuta],
+                   origen: Optional[Coordenada] = None) -> Tuple[List[ParadaRuta], float]:
+    """
+    Ordena las paradas con vecino más cercano + 2-opt y devuelve
+    (paradas ordenadas, distancia total en km). Si hay `origen` (p. ej. la
+    posición GPS del visitador) la ruta parte de él; si no, de la primera
+    parada recibida.
+    """
+    if len(paradas) < 2 and origen is None:
+        return list(paradas), 0.0
+
+    puntos = [(parada.lat, parada.lon) for parada in paradas]
+    if origen is not None:
+        puntos.insert(0, origen)
+
+    matriz = matriz_distancias(puntos)
+    orden = _dos_opt(_vecino_mas_cercano(matriz, 0), matriz)
+    distancia = longitud_ruta(orden, matriz)
+
+    desplazamiento = 1 if origen is not None else 0
+    return [paradas[indice - desplazamiento] for indice in orden if indice >= desplazamiento], distancia
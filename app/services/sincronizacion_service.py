@@ -0,0 +1,191 @@
+# app/services/sincronizacion_service.py
+
+import logging
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import and_, exists, func, or_, select, update
+from sqlalchemy.orm import Session
+
+from ..database import SessionLocal
+from ..models import VisitaAsignada, VisitaCompletaPAE
+from .resumenes_diarios import ResumenesDiariosService
+from .calendario_visitas import cache_calendario
+from .cambios_sincronizacion import CambiosSincronizacionService
+
+logger = logging.getLogger(__name__)
+
+
+def _mismo_contrato(contrato_a, contrato_b):
+    """
+    Igualdad de contrato que también empareja contratos nulos, igual que el
+    filtro ORM `contrato == None` que usaban los bucles originales.
+    """
+    return or_(contrato_a == contrato_b, and_(contrato_a.is_(None), contrato_b.is_(None)))
+
+
+def _coincide_asignada_con_completa():
+    """Condición de emparejamiento (sede, profesional, contrato) entre ambas tablas."""
+    return and_(
+        VisitaCompletaPAE.sede_id == VisitaAsignada.sede_id,
+        VisitaCompletaPAE.profesional_id == VisitaAsignada.visitador_id,
+        _mismo_contrato(VisitaCompletaPAE.contrato, VisitaAsignada.contrato),
+    )
+
+
+class SincronizacionService:
+    """
+    Reconcilia el estado de VisitaAsignada y VisitaCompletaPAE con sentencias
+    UPDATE basadas en conjuntos (EXISTS correlacionado), en lugar de una
+    consulta por cada asignación.
+
+    El alcance se limita con `visitador_id` (un usuario), `supervisor_id`
+    (las asignaciones de un supervisor) o ninguno de los dos (global).
+    Ninguno de los métodos hace commit: queda a cargo de quien llama.
+    """
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def completar_asignadas(
+        self,
+        estados: Iterable[str] = ("en_proceso",),
+        solo_completas_completadas: bool = True,
+        visitador_id: Optional[int] = None,
+        supervisor_id: Optional[int] = None,
+        sede_id: Optional[int] = None,
+    ) -> int:
+        """
+        Marca como 'completada' las visitas asignadas en `estados` que ya tienen
+        una visita completa correspondiente. Devuelve el número de filas actualizadas.
+        """
+        self.db.flush()
+
+        condicion_completa = _coincide_asignada_con_completa()
+        if solo_completas_completadas:
+            condicion_completa = and_(condicion_completa, VisitaCompletaPAE.estado == "completada")
+
+        filtros = [
+            VisitaAsignada.estado.in_(list(estados)),
+            exists(select(VisitaCompletaPAE.id).where(condicion_completa)),
+        ]
+        if visitador_id is not None:
+            filtros.append(VisitaAsignada.visitador_id == visitador_id)
+        if supervisor_id is not None:
+            filtros.append(VisitaAsignada.supervisor_id == supervisor_id)
+        if sede_id is not None:
+            filtros.append(VisitaAsignada.sede_id == sede_id)
+
+        resumenes = ResumenesDiariosService(self.db)
+        dias = resumenes.dias_afectados(VisitaAsignada, *filtros)
+        if not dias:
+            return 0
+
+        # Antes del UPDATE, mientras los filtros aún seleccionan estas filas
+        CambiosSincronizacionService(self.db).registrar_filtro(VisitaAsignada, *filtros)
+        resultado = self.db.execute(
+            update(VisitaAsignada)
+            .where(*filtros)
+            .values(
+                estado="completada",
+                fecha_completada=func.coalesce(VisitaAsignada.fecha_completada, datetime.utcnow()),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        # El UPDATE masivo no pasa por los listeners de resúmenes diarios ni del calendario
+        resumenes.recalcular_dias(VisitaAsignada, dias)
+        cache_calendario.marcar_dias(self.db, dias)
+        return resultado.rowcount or 0
+
+    def completar_visitas_completas_pendientes(
+        self,
+        visitador_id: Optional[int] = None,
+        supervisor_id: Optional[int] = None,
+    ) -> int:
+        """
+        Marca como 'completada' las visitas completas pendientes cuya visita
+        asignada correspondiente ya está completada.
+        """
+        self.db.flush()
+
+        condicion_asignada = and_(
+            _coincide_asignada_con_completa(),
+            VisitaAsignada.estado == "completada",
+        )
+        if supervisor_id is not None:
+            condicion_asignada = and_(condicion_asignada, VisitaAsignada.supervisor_id == supervisor_id)
+
+        filtros = [
+            VisitaCompletaPAE.estado == "pendiente",
+            exists(select(VisitaAsignada.id).where(condicion_asignada)),
+        ]
+        if visitador_id is not None:
+            filtros.append(VisitaCompletaPAE.profesional_id == visitador_id)
+
+        resumenes = ResumenesDiariosService(self.db)
+        dias = resumenes.dias_afectados(VisitaCompletaPAE, *filtros)
+        if not dias:
+            return 0
+
+        CambiosSincronizacionService(self.db).registrar_filtro(VisitaCompletaPAE, *filtros)
+        resultado = self.db.execute(
+            update(VisitaCompletaPAE)
+            .where(*filtros)
+            .values(estado="completada")
+            .execution_options(synchronize_session=False)
+        )
+        resumenes.recalcular_dias(VisitaCompletaPAE, dias)
+        return resultado.rowcount or 0
+
+    def reconciliar(
+        self,
+        visitador_id: Optional[int] = None,
+        supervisor_id: Optional[int] = None,
+    ) -> Dict[str, int]:
+        """
+        Ejecuta la reconciliación completa en ambos sentidos y devuelve los
+        conteos por grupo.
+        """
+        asignadas = self.completar_asignadas(
+            visitador_id=visitador_id,
+            supervisor_id=supervisor_id,
+        )
+        completas = self.completar_visitas_completas_pendientes(
+            visitador_id=visitador_id,
+            supervisor_id=supervisor_id,
+        )
+        logger.info(
+            f"Reconciliación (visitador={visitador_id}, supervisor={supervisor_id}): "
+            f"{asignadas} asignadas y {completas} completas actualizadas"
+        )
+        return {
+            "asignadas_en_proceso_completadas": asignadas,
+            "completas_pendientes_completadas": completas,
+            "total": asignadas + completas,
+        }
+
+
+def reconciliar_asignadas_del_visitador(visitador_id: int) -> int:
+    """
+    Pasada de reconciliación incremental para ejecutar después del commit
+    (por ejemplo como BackgroundTask): completa las visitas asignadas
+    pendientes o en proceso del visitador que ya tienen visita completa.
+    Usa su propia sesión porque la de la petición ya está cerrada.
+    """
+    db = SessionLocal()
+    try:
+        actualizadas = SincronizacionService(db).completar_asignadas(
+            estados=("pendiente", "en_proceso"),
+            solo_completas_completadas=False,
+            visitador_id=visitador_id,
+        )
+        db.commit()
+        if actualizadas:
+            logger.info(f"Reconciliación posterior: {actualizadas} visitas asignadas del visitador {visitador_id} completadas")
+        return actualizadas
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error en reconciliación posterior del visitador {visitador_id}: {str(e)}")
+        return 0
+    finally:
+        db.close()
@@ -0,0 +1,49 @@
+import hashlib
+import json
+from typing import NamedTuple
+
+from fastapi import Request, Response
+
+from app.config import HTTP_CACHE_MAX_AGE_SEGUNDOS
+
+
+class ContenidoJson(NamedTuple):
+    """Respuesta JSON ya serializada junto con su ETag fuerte."""
+    contenido: bytes
+    etag: str
+
+
+def serializar_json(datos) -> ContenidoJson:
+    """
+    Serializa con el mismo formato que JSONResponse de FastAPI. El ETag es un
+    hash del contenido, así coincide entre workers y reinicios mientras los
+    datos no cambien.
+    """
+    contenido = json.dumps(
+        datos, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+    ).encode("utf-8")
+    return ContenidoJson(contenido, f'"{hashlib.blake2b(contenido, digest_size=16).hexdigest()}"')
+
+
+def _etag_coincide(if_none_match: str, etag: str) -> bool:
+    # If-None-Match usa comparación débil: W/"x" coincide con "x"
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip()
+        if candidato == "*" or candidato.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+def respuesta_json_cacheable(request: Request, datos: ContenidoJson) -> Response:
+    """
+    Devuelve el JSON con ETag y Cache-Control, o un 304 sin cuerpo si el
+    cliente ya tiene esa versión (If-None-Match).
+    """
+    encabezados = {
+        "ETag": datos.etag,
+        "Cache-Control": f"private, max-age={HTTP_CACHE_MAX_AGE_SEGUNDOS}, must-revalidate",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_coincide(if_none_match, datos.etag):
+        return Response(status_code=304, headers=encabezados)
+    return Response(content=datos.contenido, media_type="application/json", headers=encabezados)
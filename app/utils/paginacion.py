@@ -0,0 +1,122 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Query, joinedload, selectinload
+
+from app import models, schemas
+
+# Encabezado con el cursor de la página siguiente (ausente en la última página)
+ENCABEZADO_SIGUIENTE_CURSOR = "X-Siguiente-Cursor"
+LIMITE_MAXIMO_PAGINA = 200
+VISTAS_LISTADO = ("completa", "resumen")
+
+
+def codificar_cursor(fecha_visita: datetime, visita_id: int) -> str:
+    """Cursor opaco con la última posición (fecha_visita, id) devuelta."""
+    valor = f"{fecha_visita.isoformat()}|{visita_id}"
+    return base64.urlsafe_b64encode(valor.encode()).decode()
+
+
+def decodificar_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        fecha, visita_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(fecha), int(visita_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def listar_visitas_paginadas(
+    query: Query,
+    response: Response,
+    vista: str = "completa",
+    limite: Optional[int] = None,
+    cursor: Optional[str] = None,
+) -> List:
+    """
+    Ordena una consulta de VisitaCompletaPAE por (fecha_visita, id) descendente,
+    continúa desde `cursor` y devuelve a lo sumo `limite` filas en la vista pedida:
+
+    - "completa": objetos con sus relaciones y respuestas del checklist.
+    - "resumen": solo columnas de listado y nombres relacionados, en una consulta.
+
+    Si quedan más filas, el cursor de la página siguiente se envía en el
+    encabezado X-Siguiente-Cursor. Sin `limite` se devuelven todas las filas.
+    """
+    if vista not in VISTAS_LISTADO:
+        raise HTTPException(status_code=400, detail=f"Vista inválida. Use una de: {', '.join(VISTAS_LISTADO)}")
+
+    Visita = models.VisitaCompletaPAE
+    if cursor:
+        fecha_cursor, id_cursor = decodificar_cursor(cursor)
+        query = query.filter(tuple_(Visita.fecha_visita, Visita.id) < tuple_(fecha_cursor, id_cursor))
+
+    query = query.order_by(Visita.fecha_visita.desc(), Visita.id.desc())
+
+    if vista == "resumen":
+        query = query.with_entities(
+            Visita.id,
+            Visita.fecha_visita,
+            Visita.contrato,
+            Visita.operador,
+            Visita.estado,
+            Visita.municipio_id,
+            Visita.institucion_id,
+            Visita.sede_id,
+            Visita.profesional_id,
+            Visita.numero_visita_usuario,
+            Visita.fecha_creacion,
+            models.Municipio.nombre.label("municipio_nombre"),
+            models.Institucion.nombre.label("institucion_nombre"),
+            models.SedeEducativa.nombre_sede.label("sede_nombre"),
+            models.Usuario.nombre.label("profesional_nombre"),
+        ).outerjoin(
+            models.Municipio, models.Municipio.id == Visita.municipio_id
+        ).outerjoin(
+            models.Institucion, models.Institucion.id == Visita.institucion_id
+        ).outerjoin(
+            models.SedeEducativa, models.SedeEducativa.id == Visita.sede_id
+        ).outerjoin(
+            models.Usuario, models.Usuario.id == Visita.profesional_id
+        )
+    else:
+        query = query.options(
+            joinedload(Visita.municipio),
+            joinedload(Visita.institucion),
+            joinedload(Visita.sede),
+            joinedload(Visita.profesional),
+            # Colección en una consulta aparte (IN) para que el LIMIT aplique sobre visitas
+            selectinload(Visita.respuestas_checklist),
+        )
+
+    if limite:
+        # Una fila extra indica si existe una página siguiente
+        query = query.limit(limite + 1)
+    visitas = query.all()
+
+    if limite and len(visitas) > limite:
+        visitas = visitas[:limite]
+        response.headers[ENCABEZADO_SIGUIENTE_CURSOR] = codificar_cursor(visitas[-1].fecha_visita, visitas[-1].id)
+
+    if vista == "resumen":
+        return [schemas.VisitaCompletaPAEResumen.model_validate(fila) for fila in visitas]
+    return visitas
+
+
+def respuesta_listado(visitas: List, response: Response):
+    """
+    Devuelve el resultado de `listar_visitas_paginadas` desde la ruta. La vista
+    resumen no corresponde al response_model de las rutas de listado, así que se
+    serializa aquí conservando el encabezado del cursor.
+    """
+    if visitas and isinstance(visitas[0], schemas.VisitaCompletaPAEResumen):
+        encabezados = {}
+        if ENCABEZADO_SIGUIENTE_CURSOR in response.headers:
+            encabezados[ENCABEZADO_SIGUIENTE_CURSOR] = response.headers[ENCABEZADO_SIGUIENTE_CURSOR]
+        return JSONResponse(content=jsonable_encoder(visitas), headers=encabezados)
+    return visitas
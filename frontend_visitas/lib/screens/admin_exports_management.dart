@@ -98,15 +98,23 @@ class _AdminExportsManagementScreenState extends State<AdminExportsManagementScr
         }),
       );
 
-      Navigator.pop(context); // Cerrar indicador de carga
-
-      if (response.statusCode == 200) {
-        final resultado = jsonDecode(response.body);
-        _mostrarResultadoExportacion(resultado);
-        await _cargarDatos(); // Recargar datos
-      } else {
+      if (response.statusCode != 200) {
         throw Exception('Error ${response.statusCode}: ${response.body}');
       }
+
+      // La exportación se genera en segundo plano: esperar a que el trabajo termine
+      var resultado = jsonDecode(response.body);
+      if (resultado['job_id'] != null) {
+        resultado = await _esperarExportacion(resultado['job_id'], token);
+      }
+
+      if (resultado['estado'] == 'error') {
+        throw Exception(resultado['error_mensaje'] ?? resultado['message']);
+      }
+
+      Navigator.pop(context); // Cerrar indicador de carga
+      _mostrarResultadoExportacion(resultado);
+      await _cargarDatos(); // Recargar datos
     } catch (e) {
       Navigator.pop(context); // Cerrar indicador de carga
       ScaffoldMessenger.of(context).showSnackBar(
@@ -115,6 +123,28 @@ class _AdminExportsManagementScreenState extends State<AdminExportsManagementScr
     }
   }
 
+  Future<Map<String, dynamic>> _esperarExportacion(int jobId, String? token) async {
+    // Consultar el estado del trabajo hasta que termine (máximo ~10 minutos)
+    for (var intento = 0; intento < 300; intento++) {
+      final response = await http.get(
+        Uri.parse('$baseUrl/api/admin/exportaciones/trabajos/$jobId'),
+        headers: {
+          'Authorization': 'Bearer $token',
+          'Content-Type': 'application/json',
+        },
+      );
+      if (response.statusCode != 200) {
+        throw Exception('Error ${response.statusCode}: ${response.body}');
+      }
+      final trabajo = jsonDecode(response.body) as Map<String, dynamic>;
+      if (trabajo['estado'] == 'completado' || trabajo['estado'] == 'error') {
+        return trabajo;
+      }
+      await Future.delayed(Duration(seconds: 2));
+    }
+    throw Exception('La exportación está tardando demasiado. Intente descargarla más tarde.');
+  }
+
   Future<Map<String, dynamic>?> _mostrarDialogoConfiguracion(String plantillaId, String formato) async {
     DateTime? fechaInicio;
     DateTime? fechaFin;